@@ -0,0 +1,206 @@
+"""Selenium benchmarks for the pricing component, gated against a baseline.
+
+    python3 -m pytest bench_pricing.py -v
+
+Every scenario is timed inside the page with ``performance.now()``: a few
+warm-up runs, then ``RUNS`` measured ones. The median and p95 of each are
+written to ``bench-results.json``. A scenario fails when its median is more
+than ``PRICING_BENCH_THRESHOLD`` (default 0.25, i.e. 25%) slower than the
+median stored in ``bench-baseline.json``, plus ``MIN_SLACK_MS`` of
+allowance for timer noise.
+
+The baseline is written on the first run, for scenarios it does not yet
+contain, and whenever ``PRICING_BENCH_UPDATE=1`` is set. It records the
+speed of the machine that produced it, so regenerate it on the machine
+that runs the gate.
+
+Not collected by a plain ``pytest`` run (the file name does not start with
+``test_``), so the correctness suite stays fast.
+"""
+
+import json
+import os
+import statistics
+import unittest
+
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+from test_parity import ensure_server
+from test_pricing import DIR, PORT
+
+BASELINE_PATH = os.path.join(DIR, "bench-baseline.json")
+RESULTS_PATH = os.path.join(DIR, "bench-results.json")
+THRESHOLD = float(os.environ.get("PRICING_BENCH_THRESHOLD", "0.25"))
+UPDATE_BASELINE = os.environ.get("PRICING_BENCH_UPDATE") == "1"
+MIN_SLACK_MS = 1.0
+WARMUP = 3
+RUNS = 15
+
+# name -> what to time and the tier list to time it on. ``count`` tiers of
+# ``units`` each, repeated ``multiplier`` times (the last tier unlimited
+# unless the multiplier already is).
+SCENARIOS = {
+    "calculate_3_tiers": {"kind": "calculate", "count": 3},
+    "calculate_10_tiers": {"kind": "calculate", "count": 10},
+    "calculate_100_tiers": {"kind": "calculate", "count": 100},
+    "calculate_1000_tiers": {"kind": "calculate", "count": 1000},
+    "calculate_unlimited_unit_tiers": {"kind": "calculate", "count": 100, "units": 1, "multiplier": "infinity"},
+    "calculate_range_1e6": {"kind": "calculate", "count": 10, "units": 100_000, "multiplier": 1},
+    "calculate_range_1e9": {"kind": "calculate", "count": 10, "units": 100_000_000, "multiplier": 1},
+    "render_3_tiers": {"kind": "render", "count": 3},
+    "render_100_tiers": {"kind": "render", "count": 100},
+    "render_1000_tiers": {"kind": "render", "count": 1000},
+    "edit_late_tier_500_tiers": {"kind": "editLateTier", "count": 500},
+    "update_chart_100_tiers": {"kind": "updateChart", "count": 100},
+    "update_chart_range_1e9": {"kind": "updateChart", "count": 10, "units": 100_000_000, "multiplier": 1},
+    "mrr_slider_burst_100_events": {"kind": "sliderBurst", "count": 3, "events": 100, "selector": "#mrr-slider"},
+    "tier_slider_burst_100_events": {
+        "kind": "sliderBurst", "count": 100, "events": 100,
+        "selector": '.field-slider[data-field="unitPrice"]',
+    },
+}
+
+BENCH_SCRIPT = """
+const [spec, warmup, runs] = arguments;
+const mod = await import('./pricing-component.js');
+const nextFrame = () => new Promise((resolve) => requestAnimationFrame(() => resolve()));
+
+const tiers = [];
+for (let i = 0; i < spec.count; i++) {
+    const last = i === spec.count - 1;
+    const multiplier = spec.multiplier === 'infinity' ? Infinity : (spec.multiplier ?? (last ? Infinity : 2));
+    tiers.push({
+        sequence: i + 1,
+        units: spec.units ?? 100,
+        price: i % 3 === 0 ? 25 : 0,
+        unitPrice: Math.max(0.5, 10 - i * 0.01),
+        freeUnits: i === 0 ? 10 : 0,
+        multiplier,
+    });
+}
+
+const container = document.createElement('div');
+document.body.appendChild(container);
+const comp = new mod.PricingComponent(container, tiers, undefined, { deferChart: false });
+await nextFrame();
+
+const once = async (i) => {
+    if (spec.kind === 'calculate') {
+        // A cold cache, so this times the full calculation, not a reuse.
+        comp._series = new mod.SeriesCache();
+        const t0 = performance.now();
+        comp.calculate();
+        return performance.now() - t0;
+    }
+    if (spec.kind === 'render') {
+        const t0 = performance.now();
+        comp.render();
+        comp.updateChart();
+        return performance.now() - t0;
+    }
+    if (spec.kind === 'editLateTier') {
+        // Typing into a tier near the end: only the points after it are repriced.
+        comp.tiers[spec.count - 20].unitPrice = 1 + (i % 7);
+        const t0 = performance.now();
+        comp.calculate();
+        return performance.now() - t0;
+    }
+    if (spec.kind === 'updateChart') {
+        comp.mrr = (i % 2) * 100;
+        const t0 = performance.now();
+        comp.updateChart();
+        return performance.now() - t0;
+    }
+    // sliderBurst: a drag's worth of input events, until the chart is redrawn.
+    const slider = container.querySelector(spec.selector);
+    const max = parseFloat(slider.max) || 100;
+    const t0 = performance.now();
+    for (let e = 0; e < spec.events; e++) {
+        slider.value = ((e + i) % spec.events) * (max / spec.events);
+        slider.dispatchEvent(new Event('input', { bubbles: true }));
+    }
+    await nextFrame();
+    const elapsed = performance.now() - t0;
+    // The drag armed the SETTLE_MS refine timer; let that full-resolution
+    // redraw land here rather than inside the next run's timing.
+    while (comp.getMetrics().pending) await nextFrame();
+    return elapsed;
+};
+
+for (let i = 0; i < warmup; i++) await once(i);
+const samples = [];
+for (let i = 0; i < runs; i++) samples.push(await once(i));
+comp.destroy();
+document.body.removeChild(container);
+return samples;
+"""
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    return {
+        "median_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))], 4),
+        "runs": len(ordered),
+    }
+
+
+def load_json(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def write_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+class PricingBenchmark(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        ensure_server()
+        opts = Options()
+        opts.add_argument("--headless=new")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        opts.add_argument("--window-size=1280,900")
+        cls.driver = webdriver.Chrome(options=opts)
+        cls.driver.set_script_timeout(300)
+        cls.driver.get(f"http://localhost:{PORT}/index.html")
+        cls.baseline = load_json(BASELINE_PATH)
+        cls.results = {}
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.driver.quit()
+        write_json(RESULTS_PATH, cls.results)
+        missing = {k: v for k, v in cls.results.items() if k not in cls.baseline}
+        if UPDATE_BASELINE or missing:
+            write_json(BASELINE_PATH, {**cls.baseline, **(cls.results if UPDATE_BASELINE else missing)})
+
+    def test_scenarios(self):
+        """Each scenario stays within the threshold of its baseline median."""
+        for name, spec in SCENARIOS.items():
+            with self.subTest(scenario=name):
+                samples = self.driver.execute_script(BENCH_SCRIPT, spec, WARMUP, RUNS)
+                result = summarize(samples)
+                self.results[name] = result
+                base = self.baseline.get(name)
+                if base is None or UPDATE_BASELINE:
+                    continue
+                limit = base["median_ms"] * (1 + THRESHOLD) + MIN_SLACK_MS
+                self.assertLessEqual(
+                    result["median_ms"], limit,
+                    f"{name}: median {result['median_ms']:.3f} ms vs baseline {base['median_ms']:.3f} ms "
+                    f"(limit {limit:.3f} ms at +{THRESHOLD:.0%})",
+                )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,21 +1,59 @@
-export const CURRENCIES = [
-  { code: 'USD', symbol: '$' },
-  { code: 'EUR', symbol: '€' },
-  { code: 'GBP', symbol: '£' },
-  { code: 'JPY', symbol: '¥' },
-  { code: 'CHF', symbol: 'CHF' },
-  { code: 'CAD', symbol: 'CA$' },
-  { code: 'AUD', symbol: 'A$' },
-  { code: 'CNY', symbol: '¥' },
-  { code: 'INR', symbol: '₹' },
-  { code: 'BRL', symbol: 'R$' },
-  { code: 'KRW', symbol: '₩' },
-  { code: 'CZK', symbol: 'Kč' },
-  { code: 'PLN', symbol: 'zł' },
-];
+import {
+  CURRENCIES,
+  MAX_POINTS,
+  SeriesCache,
+  breakEvenUsage,
+  compareConfigs,
+  compileTiers,
+  computeSeriesRange,
+  configFromJSON,
+  configToJSON,
+  decodeConfig,
+  encodeConfig,
+  formatMinor,
+  highResSeries,
+  projectRevenue,
+  quoteMinor,
+  round2,
+  unitsForCost,
+  usageHistogram,
+} from './pricing-engine.js';
+
+// The engine is part of this module's API; see pricing-engine.js.
+export * from './pricing-engine.js';
+
+// Typed-array series as the plain arrays calculate() returns; gaps in the
+// average line become null, which Chart.js leaves undrawn.
+function plainSeries({ labels, cumulative, average, current }) {
+  return {
+    labels: Array.from(labels),
+    cumulative: Array.from(cumulative),
+    average: Array.from(average, (v) => (Number.isNaN(v) ? null : v)),
+    current: Array.from(current),
+  };
+}
+
+// Tier lists longer than this only mount the rows scrolled into view.
+export const VIRTUALIZE_ABOVE = 50;
+const ROW_OVERSCAN = 8;
+const ROW_HEIGHT_ESTIMATE = 64;
+const TIER_VIEWPORT_HEIGHT = 480;
+
+// Methods timed with performance.measure() and reported by getMetrics().
+const INSTRUMENTED = ['calculate', 'render', 'bindInputs', 'updateChart', 'drawSeries'];
+// Rolling window of durations kept per method for the percentiles.
+const METRIC_WINDOW = 120;
+const FRAME_MS = 1000 / 60;
+// While a slider is dragged the chart is drawn from about this many sample
+// points, then refined to MAX_POINTS when the drag is released or has been
+// idle for SETTLE_MS.
+export const PREVIEW_POINTS = 100;
+const SETTLE_MS = 150;
+
+const quantile = (sorted, q) => (sorted.length ? sorted[Math.min(sorted.length - 1, Math.floor(q * sorted.length))] : null);
 
 export class PricingComponent {
-  constructor(container, initialTiers, currency) {
+  constructor(container, initialTiers, currency, options = {}) {
     this.container = container;
     this.tiers = initialTiers || [
       { sequence: 1, units: 100, price: 0, unitPrice: 10, freeUnits: 10, multiplier: 1 },
@@ -26,11 +64,63 @@ export class PricingComponent {
     this.discount = 0;
     this.mrr = 0;
     this.chart = null;
+    this._chartCurrency = null;
+    this._frame = null;
+    this._rows = new Map();
+    this._rowTiers = new WeakMap();
+    this._rowHeight = 0;
+    this._scrollFrame = null;
+    this._worker = null;
+    this._requestId = 0;
+    this._inFlight = false;
+    this._workerDirty = false;
+    this._points = [[], [], []];
+    this._series = new SeriesCache();
+    // Previews sample fewer points, so they keep their own cache rather
+    // than forcing a full recompute of the settled one on every switch.
+    this._previewSeries = new SeriesCache();
+    this._seriesUpdate = null;
+    this._highRes = options.highRes === true;
+    this._detail = new SeriesCache();
+    this._zoom = null;
+    this.generation = 0;
+    this._metrics = new Map();
+    this._sampleCount = 0;
+    this._droppedFrames = 0;
+    this._preview = false;
+    this._settleTimer = null;
+    this.usageHistogram = null;
+    this.projection = null;
+    for (const name of INSTRUMENTED) this[name] = this._instrument(name, this[name]);
+    // Until the chart section scrolls into view, updates only touch the table.
+    this._chartVisible = options.deferChart === false || typeof IntersectionObserver === 'undefined';
+    this._observer = null;
+    this._hashKey = options.hash === true ? 'pricing' : options.hash || null;
+    this._storageKey = options.storageKey || null;
+    this._savedText = null;
+    const initial = this.readSavedConfig() || options.config;
+    if (initial) this.applyConfig(initial);
+    if (options.worker && typeof Worker !== 'undefined') {
+      const url = options.workerUrl || new URL('./pricing-worker.js', import.meta.url);
+      try {
+        this._worker = new Worker(url, { type: 'module' });
+        this._worker.onmessage = (e) => this.handleWorkerResult(e.data);
+        this._worker.onerror = (e) => this.workerFailed(e);
+        this._worker.onmessageerror = (e) => this.workerFailed(e);
+      } catch (e) {
+        this.workerFailed(e);
+      }
+    }
     this.render();
     this.updateChart();
   }
 
   render() {
+    // The canvas is rebuilt below, so a chart bound to the old one is stale.
+    if (this.chart) {
+      this.chart.destroy();
+      this.chart = null;
+    }
     this.container.innerHTML = '';
 
     const configSection = document.createElement('div');
@@ -57,7 +147,7 @@ export class PricingComponent {
     }
     currSelect.addEventListener('change', (e) => {
       this.currency = CURRENCIES.find((c) => c.code === e.target.value);
-      this.updateChart();
+      this.scheduleUpdate();
     });
     currencyRow.appendChild(currLabel);
     currencyRow.appendChild(currSelect);
@@ -90,15 +180,24 @@ export class PricingComponent {
     table.appendChild(thead);
 
     const tbody = document.createElement('tbody');
-    this.tiers
-      .sort((a, b) => a.sequence - b.sequence)
-      .forEach((tier, index) => {
-        const tr = document.createElement('tr');
-        tr.innerHTML = this.tierRowHTML(tier, index);
-        tbody.appendChild(tr);
-      });
     table.appendChild(tbody);
-    configSection.appendChild(table);
+
+    // Rows outside the visible window are represented by padding on
+    // tierWindow, so the scrollbar reflects the full list.
+    const tierScroll = document.createElement('div');
+    tierScroll.className = 'tier-scroll';
+    const tierWindow = document.createElement('div');
+    tierWindow.className = 'tier-window';
+    tierWindow.appendChild(table);
+    tierScroll.appendChild(tierWindow);
+    configSection.appendChild(tierScroll);
+
+    this.tiers.sort((a, b) => a.sequence - b.sequence);
+    this._table = table;
+    this._tbody = tbody;
+    this._tierScroll = tierScroll;
+    this._tierWindow = tierWindow;
+    this._rows = new Map();
 
     const actionsRow = document.createElement('div');
     actionsRow.className = 'actions-row';
@@ -147,33 +246,91 @@ export class PricingComponent {
     chartWrap.appendChild(canvas);
     chartSection.appendChild(chartWrap);
 
+    this._projectionSummary = document.createElement('p');
+    this._projectionSummary.className = 'projection-summary';
+    this._projectionSummary.hidden = true;
+    chartSection.appendChild(this._projectionSummary);
+
     this.container.appendChild(configSection);
     this.container.appendChild(chartSection);
 
+    if (!this._chartVisible) this.observeChart(chartWrap);
+
+    this.syncRows();
     this.bindInputs();
   }
 
-  tierRowHTML(tier, index) {
+  // Mount exactly the rows that should be in the DOM, in tier order. Rows
+  // are keyed by tier object, so existing rows (and their focus) are reused
+  // and only rows entering or leaving the window are created or removed.
+  syncRows() {
+    const { tiers } = this;
+    const virtual = tiers.length > VIRTUALIZE_ABOVE;
+    const rowHeight = this._rowHeight || ROW_HEIGHT_ESTIMATE;
+    let from = 0;
+    let to = tiers.length;
+    if (virtual) {
+      const { scrollTop } = this._tierScroll;
+      from = Math.max(0, Math.floor(scrollTop / rowHeight) - ROW_OVERSCAN);
+      to = Math.min(tiers.length, Math.ceil((scrollTop + TIER_VIEWPORT_HEIGHT) / rowHeight) + ROW_OVERSCAN);
+    }
+
+    const wanted = new Set(tiers.slice(from, to));
+    for (const [tier, tr] of this._rows) {
+      if (!wanted.has(tier)) {
+        tr.remove();
+        this._rows.delete(tier);
+      }
+    }
+
+    let prev = null;
+    for (let i = from; i < to; i++) {
+      const tier = tiers[i];
+      let tr = this._rows.get(tier);
+      if (!tr) {
+        tr = document.createElement('tr');
+        tr.innerHTML = this.tierRowHTML(tier);
+        this._rows.set(tier, tr);
+        this._rowTiers.set(tr, tier);
+      }
+      const expected = prev ? prev.nextSibling : this._tbody.firstChild;
+      if (expected !== tr) {
+        if (prev) prev.after(tr);
+        else this._tbody.prepend(tr);
+      }
+      prev = tr;
+    }
+
+    if (!this._rowHeight && prev && prev.offsetHeight > 0) {
+      this._rowHeight = prev.offsetHeight;
+    }
+    this._tierScroll.style.maxHeight = virtual ? `${TIER_VIEWPORT_HEIGHT}px` : '';
+    this._tierScroll.style.overflowY = virtual ? 'auto' : '';
+    this._tierWindow.style.paddingTop = virtual ? `${from * rowHeight}px` : '';
+    this._tierWindow.style.paddingBottom = virtual ? `${(tiers.length - to) * rowHeight}px` : '';
+  }
+
+  tierRowHTML(tier) {
     const field = (name, value, step, sMin, sMax, sStep) => {
       const clamped = Math.min(Math.max(value, sMin), sMax);
       return `<td>
-        <input type="number" data-index="${index}" data-field="${name}" value="${value}" step="${step || 1}" min="0">
-        <input type="range" data-index="${index}" data-field="${name}" value="${clamped}" min="${sMin}" max="${sMax}" step="${sStep}" class="field-slider">
+        <input type="number" data-field="${name}" value="${value}" step="${step || 1}" min="0">
+        <input type="range" data-field="${name}" value="${clamped}" min="${sMin}" max="${sMax}" step="${sStep}" class="field-slider">
       </td>`;
     };
     const multDisplay = tier.multiplier === Infinity ? '∞' : tier.multiplier;
     const multSlider = tier.multiplier === Infinity ? 10 : Math.min(tier.multiplier, 9);
     return [
-      `<td><input type="number" data-index="${index}" data-field="sequence" value="${tier.sequence}" step="1" min="0"></td>`,
+      `<td><input type="number" data-field="sequence" value="${tier.sequence}" step="1" min="0"></td>`,
       field('units', tier.units, 1, 0, 2000, 10),
       field('price', tier.price, 0.01, 0, 500, 1),
       field('unitPrice', tier.unitPrice, 0.01, 0, 50, 0.5),
       field('freeUnits', tier.freeUnits, 1, 0, 500, 1),
       `<td>
-        <input type="text" data-index="${index}" data-field="multiplier" value="${multDisplay}" class="multiplier-input">
-        <input type="range" data-index="${index}" data-field="multiplier" value="${multSlider}" min="1" max="10" step="1" class="field-slider">
+        <input type="text" data-field="multiplier" value="${multDisplay}" class="multiplier-input">
+        <input type="range" data-field="multiplier" value="${multSlider}" min="1" max="10" step="1" class="field-slider">
       </td>`,
-      `<td><button class="btn btn-remove" data-index="${index}">&times;</button></td>`,
+      `<td><button class="btn btn-remove">&times;</button></td>`,
     ].join('');
   }
 
@@ -189,55 +346,24 @@ export class PricingComponent {
   }
 
   bindInputs() {
-    // Number inputs → update data + sync slider
-    this.container.querySelectorAll('.tier-table input[type="number"]').forEach((input) => {
-      input.addEventListener('input', (e) => {
-        const idx = parseInt(e.target.dataset.index);
-        const field = e.target.dataset.field;
-        const val = parseFloat(e.target.value) || 0;
-        this.tiers[idx][field] = val;
-        const slider = this._findPeer(e.target, '.field-slider');
-        if (slider) slider.value = Math.min(Math.max(val, +slider.min), +slider.max);
-        this.updateChart();
-      });
+    // One delegated listener per event type covers every tier row, including
+    // rows mounted later by syncRows().
+    this._table.addEventListener('input', (e) => this.handleTierInput(e.target));
+    this._table.addEventListener('change', (e) => {
+      if (e.target.dataset.field === 'sequence') this.sortTiers();
+      else if (e.target.type === 'range') this.settle();
     });
-
-    // Numeric sliders → update data + sync number input
-    this.container.querySelectorAll('.field-slider:not([data-field="multiplier"])').forEach((slider) => {
-      slider.addEventListener('input', (e) => {
-        const idx = parseInt(e.target.dataset.index);
-        const field = e.target.dataset.field;
-        const val = parseFloat(e.target.value);
-        this.tiers[idx][field] = val;
-        const numInput = this._findPeer(e.target, 'input[type="number"]');
-        if (numInput) numInput.value = val;
-        this.updateChart();
-      });
-    });
-
-    // Multiplier text input → update data + sync slider
-    this.container.querySelectorAll('.multiplier-input').forEach((input) => {
-      input.addEventListener('input', (e) => {
-        const idx = parseInt(e.target.dataset.index);
-        this.tiers[idx].multiplier = this.parseMultiplier(e.target.value);
-        const slider = this._findPeer(e.target, '.field-slider');
-        if (slider) {
-          const m = this.tiers[idx].multiplier;
-          slider.value = m === Infinity ? 10 : Math.min(m, 9);
-        }
-        this.updateChart();
-      });
+    this._table.addEventListener('click', (e) => {
+      const btn = e.target.closest('.btn-remove');
+      if (!btn) return;
+      const tier = this._rowTiers.get(btn.closest('tr'));
+      if (tier) this.removeTier(this.tiers.indexOf(tier));
     });
-
-    // Multiplier slider → update data + sync text input
-    this.container.querySelectorAll('.field-slider[data-field="multiplier"]').forEach((slider) => {
-      slider.addEventListener('input', (e) => {
-        const idx = parseInt(e.target.dataset.index);
-        const val = parseInt(e.target.value);
-        this.tiers[idx].multiplier = val >= 10 ? Infinity : val;
-        const textInput = this._findPeer(e.target, '.multiplier-input');
-        if (textInput) textInput.value = val >= 10 ? '∞' : val;
-        this.updateChart();
+    this._tierScroll.addEventListener('scroll', () => {
+      if (this._scrollFrame !== null || this.tiers.length <= VIRTUALIZE_ABOVE) return;
+      this._scrollFrame = requestAnimationFrame(() => {
+        this._scrollFrame = null;
+        this.syncRows();
       });
     });
 
@@ -247,13 +373,14 @@ export class PricingComponent {
     mrrInput.addEventListener('input', () => {
       this.mrr = parseFloat(mrrInput.value) || 0;
       mrrSlider.value = Math.min(Math.max(this.mrr, 0), 5000);
-      this.updateChart();
+      this.scheduleUpdate();
     });
     mrrSlider.addEventListener('input', () => {
       this.mrr = parseFloat(mrrSlider.value);
       mrrInput.value = this.mrr;
-      this.updateChart();
+      this.schedulePreview();
     });
+    mrrSlider.addEventListener('change', () => this.settle());
 
     // Discount input + slider
     const discInput = this.container.querySelector('#discount-input');
@@ -261,20 +388,53 @@ export class PricingComponent {
     discInput.addEventListener('input', () => {
       this.discount = Math.min(Math.max(parseFloat(discInput.value) || 0, 0), 100);
       discSlider.value = this.discount;
-      this.updateChart();
+      this.scheduleUpdate();
     });
     discSlider.addEventListener('input', () => {
       this.discount = parseFloat(discSlider.value);
       discInput.value = this.discount;
-      this.updateChart();
+      this.schedulePreview();
     });
+    discSlider.addEventListener('change', () => this.settle());
+  }
 
-    this.container.querySelectorAll('.btn-remove').forEach((btn) => {
-      btn.addEventListener('click', (e) => {
-        const idx = parseInt(e.target.dataset.index);
-        this.removeTier(idx);
-      });
-    });
+  handleTierInput(el) {
+    const tier = this._rowTiers.get(el.closest('tr'));
+    const field = el.dataset.field;
+    if (!tier || !field) return;
+
+    if (field === 'multiplier' && el.type === 'range') {
+      // Multiplier slider → update data + sync text input
+      const val = parseInt(el.value);
+      tier.multiplier = val >= 10 ? Infinity : val;
+      const textInput = this._findPeer(el, '.multiplier-input');
+      if (textInput) textInput.value = val >= 10 ? '∞' : val;
+    } else if (field === 'multiplier') {
+      // Multiplier text input → update data + sync slider
+      tier.multiplier = this.parseMultiplier(el.value);
+      const slider = this._findPeer(el, '.field-slider');
+      if (slider) slider.value = tier.multiplier === Infinity ? 10 : Math.min(tier.multiplier, 9);
+    } else if (el.type === 'range') {
+      // Numeric sliders → update data + sync number input
+      const val = parseFloat(el.value);
+      tier[field] = val;
+      const numInput = this._findPeer(el, 'input[type="number"]');
+      if (numInput) numInput.value = val;
+    } else {
+      // Number inputs → update data + sync slider
+      const val = parseFloat(el.value) || 0;
+      tier[field] = val;
+      const slider = this._findPeer(el, '.field-slider');
+      if (slider) slider.value = Math.min(Math.max(val, +slider.min), +slider.max);
+    }
+    if (el.type === 'range') this.schedulePreview();
+    else this.scheduleUpdate();
+  }
+
+  // Reorder after a sequence edit by moving the existing rows.
+  sortTiers() {
+    this.tiers.sort((a, b) => a.sequence - b.sequence);
+    this.syncRows();
   }
 
   addTier() {
@@ -287,45 +447,96 @@ export class PricingComponent {
       freeUnits: 0,
       multiplier: 1,
     });
-    this.render();
-    this.updateChart();
+    this.syncRows();
+    if (this.tiers.length > VIRTUALIZE_ABOVE) {
+      // Bring the new last row into view; the scroll handler mounts it.
+      this._tierScroll.scrollTop = this._tierScroll.scrollHeight;
+    }
+    this.scheduleUpdate();
   }
 
   removeTier(index) {
-    if (this.tiers.length <= 1) return;
-    this.tiers.splice(index, 1);
-    this.render();
-    this.updateChart();
+    if (this.tiers.length <= 1 || index < 0) return;
+    const [tier] = this.tiers.splice(index, 1);
+    const tr = this._rows.get(tier);
+    if (tr) {
+      tr.remove();
+      this._rows.delete(tier);
+    }
+    this.syncRows();
+    this.scheduleUpdate();
   }
 
   toJSON() {
-    return {
-      currency: this.currency.code,
-      mrr: this.mrr,
-      discount: this.discount,
-      tiers: this.tiers.map((t) => ({
-        ...t,
-        multiplier: t.multiplier === Infinity ? 'infinity' : t.multiplier,
-      })),
-    };
+    return configToJSON(this);
   }
 
   loadJSON(config) {
-    if (config.currency) {
-      this.currency = CURRENCIES.find((c) => c.code === config.currency) || CURRENCIES[0];
-    }
-    if (typeof config.mrr === 'number') this.mrr = config.mrr;
-    if (typeof config.discount === 'number') this.discount = config.discount;
-    if (Array.isArray(config.tiers) && config.tiers.length > 0) {
-      this.tiers = config.tiers.map((t) => ({
-        ...t,
-        multiplier: t.multiplier === 'infinity' || t.multiplier === Infinity ? Infinity : (t.multiplier || 1),
-      }));
-    }
+    this.applyConfig(config);
     this.render();
     this.updateChart();
   }
 
+  // Take over the state of a toJSON()-style config without rendering.
+  applyConfig(config) {
+    Object.assign(this, configFromJSON(config));
+  }
+
+  // The config saved under the hash key (`#pricing=...`) or in localStorage,
+  // in that order of preference.
+  readSavedConfig() {
+    if (this._hashKey && typeof location !== 'undefined') {
+      const prefix = `${this._hashKey}=`;
+      const part = location.hash.slice(1).split('&').find((p) => p.startsWith(prefix));
+      const config = part && decodeConfig(part.slice(prefix.length));
+      if (config) return config;
+    }
+    if (this._storageKey && typeof localStorage !== 'undefined') {
+      try {
+        const text = localStorage.getItem(this._storageKey);
+        const config = text && decodeConfig(text);
+        if (config) return config;
+      } catch {
+        // Storage can be disabled entirely (e.g. privacy settings).
+      }
+    }
+    return null;
+  }
+
+  saveConfig() {
+    if (!this._hashKey && !this._storageKey) return;
+    const text = encodeConfig(this.toJSON());
+    if (text === this._savedText) return;
+    this._savedText = text;
+    if (this._hashKey) {
+      const prefix = `${this._hashKey}=`;
+      const parts = location.hash.slice(1).split('&').filter((p) => p && !p.startsWith(prefix));
+      parts.push(prefix + text);
+      // Replace rather than push so dragging a slider doesn't flood history.
+      history.replaceState(history.state, '', `#${parts.join('&')}`);
+    }
+    if (this._storageKey) {
+      try {
+        localStorage.setItem(this._storageKey, text);
+      } catch {
+        // Quota exceeded or storage disabled; the hash still works.
+      }
+    }
+  }
+
+  // Create the chart the first time its section becomes visible.
+  observeChart(target) {
+    if (this._observer) this._observer.disconnect();
+    this._observer = new IntersectionObserver((entries) => {
+      if (!entries.some((e) => e.isIntersecting)) return;
+      this._observer.disconnect();
+      this._observer = null;
+      this._chartVisible = true;
+      this.updateChart();
+    });
+    this._observer.observe(target);
+  }
+
   exportConfig() {
     const json = JSON.stringify(this.toJSON(), null, 2);
     const blob = new Blob([json], { type: 'application/json' });
@@ -357,77 +568,331 @@ export class PricingComponent {
     e.target.value = '';
   }
 
-  calculate() {
-    const sorted = [...this.tiers].sort((a, b) => a.sequence - b.sequence);
+  // Incremental: only the points an edit can have changed are repriced
+  // (see SeriesCache).
+  calculate(maxPoints = MAX_POINTS) {
+    const cache = maxPoints === PREVIEW_POINTS ? this._previewSeries : this._series;
+    const series = cache.update(this.tiers, this.mrr, this.discount, maxPoints);
+    this._seriesUpdate = cache.last;
+    return plainSeries(series);
+  }
 
-    // Total units for chart x-axis. For unlimited tiers show 5 repetitions.
-    let totalUnits = 0;
-    for (const tier of sorted) {
-      if (tier.units <= 0) continue;
-      if (tier.multiplier === Infinity) {
-        totalUnits += tier.units * 5;
-      } else {
-        totalUnits += tier.units * Math.max(1, tier.multiplier);
-      }
+  // The series for the current view: high resolution and decimated when
+  // that mode is on (see highResSeries()), otherwise `maxPoints` samples of
+  // the zoomed range.
+  calculateDetail(maxPoints = MAX_POINTS) {
+    if (this._highRes && maxPoints === MAX_POINTS) {
+      const series = highResSeries(this._detail, this.tiers, this.mrr, this.discount, this._zoom);
+      this._seriesUpdate = this._detail.last;
+      return plainSeries(series);
     }
-    if (totalUnits === 0) return { labels: [], cumulative: [], average: [], current: [] };
+    if (!this._zoom) return this.calculate(maxPoints);
+    this._seriesUpdate = null;
+    return plainSeries(computeSeriesRange(this.tiers, this.mrr, this.discount, ...this._zoom, maxPoints));
+  }
 
-    const steps = Math.min(totalUnits, 1000);
-    const stepSize = totalUnits / steps;
+  // Evaluate the curve at every breakpoint (up to HIGH_RES_POINTS) and
+  // draw a shape-preserving decimation of it. Slider previews stay coarse.
+  setHighResolution(on) {
+    this._highRes = Boolean(on);
+    this.scheduleUpdate();
+  }
+
+  // Show only usages in [lo, hi]. In high-resolution mode the stored
+  // points are re-decimated for the range; otherwise it is re-sampled.
+  zoomTo(lo, hi) {
+    lo = Math.max(0, Number(lo));
+    hi = Number(hi);
+    if (!(hi > lo)) throw new RangeError(`zoom range must have hi > lo, got [${lo}, ${hi}]`);
+    this._zoom = [lo, hi];
+    this.scheduleUpdate();
+  }
 
-    const labels = [];
-    const cumulative = [];
-    const average = [];
-    const current = [];
+  resetZoom() {
+    this._zoom = null;
+    this.scheduleUpdate();
+  }
 
-    for (let i = 0; i <= steps; i++) {
-      const N = i * stepSize;
-      labels.push(Math.round(N));
+  // Most units whose adjusted (MRR-floored, discounted) price fits in
+  // `budget`; Infinity if the plan never costs more, null if even zero usage
+  // (i.e. the discounted MRR) is over budget.
+  unitsForBudget(budget) {
+    const factor = 1 - this.discount / 100;
+    if (factor <= 0) return budget >= 0 ? Infinity : null;
+    if (budget < Math.max(this.mrr, 0) * factor) return null;
+    return unitsForCost(compileTiers(this.tiers), budget / factor);
+  }
+
+  // Usage from which the usage cost is at or above the MRR floor (where the
+  // average line starts); null if it never is.
+  breakEven() {
+    return breakEvenUsage(compileTiers(this.tiers), this.mrr);
+  }
 
-      let cumCost = 0;
-      let remaining = N;
-      let marginalRate = 0;
+  // Exact invoice totals for whole-unit usages, as BigInt minor units of
+  // the current currency; the same integers pricing_batch.py --fixed
+  // writes. See quoteMinor() in pricing-engine.js.
+  invoiceMinor(usages) {
+    return quoteMinor(this.tiers, this.mrr, this.discount, this.currency, usages);
+  }
 
-      for (const tier of sorted) {
-        if (remaining <= 0) break;
-        if (tier.units <= 0) continue;
-        const maxReps = tier.multiplier === Infinity ? Infinity : Math.max(1, tier.multiplier);
+  // invoiceMinor() for one usage, formatted with the currency's decimals.
+  invoiceTotal(usage) {
+    return formatMinor(this.invoiceMinor([usage])[0], this.currency.decimals);
+  }
 
-        for (let rep = 0; rep < maxReps && remaining > 0; rep++) {
-          const consumed = Math.min(remaining, tier.units);
-          const billable = Math.max(0, consumed - tier.freeUnits);
-          cumCost += tier.price + billable * tier.unitPrice;
+  // Overlay a customer usage distribution on the chart and project the
+  // revenue it brings in: `{ edges, counts, means? }` buckets, `{ samples }`
+  // raw usage values, or null to clear.
+  setUsageHistogram(histogram) {
+    if (histogram && histogram.samples) histogram = usageHistogram(histogram.samples, histogram.bins);
+    this.usageHistogram = histogram || null;
+    this.scheduleUpdate();
+  }
 
-          // If N falls within this repetition, record its marginal rate
-          if (remaining <= tier.units) {
-            marginalRate = consumed <= tier.freeUnits ? 0 : tier.unitPrice;
-          }
+  // Expected revenue of the usage histogram under the current config
+  // (see projectRevenue()), or null without a histogram.
+  projectRevenue() {
+    if (!this.usageHistogram) return null;
+    return projectRevenue(compileTiers(this.tiers), this.mrr, this.discount, this.usageHistogram);
+  }
 
-          remaining -= consumed;
-        }
+  // Refresh the projection summary and return the customer-count overlay
+  // as stepped {x, y} points clipped to the chart's range, or null.
+  _projectionOverlay() {
+    this.projection = this.projectRevenue();
+    const summary = this._projectionSummary;
+    if (!this.projection) {
+      if (summary) summary.hidden = true;
+      return null;
+    }
+    const { total, customers, floorShare, averagePrice } = this.projection;
+    const { symbol } = this.currency;
+    if (summary) {
+      summary.hidden = false;
+      summary.textContent = `Projected revenue: ${symbol}${total.toFixed(2)} from ${customers} customers`
+        + ` · ${(floorShare * 100).toFixed(1)}% on the MRR floor`
+        + (Number.isNaN(averagePrice) ? '' : ` · ${symbol}${averagePrice.toFixed(4)} per unit`);
+    }
+    const { edges, counts } = this.usageHistogram;
+    const range = compileTiers(this.tiers).axisUnits;
+    const points = [];
+    for (let k = 0; k < counts.length && edges[k] <= range; k++) {
+      points.push({ x: edges[k], y: counts[k] });
+      if (k === counts.length - 1 || edges[k + 1] > range) {
+        points.push({ x: Math.min(edges[k + 1], range), y: counts[k] });
       }
+    }
+    return points;
+  }
 
-      const factor = 1 - this.discount / 100;
-      const adjusted = Math.max(this.mrr, cumCost) * factor;
-      const adjMarginal = (cumCost >= this.mrr ? marginalRate : 0) * factor;
+  // Wrap a method so every call leaves a `pricing:<name>` performance
+  // measure and a duration sample for getMetrics().
+  _instrument(name, method) {
+    const label = `pricing:${name}`;
+    const startMark = `${label}:start`;
+    const metric = { count: 0, last: 0, samples: new Float64Array(METRIC_WINDOW) };
+    this._metrics.set(name, metric);
+    return (...args) => {
+      const start = performance.now();
+      performance.mark(startMark);
+      try {
+        return method.apply(this, args);
+      } finally {
+        const duration = performance.now() - start;
+        performance.measure(label, startMark);
+        performance.clearMarks(startMark);
+        // Keep the timeline bounded during long sessions.
+        if (metric.count % 1000 === 999) performance.clearMeasures(label);
+        metric.samples[metric.count % METRIC_WINDOW] = duration;
+        metric.count++;
+        metric.last = duration;
+      }
+    };
+  }
 
-      cumulative.push(Math.round(adjusted * 100) / 100);
-      average.push(N > 0 && cumCost >= this.mrr ? Math.round((adjusted / N) * 100) / 100 : null);
-      current.push(Math.round(adjMarginal * 100) / 100);
+  // Call counts and last/p50/p95 durations (ms) per instrumented method,
+  // plus the sample-point count of the last redraw, how its series was
+  // computed (SeriesCache `last`; null for a zoomed re-sample), the
+  // high-resolution mode and zoom range, frames lost to redraws longer than a
+  // 60 Hz frame, the redraw generation and whether an update is still
+  // scheduled or computing (including a preview awaiting its
+  // full-resolution redraw).
+  getMetrics() {
+    const metrics = {};
+    for (const [name, { count, last, samples }] of this._metrics) {
+      const sorted = Array.from(samples.subarray(0, Math.min(count, METRIC_WINDOW))).sort((a, b) => a - b);
+      metrics[name] = { count, last, p50: quantile(sorted, 0.5), p95: quantile(sorted, 0.95) };
     }
+    return {
+      ...metrics,
+      points: this._sampleCount,
+      series: this._seriesUpdate,
+      droppedFrames: this._droppedFrames,
+      generation: this.generation,
+      preview: this._preview,
+      highRes: this._highRes,
+      zoom: this._zoom,
+      pending: this._frame !== null || this._inFlight || this._workerDirty || this._preview,
+    };
+  }
+
+  // Called after every chart redraw: counts frames the redraw overran and
+  // announces the new generation with a `pricing-update` event.
+  _afterDraw(points, start) {
+    this._droppedFrames += Math.floor((performance.now() - start) / FRAME_MS);
+    this._sampleCount = points;
+    this.generation++;
+    this.container.dispatchEvent(new CustomEvent('pricing-update', {
+      bubbles: true,
+      detail: { generation: this.generation, points },
+    }));
+  }
 
-    return { labels, cumulative, average, current };
+  // Coalesce bursts of input events (e.g. a slider drag) into one redraw
+  // per animation frame.
+  scheduleUpdate() {
+    if (this._frame !== null) return;
+    this._frame = requestAnimationFrame(() => {
+      this._frame = null;
+      this.updateChart();
+    });
+  }
+
+  // A slider moved: redraw at preview resolution and (re)arm the idle timer
+  // that refines it.
+  schedulePreview() {
+    this._preview = true;
+    clearTimeout(this._settleTimer);
+    this._settleTimer = setTimeout(() => this.settle(), SETTLE_MS);
+    this.scheduleUpdate();
+  }
+
+  // The drag ended (range inputs fire `change` on pointer up) or went idle:
+  // redraw at full resolution. A preview frame that has not run yet is
+  // drawn at full resolution instead, and a preview still computing in the
+  // worker is dropped as superseded.
+  settle() {
+    clearTimeout(this._settleTimer);
+    this._settleTimer = null;
+    if (!this._preview) return;
+    this._preview = false;
+    this.scheduleUpdate();
   }
 
   updateChart() {
-    const { labels, cumulative, average, current } = this.calculate();
-    const canvas = this.container.querySelector('#pricing-chart-canvas');
-    if (!canvas) return;
+    if (this._frame !== null) {
+      cancelAnimationFrame(this._frame);
+      this._frame = null;
+    }
+    this.saveConfig();
+    if (!this._chartVisible) return;
+    if (this._worker) {
+      this.requestWorkerSeries();
+      return;
+    }
+    const start = performance.now();
+    const maxPoints = this._preview ? PREVIEW_POINTS : MAX_POINTS;
+    const series = this._highRes || this._zoom ? this.calculateDetail(maxPoints) : this.calculate(maxPoints);
+    this.drawSeries(series, start);
+  }
+
+  // Only one calculation is in flight at a time; edits made meanwhile mark
+  // the result as superseded, so it is dropped and the latest state is
+  // requested instead.
+  requestWorkerSeries() {
+    if (this._inFlight) {
+      this._workerDirty = true;
+      return;
+    }
+    this._inFlight = true;
+    this._workerDirty = false;
+    this._worker.postMessage({
+      id: ++this._requestId,
+      tiers: this.tiers,
+      mrr: this.mrr,
+      discount: this.discount,
+      maxPoints: this._preview ? PREVIEW_POINTS : MAX_POINTS,
+      preview: this._preview,
+      highRes: this._highRes && !this._preview,
+      view: this._zoom,
+    });
+  }
 
+  // The worker failed to load, threw, or sent something unreadable: stop
+  // using it and price on the main thread from now on. The chart is rebuilt
+  // because worker mode turns Chart.js parsing off.
+  workerFailed(error) {
+    console.warn('pricing worker failed, calculating on the main thread:', error.message || error);
+    if (this._worker) this._worker.terminate();
+    this._worker = null;
+    this._inFlight = false;
+    this._workerDirty = false;
     if (this.chart) {
       this.chart.destroy();
+      this.chart = null;
     }
+    this.scheduleUpdate();
+  }
+
+  handleWorkerResult(result) {
+    this._inFlight = false;
+    if (this._workerDirty || result.id !== this._requestId) {
+      this.requestWorkerSeries();
+      return;
+    }
+    const start = performance.now();
+    const { labels, cumulative, average, current } = result;
+    this._seriesUpdate = result.update;
+    this.drawSeries({
+      labels: [],
+      cumulative: this.toPoints(0, labels, cumulative),
+      average: this.toPoints(1, labels, average),
+      current: this.toPoints(2, labels, current),
+    }, start);
+  }
+
+  // Worker results are drawn with Chart.js parsing disabled, which needs
+  // {x, y} points; the point objects are pooled and rewritten in place.
+  toPoints(slot, xs, ys) {
+    const pool = this._points[slot];
+    for (let i = pool.length; i < xs.length; i++) pool.push({ x: 0, y: 0 });
+    for (let i = 0; i < xs.length; i++) {
+      pool[i].x = xs[i];
+      pool[i].y = ys[i];
+    }
+    return pool.slice(0, xs.length);
+  }
+
+  drawSeries({ labels, cumulative, average, current }, start = performance.now()) {
+    if (this.chart) {
+      this.chart.data.labels = labels;
+      const { datasets } = this.chart.data;
+      const [cumSet, avgSet, curSet] = datasets;
+      cumSet.data = cumulative;
+      avgSet.data = average;
+      curSet.data = current;
+      const overlay = this._projectionOverlay();
+      if (!overlay) datasets.length = 3;
+      else if (datasets[3]) datasets[3].data = overlay;
+      else datasets.push(this._overlayDataset(overlay));
+      this._applyZoom(this.chart.options.scales.x);
+      if (this._chartCurrency !== this.currency.code) {
+        const { scales } = this.chart.options;
+        scales.yCumulative.title.text = `Cumulative Price (${this.currency.symbol})`;
+        scales.yRate.title.text = `Unit Price (${this.currency.symbol})`;
+        this._chartCurrency = this.currency.code;
+      }
+      this.chart.update('none');
+      this._afterDraw(cumulative.length, start);
+      return;
+    }
+
+    const canvas = this.container.querySelector('#pricing-chart-canvas');
+    if (!canvas) return;
 
+    this._chartCurrency = this.currency.code;
+    const overlay = this._projectionOverlay();
     this.chart = new Chart(canvas, {
       type: 'line',
       data: {
@@ -461,12 +926,16 @@ export class PricingComponent {
             borderWidth: 2,
             pointRadius: 0,
             pointHitRadius: 8,
-            stepped: true,
+            // Each sample holds the rate of the units leading up to it.
+            stepped: 'after',
             yAxisID: 'yRate',
           },
+          ...(overlay ? [this._overlayDataset(overlay)] : []),
         ],
       },
       options: {
+        parsing: !this._worker,
+        normalized: true,
         responsive: true,
         maintainAspectRatio: false,
         interaction: {
@@ -475,6 +944,9 @@ export class PricingComponent {
         },
         plugins: {
           tooltip: {
+            // The histogram overlay has its own x positions, so index mode
+            // would pair it with unrelated samples.
+            filter: (item) => item.datasetIndex < 3,
             callbacks: {
               title: (items) => `Units: ${items[0].label}`,
               label: (item) => `${item.dataset.label}: ${this.currency.symbol}${item.formattedValue}`,
@@ -483,6 +955,9 @@ export class PricingComponent {
         },
         scales: {
           x: {
+            type: 'linear',
+            min: this._zoom ? this._zoom[0] : undefined,
+            max: this._zoom ? this._zoom[1] : undefined,
             title: { display: true, text: 'Number of Units' },
             ticks: {
               maxTicksLimit: 12,
@@ -501,8 +976,181 @@ export class PricingComponent {
             beginAtZero: true,
             grid: { drawOnChartArea: false },
           },
+          // The usage histogram overlay is scaled to the plot height.
+          yCustomers: {
+            type: 'linear',
+            display: false,
+            beginAtZero: true,
+          },
         },
       },
     });
+    this._afterDraw(cumulative.length, start);
+  }
+
+  // Bound the x-axis to the zoom range, or let it fit the data.
+  _applyZoom(axis) {
+    axis.min = this._zoom ? this._zoom[0] : undefined;
+    axis.max = this._zoom ? this._zoom[1] : undefined;
+  }
+
+  _overlayDataset(data) {
+    return {
+      label: 'Customers (usage histogram)',
+      data,
+      borderColor: 'rgba(107, 114, 128, 0.6)',
+      backgroundColor: 'rgba(107, 114, 128, 0.15)',
+      borderWidth: 1,
+      pointRadius: 0,
+      pointHitRadius: 0,
+      fill: true,
+      // Each point starts a bucket, so the step holds its count up to the next one.
+      stepped: 'before',
+      yAxisID: 'yCustomers',
+    };
+  }
+
+  destroy() {
+    if (this._frame !== null) cancelAnimationFrame(this._frame);
+    clearTimeout(this._settleTimer);
+    if (this._observer) this._observer.disconnect();
+    if (this._worker) this._worker.terminate();
+    if (this.chart) this.chart.destroy();
+    this._observer = null;
+    this._worker = null;
+    this.chart = null;
+  }
+}
+
+// Overlays several toJSON() configs on one chart, evaluated together by
+// compareConfigs(), and lists where the cheapest option changes hands.
+export class PricingComparison {
+  constructor(container, configs = [], currency) {
+    this.container = container;
+    this.configs = configs;
+    this.currency = currency || CURRENCIES[0];
+    this.chart = null;
+    this.result = null;
+    this.render();
+    this.update();
+  }
+
+  render() {
+    if (this.chart) {
+      this.chart.destroy();
+      this.chart = null;
+    }
+    this.container.innerHTML = '';
+
+    const section = document.createElement('div');
+    section.className = 'pricing-chart pricing-comparison';
+
+    const heading = document.createElement('h2');
+    heading.textContent = 'Plan Comparison';
+    section.appendChild(heading);
+
+    const chartWrap = document.createElement('div');
+    chartWrap.style.position = 'relative';
+    chartWrap.style.height = '400px';
+    const canvas = document.createElement('canvas');
+    canvas.id = 'pricing-compare-canvas';
+    chartWrap.appendChild(canvas);
+    section.appendChild(chartWrap);
+
+    this._crossoverList = document.createElement('ul');
+    this._crossoverList.className = 'crossover-list';
+    section.appendChild(this._crossoverList);
+
+    this.container.appendChild(section);
+  }
+
+  setConfigs(configs) {
+    this.configs = configs;
+    this.update();
+  }
+
+  planName(i) {
+    return this.configs[i].name || `Plan ${i + 1}`;
+  }
+
+  // Line points for one plan: a second point at the same usage where a
+  // flat fee makes the price jump, so steps are drawn vertically.
+  planPoints(i) {
+    const { labels, left, right } = this.result;
+    const l = left[i];
+    const r = right[i];
+    const points = [];
+    for (let k = 0; k < labels.length; k++) {
+      points.push({ x: labels[k], y: round2(l[k]) });
+      if (round2(r[k]) !== round2(l[k])) points.push({ x: labels[k], y: round2(r[k]) });
+    }
+    return points;
+  }
+
+  update() {
+    this.result = compareConfigs(this.configs);
+    const datasets = this.configs.map((_, i) => {
+      const color = `hsl(${Math.round((i * 360) / Math.max(1, this.configs.length))}, 70%, 45%)`;
+      return {
+        label: this.planName(i),
+        data: this.planPoints(i),
+        borderColor: color,
+        backgroundColor: color,
+        borderWidth: 2,
+        pointRadius: 0,
+        pointHitRadius: 8,
+      };
+    });
+
+    this._crossoverList.innerHTML = '';
+    for (const { units, price, cheaper, dearer } of this.result.crossovers) {
+      const item = document.createElement('li');
+      item.textContent = `${this.planName(cheaper)} becomes cheaper than ${this.planName(dearer)} after `
+        + `${round2(units)} units (${this.currency.symbol}${round2(price).toFixed(2)})`;
+      this._crossoverList.appendChild(item);
+    }
+
+    if (this.chart) {
+      this.chart.data.datasets = datasets;
+      this.chart.update('none');
+      return;
+    }
+    const canvas = this.container.querySelector('#pricing-compare-canvas');
+    if (!canvas) return;
+    this.chart = new Chart(canvas, {
+      type: 'line',
+      data: { datasets },
+      options: {
+        parsing: false,
+        responsive: true,
+        maintainAspectRatio: false,
+        interaction: { mode: 'nearest', axis: 'x', intersect: false },
+        plugins: {
+          tooltip: {
+            callbacks: {
+              title: (items) => `Units: ${items[0].parsed.x}`,
+              label: (item) => `${item.dataset.label}: ${this.currency.symbol}${item.formattedValue}`,
+            },
+          },
+        },
+        scales: {
+          x: {
+            type: 'linear',
+            title: { display: true, text: 'Number of Units' },
+            ticks: { maxTicksLimit: 12 },
+          },
+          y: {
+            type: 'linear',
+            title: { display: true, text: `Cumulative Price (${this.currency.symbol})` },
+            beginAtZero: true,
+          },
+        },
+      },
+    });
+  }
+
+  destroy() {
+    if (this.chart) this.chart.destroy();
+    this.chart = null;
   }
 }
@@ -0,0 +1,1028 @@
+// Pricing math with no DOM or Chart.js dependency: tier compilation and
+// evaluation, MRR/discount adjustment, chart series, revenue projection,
+// plan comparison and config (de)serialization. PricingComponent is built
+// on it and re-exports all of it; workers, headless scripts and tests can
+// import it directly.
+
+// `decimals` is the ISO 4217 minor unit, used by fixed-point invoicing.
+export const CURRENCIES = [
+  { code: 'USD', symbol: '$', decimals: 2 },
+  { code: 'EUR', symbol: '€', decimals: 2 },
+  { code: 'GBP', symbol: '£', decimals: 2 },
+  { code: 'JPY', symbol: '¥', decimals: 0 },
+  { code: 'CHF', symbol: 'CHF', decimals: 2 },
+  { code: 'CAD', symbol: 'CA$', decimals: 2 },
+  { code: 'AUD', symbol: 'A$', decimals: 2 },
+  { code: 'CNY', symbol: '¥', decimals: 2 },
+  { code: 'INR', symbol: '₹', decimals: 2 },
+  { code: 'BRL', symbol: 'R$', decimals: 2 },
+  { code: 'KRW', symbol: '₩', decimals: 0 },
+  { code: 'CZK', symbol: 'Kč', decimals: 2 },
+  { code: 'PLN', symbol: 'zł', decimals: 2 },
+];
+
+// Compile tiers into prefix sums over tier boundaries. Each tier stores the
+// unit offset and cumulative cost at which it starts, plus the cost of one
+// full repetition, so any usage can be priced with a binary search over
+// `starts` and a closed-form step through the repetitions.
+export function compileTiers(tiers) {
+  const sorted = [...tiers]
+    .sort((a, b) => a.sequence - b.sequence)
+    .filter((t) => t.units > 0);
+  const n = sorted.length;
+  const starts = new Float64Array(n);
+  const startCosts = new Float64Array(n);
+  const repCosts = new Float64Array(n);
+  const reps = new Float64Array(n);
+
+  let offset = 0;
+  let axisUnits = 0;
+  for (let i = 0; i < n; i++) {
+    const tier = sorted[i];
+    const count = tier.multiplier === Infinity ? Infinity : Math.ceil(Math.max(1, tier.multiplier));
+    starts[i] = offset;
+    reps[i] = count;
+    offset += tier.units * count;
+    // For unlimited tiers the chart x-axis shows 5 repetitions.
+    axisUnits += tier.units * (count === Infinity ? 5 : count);
+  }
+
+  const plan = { tiers: sorted, starts, startCosts, repCosts, reps, capacity: offset, totalCost: 0, axisUnits };
+  accumulateCosts(plan, 0);
+  return plan;
+}
+
+// (Re)compute the cost prefixes from tier `from` on. Unit offsets do not
+// depend on prices, so after a price, unit price or free-units edit this
+// is all that changes in a compiled plan.
+function accumulateCosts(plan, from) {
+  const { tiers, startCosts, repCosts, reps } = plan;
+  let cost = from > 0 ? startCosts[from - 1] + repCosts[from - 1] * reps[from - 1] : 0;
+  for (let i = from; i < tiers.length; i++) {
+    const tier = tiers[i];
+    startCosts[i] = cost;
+    repCosts[i] = tier.price + Math.max(0, tier.units - tier.freeUnits) * tier.unitPrice;
+    cost += repCosts[i] * reps[i];
+  }
+  plan.totalCost = cost;
+}
+
+export const MAX_POINTS = 1000;
+
+// Chart sample positions in [lo, range]. Cost is piecewise linear, so
+// every repetition start, free-unit edge and flat-fee step (one unit in) is
+// emitted exactly, and the stretches between them only get enough fill for
+// the curved average line (about `fills` points). A tier with more
+// repetition edges than its share of the point budget has its repetitions
+// strided (see edgeCount()).
+export function samplePoints(plan, range, maxPoints = MAX_POINTS, lo = 0, fills = Math.floor(maxPoints / 5)) {
+  const { tiers } = plan;
+  const visible = visibleEdges(plan, lo, range);
+  const share = visible.total > maxPoints ? maxPoints / visible.tiers : Infinity;
+
+  const edges = [lo, range];
+  for (let i = 0; i < tiers.length; i++) {
+    if (visible.counts[i] === 0) continue;
+    const { units, price, freeUnits } = tiers[i];
+    const stride = Math.max(1, Math.ceil(visible.counts[i] / share));
+    for (let r = visible.first[i]; r < visible.last[i]; r += stride) {
+      const b = plan.starts[i] + r * units;
+      edges.push(b);
+      if (price > 0 && units > 1) edges.push(b + 1);
+      if (freeUnits > 0 && freeUnits < units) edges.push(b + freeUnits);
+    }
+  }
+  edges.sort((a, b) => a - b);
+
+  const spacing = (range - lo) / Math.max(1, fills);
+  const points = [];
+  let last = -Infinity;
+  const push = (x) => {
+    if (x > last && x >= lo && x <= range) {
+      points.push(x);
+      last = x;
+    }
+  };
+  for (let k = 0; k < edges.length; k++) {
+    const x = edges[k];
+    // A visible repetition can have edges either side of the range.
+    if (x < lo) continue;
+    if (x > range) break;
+    const a = k > 0 ? Math.max(edges[k - 1], lo) : x;
+    if (x - a > spacing) {
+      const n = Math.ceil((x - a) / spacing);
+      for (let j = 1; j < n; j++) {
+        const p = a + (j * (x - a)) / n;
+        const fill = spacing >= 1 ? Math.round(p) : p;
+        if (fill < x) push(fill);
+      }
+    }
+    push(x);
+  }
+  return points;
+}
+
+// Repetitions [first, last) of each tier that fall in [lo, range], and how
+// many sample edges they hold (a repetition start, a flat-fee step and a
+// free-unit edge each).
+function visibleEdges(plan, lo, range) {
+  const { tiers, starts, reps } = plan;
+  const n = tiers.length;
+  const first = new Float64Array(n);
+  const last = new Float64Array(n);
+  const counts = new Float64Array(n);
+  let total = 0;
+  let visibleTiers = 0;
+  for (let i = 0; i < n && starts[i] < range; i++) {
+    const tier = tiers[i];
+    first[i] = Math.max(0, Math.floor((lo - starts[i]) / tier.units));
+    last[i] = Math.min(reps[i], Math.ceil((range - starts[i]) / tier.units));
+    if (last[i] <= first[i]) continue;
+    const perRep = 1 + (tier.price > 0 && tier.units > 1) + (tier.freeUnits > 0 && tier.freeUnits < tier.units);
+    counts[i] = (last[i] - first[i]) * perRep;
+    total += counts[i];
+    visibleTiers++;
+  }
+  return { first, last, counts, total, tiers: visibleTiers };
+}
+
+// Number of sample edges (breakpoints) of a plan in [lo, range].
+// samplePoints() places every one of them when this is within its budget.
+export function edgeCount(plan, range, lo = 0) {
+  return visibleEdges(plan, lo, range).total;
+}
+
+// Cost and marginal rate of the first N units of a compiled plan.
+export function evaluateTiers(plan, N) {
+  const { tiers, starts } = plan;
+  if (N <= 0 || tiers.length === 0) return { cost: 0, rate: 0 };
+  if (N > plan.capacity) return { cost: plan.totalCost, rate: 0 };
+
+  // Last tier starting strictly before N, i.e. N lies in (start, end].
+  let lo = 0;
+  let hi = tiers.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (starts[mid] < N) lo = mid;
+    else hi = mid - 1;
+  }
+
+  const tier = tiers[lo];
+  const local = N - starts[lo];
+  const rep = Math.ceil(local / tier.units) - 1;
+  const consumed = local - rep * tier.units;
+  const billable = Math.max(0, consumed - tier.freeUnits);
+  return {
+    cost: plan.startCosts[lo] + rep * plan.repCosts[lo] + tier.price + billable * tier.unitPrice,
+    rate: consumed <= tier.freeUnits ? 0 : tier.unitPrice,
+  };
+}
+
+// Invert the cost curve: the largest usage whose cost is at most `target`
+// (or, with `strict`, still below it). Cost only ever steps up at the start
+// of a repetition (its flat price) and is linear past the free units, so a
+// binary search over tier start costs, a division for the repetition and a
+// linear solve inside it give the exact answer. Returns Infinity when the
+// target is never exceeded and null when a strict target is never reached.
+function invertCost(plan, target, strict) {
+  const { tiers, starts, startCosts, repCosts, reps } = plan;
+  // Tiers after an unlimited one start at Infinity and are never reached.
+  let reachable = tiers.length;
+  while (reachable > 0 && starts[reachable - 1] === Infinity) reachable--;
+  let cap = 0;
+  if (reachable > 0) {
+    const k = reachable - 1;
+    cap = repCosts[k] === 0 ? startCosts[k] : startCosts[k] + repCosts[k] * reps[k];
+  }
+  if (strict ? target > cap : target >= cap) return strict ? null : Infinity;
+
+  // Last tier whose start cost is below (strict) or at most the target.
+  let lo = 0;
+  let hi = reachable - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (strict ? startCosts[mid] < target : startCosts[mid] <= target) lo = mid;
+    else hi = mid - 1;
+  }
+
+  const tier = tiers[lo];
+  const repCost = repCosts[lo];
+  const spent = target - startCosts[lo];
+  let rep = strict ? Math.ceil(spent / repCost) - 1 : Math.floor(spent / repCost);
+  rep = Math.min(Math.max(rep, 0), reps[lo] - 1);
+  // Undo a rounding slip of the division at an exact repetition boundary.
+  let left = spent - rep * repCost;
+  if (rep > 0 && (strict ? left <= 0 : left < 0)) rep--;
+  else if (rep < reps[lo] - 1 && (strict ? left > repCost : left >= repCost)) rep++;
+  left = spent - rep * repCost;
+  const start = starts[lo] + rep * tier.units;
+  if (strict ? left <= tier.price : left < tier.price) return start;
+  if (tier.unitPrice === 0) return start + tier.units;
+  const linear = start + Math.min(tier.freeUnits, tier.units) + (left - tier.price) / tier.unitPrice;
+  return Math.min(linear, start + tier.units);
+}
+
+// Most units whose raw usage cost stays within `cost` (Infinity if the
+// plan never costs more than that).
+export function unitsForCost(plan, cost) {
+  return cost < 0 ? null : invertCost(plan, cost, false);
+}
+
+// Usage at which the raw usage cost reaches `mrr`: every larger usage costs
+// at least the floor. null if the plan never gets there.
+export function breakEvenUsage(plan, mrr) {
+  return mrr <= 0 ? 0 : invertCost(plan, mrr, true);
+}
+
+// Integral of the raw cost over one repetition's first `offset` units,
+// on top of what was accrued before it: the flat price, then the unit
+// price past the free units.
+const repIntegral = (tier, offset) => {
+  const billable = Math.max(0, offset - tier.freeUnits);
+  return tier.price * offset + (tier.unitPrice * billable * billable) / 2;
+};
+
+// Integral of the raw cost over `k` whole repetitions of tier `i`: an
+// arithmetic series, since each repetition starts repCosts[i] higher.
+const repsIntegral = (plan, i, k) => {
+  const tier = plan.tiers[i];
+  return k * tier.units * plan.startCosts[i]
+    + (tier.units * plan.repCosts[i] * k * (k - 1)) / 2
+    + k * repIntegral(tier, tier.units);
+};
+
+// Integral of the raw usage cost over [0, N], in closed form. `before` is
+// the integral up to each tier's start (from tierIntegrals()), so a series
+// of calls on one plan can share it.
+export function costIntegral(plan, N, before = tierIntegrals(plan)) {
+  const { tiers, starts } = plan;
+  if (N <= 0 || tiers.length === 0) return 0;
+  const x = Math.min(N, plan.capacity);
+  let lo = 0;
+  let hi = tiers.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (starts[mid] < x) lo = mid;
+    else hi = mid - 1;
+  }
+  const tier = tiers[lo];
+  const rep = Math.max(0, Math.ceil((x - starts[lo]) / tier.units) - 1);
+  const consumed = x - starts[lo] - rep * tier.units;
+  const integral = before[lo] + repsIntegral(plan, lo, rep)
+    + consumed * (plan.startCosts[lo] + rep * plan.repCosts[lo]) + repIntegral(tier, consumed);
+  return N > plan.capacity ? integral + plan.totalCost * (N - plan.capacity) : integral;
+}
+
+// costIntegral() up to the start of every tier.
+export function tierIntegrals(plan) {
+  const before = new Float64Array(plan.tiers.length);
+  for (let i = 1; i < before.length; i++) before[i] = before[i - 1] + repsIntegral(plan, i - 1, plan.reps[i - 1]);
+  return before;
+}
+
+// Expected revenue of a usage histogram: `counts[k]` customers in bucket
+// [edges[k], edges[k + 1]], spread evenly over it or, given `means`, over
+// the part of it centred on the bucket's mean usage. Each bucket is priced
+// from costIntegral() at two points rather than per customer, with the MRR
+// floor applied below the break-even usage; a zero-width bucket holds
+// customers at exactly that usage. Mirrors project_compiled() in
+// pricing_engine.py.
+export function projectRevenue(plan, mrr, discount, { edges, counts, means = null }) {
+  const n = counts.length;
+  if (edges.length !== n + 1) throw new RangeError('need one more bucket edge than bucket counts');
+  const factor = 1 - discount / 100;
+  const breakEven = breakEvenUsage(plan, mrr) ?? Infinity;
+  const before = tierIntegrals(plan);
+  const floored = (x) => {
+    const m = Math.min(x, breakEven);
+    return costIntegral(plan, x, before) + mrr * m - costIntegral(plan, m, before);
+  };
+
+  const revenue = new Float64Array(n);
+  const onFloor = new Float64Array(n);
+  let total = 0;
+  let customers = 0;
+  let floorCustomers = 0;
+  let units = 0;
+  for (let k = 0; k < n; k++) {
+    let lo = edges[k];
+    let hi = edges[k + 1];
+    if (!(hi >= lo && lo >= 0)) throw new RangeError('bucket edges must be non-negative and sorted');
+    const centre = means ? Math.min(Math.max(means[k], lo), hi) : (lo + hi) / 2;
+    if (means) {
+      const half = Math.min(centre - lo, hi - centre);
+      lo = centre - half;
+      hi = centre + half;
+    }
+    const width = hi - lo;
+    const meanCost = width > 0
+      ? (floored(hi) - floored(lo)) / width
+      : Math.max(evaluateTiers(plan, lo).cost, mrr);
+    const floorFraction = width > 0 ? Math.min(Math.max((breakEven - lo) / width, 0), 1) : +(lo < breakEven);
+    revenue[k] = counts[k] * meanCost * factor;
+    onFloor[k] = counts[k] * floorFraction;
+    total += revenue[k];
+    customers += counts[k];
+    floorCustomers += onFloor[k];
+    units += counts[k] * centre;
+  }
+  return {
+    revenue,
+    onFloor,
+    total,
+    customers,
+    floorShare: customers > 0 ? floorCustomers / customers : NaN,
+    averagePrice: units > 0 ? total / units : NaN,
+  };
+}
+
+// Equal-count buckets for raw usage samples, as { edges, counts, means }.
+// Repeated quantiles are merged; all-equal samples give one zero-width
+// bucket. Mirrors usage_histogram() in pricing_engine.py.
+export function usageHistogram(samples, bins = 100) {
+  const sorted = Float64Array.from(samples).sort();
+  const n = sorted.length;
+  if (n === 0) throw new RangeError('need at least one usage sample');
+  const edges = [];
+  for (let q = 0; q <= bins; q++) {
+    const pos = (q / bins) * (n - 1);
+    const i = Math.floor(pos);
+    const x = i + 1 < n ? sorted[i] + (pos - i) * (sorted[i + 1] - sorted[i]) : sorted[i];
+    if (edges.length === 0 || x > edges[edges.length - 1]) edges.push(x);
+  }
+  if (edges.length === 1) edges.push(edges[0]);
+  const buckets = edges.length - 1;
+  const counts = new Float64Array(buckets);
+  const means = new Float64Array(buckets);
+  // Buckets are [lo, hi) except the last, which also takes its upper edge.
+  let k = 0;
+  for (let j = 0; j < n; j++) {
+    while (k < buckets - 1 && sorted[j] >= edges[k + 1]) k++;
+    counts[k]++;
+    means[k] += sorted[j];
+  }
+  for (let b = 0; b < buckets; b++) means[b] = counts[b] > 0 ? means[b] / counts[b] : (edges[b] + edges[b + 1]) / 2;
+  return { edges: Float64Array.from(edges), counts, means };
+}
+
+// Tiers from a toJSON() config, with the serialized multiplier restored.
+export function tiersFromJSON(tiers) {
+  return tiers.map((t) => ({
+    ...t,
+    multiplier: t.multiplier === 'infinity' || t.multiplier === Infinity ? Infinity : (t.multiplier || 1),
+  }));
+}
+
+// The toJSON() form of a pricing state: currency code, MRR, discount and
+// tiers, with an unlimited multiplier spelled 'infinity'.
+export function configToJSON({ currency, mrr, discount, tiers }) {
+  return {
+    currency: typeof currency === 'string' ? currency : currency.code,
+    mrr,
+    discount,
+    tiers: tiers.map((t) => ({
+      ...t,
+      multiplier: t.multiplier === Infinity ? 'infinity' : t.multiplier,
+    })),
+  };
+}
+
+// The usable fields of a toJSON()-style config as pricing state: a
+// CURRENCIES entry (USD for an unknown code), numbers, and tiers with
+// Infinity multipliers. Missing fields are left out, so the caller keeps
+// its current values for them.
+export function configFromJSON(config) {
+  const state = {};
+  if (config.currency) {
+    state.currency = CURRENCIES.find((c) => c.code === config.currency) || CURRENCIES[0];
+  }
+  if (typeof config.mrr === 'number') state.mrr = config.mrr;
+  if (typeof config.discount === 'number') state.discount = config.discount;
+  if (Array.isArray(config.tiers) && config.tiers.length > 0) {
+    state.tiers = tiersFromJSON(config.tiers);
+  }
+  return state;
+}
+
+// Compact, URL-safe config encoding for the location hash and
+// localStorage: `currency,mrr,discount`, then one
+// `sequence,units,price,unitPrice,freeUnits,multiplier` group per tier,
+// all separated by `;`, with `~` for an unlimited multiplier.
+const encodeNumber = (x) => String(x).replace('e+', 'e');
+
+export function encodeConfig(config) {
+  const head = [config.currency || 'USD', encodeNumber(config.mrr || 0), encodeNumber(config.discount || 0)];
+  const rows = config.tiers.map((t) => [
+    ...[t.sequence, t.units, t.price, t.unitPrice, t.freeUnits].map(encodeNumber),
+    t.multiplier === Infinity || t.multiplier === 'infinity' ? '~' : encodeNumber(t.multiplier),
+  ].join(','));
+  return [head.join(','), ...rows].join(';');
+}
+
+// Inverse of encodeConfig(): a toJSON()-style config, or null when the text
+// is not a valid encoding.
+export function decodeConfig(text) {
+  let decoded;
+  try {
+    decoded = decodeURIComponent(text);
+  } catch {
+    return null;
+  }
+  const [head, ...rows] = decoded.split(';');
+  const [currency, ...globals] = head.split(',');
+  const numbers = (fields) => fields.map((f) => (f === '' ? NaN : Number(f)));
+  const [mrr, discount] = numbers(globals);
+  if (globals.length !== 2 || !Number.isFinite(mrr) || !Number.isFinite(discount) || rows.length === 0) return null;
+  const tiers = [];
+  for (const row of rows) {
+    const fields = row.split(',');
+    const values = numbers(fields.slice(0, 5));
+    const multiplier = fields[5] === '~' ? 'infinity' : Number(fields[5]);
+    if (fields.length !== 6 || !values.every(Number.isFinite) || !(multiplier === 'infinity' || Number.isFinite(multiplier))) {
+      return null;
+    }
+    const [sequence, units, price, unitPrice, freeUnits] = values;
+    tiers.push({ sequence, units, price, unitPrice, freeUnits, multiplier });
+  }
+  return { currency, mrr, discount, tiers };
+}
+
+// Every usage in (0, range) where a plan's cost jumps or changes slope:
+// repetition starts, free-unit edges and the end of a finite plan. Between
+// consecutive breakpoints the cost is linear.
+export function planBreakpoints(plan, range) {
+  const { tiers, starts, reps } = plan;
+  const edges = [];
+  for (let i = 0; i < tiers.length && starts[i] < range; i++) {
+    const { units, freeUnits } = tiers[i];
+    const visible = Math.min(reps[i], Math.ceil((range - starts[i]) / units));
+    for (let r = 0; r < visible; r++) {
+      const b = starts[i] + r * units;
+      if (b > 0) edges.push(b);
+      if (freeUnits > 0 && freeUnits < units && b + freeUnits < range) edges.push(b + freeUnits);
+    }
+  }
+  if (plan.capacity < range) edges.push(plan.capacity);
+  return edges;
+}
+
+// Price several toJSON() configs over one shared axis: the merged
+// breakpoints of all plans (plus each MRR break-even), so every plan is
+// linear between neighbouring labels and the work grows with the number of
+// breakpoints rather than configs x samples. For each plan, `left[k]` is
+// the adjusted price at labels[k] and `right[k]` the price just after it,
+// past any flat-fee jump. `crossovers` lists, for every pair of plans, the
+// exact usages where the cheaper one changes.
+export function compareConfigs(configs) {
+  const plans = configs.map((c) => compileTiers(tiersFromJSON(c.tiers)));
+  const range = plans.reduce((max, plan) => Math.max(max, plan.axisUnits), 0);
+  if (range === 0) return { labels: new Float64Array(0), left: [], right: [], crossovers: [] };
+
+  const edges = [0, range];
+  plans.forEach((plan, i) => {
+    for (const x of planBreakpoints(plan, range)) edges.push(x);
+    const breakEven = breakEvenUsage(plan, configs[i].mrr || 0);
+    if (breakEven !== null && breakEven > 0 && breakEven < range) edges.push(breakEven);
+  });
+  const sorted = Float64Array.from(edges).sort();
+  let n = 0;
+  for (let k = 0; k < sorted.length; k++) {
+    if (n === 0 || sorted[k] !== sorted[n - 1]) sorted[n++] = sorted[k];
+  }
+  const labels = sorted.slice(0, n);
+
+  const left = [];
+  const right = [];
+  plans.forEach((plan, i) => {
+    const mrr = configs[i].mrr || 0;
+    const factor = 1 - (configs[i].discount || 0) / 100;
+    const l = new Float64Array(n);
+    const r = new Float64Array(n);
+    let next = evaluateTiers(plan, labels[n - 1]);
+    l[n - 1] = r[n - 1] = Math.max(mrr, next.cost) * factor;
+    for (let k = n - 2; k >= 0; k--) {
+      // The segment up to the next label is linear at that label's rate, so
+      // the value just after labels[k] is extrapolated back from it.
+      const after = next.cost - next.rate * (labels[k + 1] - labels[k]);
+      next = evaluateTiers(plan, labels[k]);
+      l[k] = Math.max(mrr, next.cost) * factor;
+      r[k] = Math.max(mrr, after) * factor;
+    }
+    left.push(l);
+    right.push(r);
+  });
+
+  const crossovers = [];
+  for (let a = 0; a < plans.length; a++) {
+    for (let b = a + 1; b < plans.length; b++) findCrossovers(labels, left, right, a, b, crossovers);
+  }
+  crossovers.sort((p, q) => p.units - q.units);
+  return { labels, left, right, crossovers };
+}
+
+// Walk the difference between plans a and b through every label and the
+// linear segment after it, recording each point where its sign flips. A
+// stretch where both cost the same ends at the crossover.
+function findCrossovers(labels, left, right, a, b, out) {
+  const la = left[a];
+  const lb = left[b];
+  const ra = right[a];
+  const rb = right[b];
+  const sign = (p, q) => {
+    const d = p - q;
+    return Math.abs(d) <= 1e-9 * Math.max(1, Math.abs(p), Math.abs(q)) ? 0 : d < 0 ? -1 : 1;
+  };
+  const record = (units, price, s) => out.push({ units, price, cheaper: s < 0 ? a : b, dearer: s < 0 ? b : a });
+  let current = 0;
+  let prev = 0;
+  for (let k = 0; k < labels.length; k++) {
+    const atLabel = sign(la[k], lb[k]);
+    if (atLabel !== 0 && atLabel !== current) {
+      if (current !== 0) {
+        // Crossed inside the linear segment (labels[k - 1], labels[k]].
+        const x0 = labels[k - 1];
+        const d0 = ra[k - 1] - rb[k - 1];
+        const t = prev === 0 ? 0 : d0 / (d0 - (la[k] - lb[k]));
+        record(x0 + t * (labels[k] - x0), ra[k - 1] + t * (la[k] - ra[k - 1]), atLabel);
+      }
+      current = atLabel;
+    }
+    const afterLabel = sign(ra[k], rb[k]);
+    if (afterLabel !== 0 && afterLabel !== current) {
+      // A flat-fee jump at labels[k] reorders the plans.
+      if (current !== 0) record(labels[k], Math.min(la[k], lb[k]), afterLabel);
+      current = afterLabel;
+    }
+    prev = afterLabel;
+  }
+}
+
+export const round2 = (x) => Math.round(x * 100) / 100;
+
+// Fixed-point invoicing, mirroring quote_fixed() in pricing_engine.py so
+// an invoice total is the same integer in the UI and the batch engine.
+// Amounts are BigInts held SUBUNIT_DIGITS digits below the currency's
+// minor unit, discounts in millionths; usage and tier sizes must be whole
+// units. Only the final total is rounded (half up) to the minor unit.
+export const SUBUNIT_DIGITS = 4;
+const DISCOUNT_SCALE = 1000000n;
+const INT64_MAX = 2n ** 63n - 1n;
+
+// A number as a BigInt count of 10^-digits, rounded half up. It is read
+// from its shortest decimal form, so 0.1 is exactly one tenth.
+export function scaleDecimal(value, digits) {
+  const [mantissa, exponent = '0'] = String(value).toLowerCase().split('e');
+  const negative = mantissa.startsWith('-');
+  const [whole, fraction = ''] = mantissa.replace('-', '').split('.');
+  const shift = digits + Number(exponent) - fraction.length;
+  let n = BigInt(whole + fraction);
+  if (shift >= 0) {
+    n *= 10n ** BigInt(shift);
+  } else {
+    const d = 10n ** BigInt(-shift);
+    n = (2n * n + d) / (2n * d);
+  }
+  return negative ? -n : n;
+}
+
+function wholeUnits(value, name) {
+  if (!Number.isInteger(value)) throw new RangeError(`fixed-point pricing needs whole ${name}, got ${value}`);
+  return BigInt(value);
+}
+
+export function currencyDecimals(currency) {
+  const code = typeof currency === 'string' ? currency : currency?.code;
+  return CURRENCIES.find((c) => c.code === code)?.decimals ?? 2;
+}
+
+// compileTiers() with BigInt amounts. Unlimited repetitions, and the
+// starts of the unreachable tiers after them, are null.
+export function compileFixed(tiers, decimals = 2) {
+  const digits = decimals + SUBUNIT_DIGITS;
+  const sorted = [...tiers]
+    .sort((a, b) => a.sequence - b.sequence)
+    .filter((t) => t.units > 0);
+  const rows = [];
+  let start = 0n;
+  let cost = 0n;
+  for (const t of sorted) {
+    const units = wholeUnits(t.units, 'tier units');
+    const freeUnits = wholeUnits(t.freeUnits, 'free units');
+    const unlimited = t.multiplier === Infinity || t.multiplier === 'infinity';
+    const reps = unlimited ? null : BigInt(Math.ceil(Math.max(1, t.multiplier || 1)));
+    const price = scaleDecimal(t.price, digits);
+    const unitPrice = scaleDecimal(t.unitPrice, digits);
+    const billable = units > freeUnits ? units - freeUnits : 0n;
+    const repCost = price + billable * unitPrice;
+    rows.push({ units, freeUnits, price, unitPrice, reps, repCost, start, startCost: cost });
+    if (start === null || reps === null) {
+      start = null;
+      cost = null;
+    } else {
+      start += units * reps;
+      cost += repCost * reps;
+    }
+  }
+  return { tiers: rows, capacity: start, totalCost: cost, decimals };
+}
+
+// Raw cost of a whole-unit usage in sub-minor units (evaluateTiers() in BigInt).
+export function fixedCost(fixed, usage) {
+  const n = typeof usage === 'bigint' ? usage : wholeUnits(usage, 'units of usage');
+  const { tiers } = fixed;
+  if (n <= 0n || tiers.length === 0) return 0n;
+  if (fixed.capacity !== null && n > fixed.capacity) return fixed.totalCost;
+  let lo = 0;
+  let hi = tiers.length - 1;
+  while (lo < hi) {
+    const mid = (lo + hi + 1) >> 1;
+    if (tiers[mid].start !== null && tiers[mid].start < n) lo = mid;
+    else hi = mid - 1;
+  }
+  const tier = tiers[lo];
+  const local = n - tier.start;
+  const rep = (local - 1n) / tier.units;
+  const consumed = local - rep * tier.units;
+  const billable = consumed > tier.freeUnits ? consumed - tier.freeUnits : 0n;
+  return tier.startCost + rep * tier.repCost + tier.price + billable * tier.unitPrice;
+}
+
+// Invoice totals as BigInt minor units (cents, or yen for JPY):
+// max(mrr, cost) * (1 - discount / 100), rounded half up once. Costs
+// beyond the batch engine's int64 range throw a RangeError.
+export function quoteMinor(tiers, mrr, discount, currency, usages) {
+  const fixed = compileFixed(tiers, currencyDecimals(currency));
+  const floor = scaleDecimal(mrr, fixed.decimals + SUBUNIT_DIGITS);
+  const keep = DISCOUNT_SCALE - scaleDecimal(discount, 4);
+  const divisor = DISCOUNT_SCALE * 10n ** BigInt(SUBUNIT_DIGITS);
+  return Array.from(usages, (usage) => {
+    const cost = fixedCost(fixed, usage);
+    if (cost > INT64_MAX) throw new RangeError('cost exceeds the int64 fixed-point range');
+    const floored = cost > floor ? cost : floor;
+    return (2n * floored * keep + divisor) / (2n * divisor);
+  });
+}
+
+// Minor units as a decimal string: formatMinor(123456n, 2) is '1234.56'.
+export function formatMinor(amount, decimals) {
+  const value = BigInt(amount);
+  const sign = value < 0n ? '-' : '';
+  const digits = (value < 0n ? -value : value).toString().padStart(decimals + 1, '0');
+  if (decimals === 0) return sign + digits;
+  return `${sign}${digits.slice(0, -decimals)}.${digits.slice(-decimals)}`;
+}
+
+// Chart x positions for a compiled plan at a point budget. samplePoints()
+// keeps at least one edge per tier, so below full resolution (slider
+// previews) the budget is a hard cap instead, taken evenly from those
+// positions so the points drawn still sit on breakpoints.
+function seriesLabels(plan, maxPoints) {
+  const range = plan.axisUnits;
+  let xs = range === 0 ? [] : samplePoints(plan, range, maxPoints);
+  if (maxPoints < MAX_POINTS && xs.length > maxPoints) {
+    const step = (xs.length - 1) / (maxPoints - 1);
+    xs = Array.from({ length: maxPoints }, (_, k) => xs[Math.round(k * step)]);
+  }
+  return Float64Array.from(xs);
+}
+
+// Raw (undiscounted, unfloored) cost and marginal rate at labels[from:].
+function priceLabels(plan, labels, costs, rates, from) {
+  for (let i = from; i < labels.length; i++) {
+    const { cost, rate } = evaluateTiers(plan, labels[i]);
+    costs[i] = cost;
+    rates[i] = rate;
+  }
+}
+
+// Apply the MRR floor and discount to raw costs, rounded to cents. With
+// `out`, only points from `from` on are written into its arrays.
+function finishSeries(labels, costs, rates, mrr, discount, out = null, from = 0) {
+  const n = labels.length;
+  const cumulative = out ? out.cumulative : new Float64Array(n);
+  const average = out ? out.average : new Float64Array(n);
+  const current = out ? out.current : new Float64Array(n);
+  const factor = 1 - discount / 100;
+
+  for (let i = from; i < n; i++) {
+    const N = labels[i];
+    const cost = costs[i];
+    const overFloor = cost >= mrr;
+    const adjusted = Math.max(mrr, cost) * factor;
+    cumulative[i] = round2(adjusted);
+    average[i] = N > 0 && overFloor ? round2(adjusted / N) : NaN;
+    current[i] = round2((overFloor ? rates[i] : 0) * factor);
+  }
+
+  return { labels, cumulative, average, current };
+}
+
+// The chart series for a tier config as typed arrays, rounded to cents.
+// `average` is NaN where the chart leaves a gap (no usage yet, or still
+// under the MRR floor). Safe to call from a worker.
+export function computeSeries(tiers, mrr, discount, maxPoints = MAX_POINTS) {
+  const plan = compileTiers(tiers);
+  const labels = seriesLabels(plan, maxPoints);
+  const costs = new Float64Array(labels.length);
+  const rates = new Float64Array(labels.length);
+  priceLabels(plan, labels, costs, rates, 0);
+  return finishSeries(labels, costs, rates, mrr, discount);
+}
+
+// computeSeries() over the unit range [lo, hi] only, e.g. a zoomed view.
+// Every breakpoint in the range fits a high-resolution budget, but the
+// fill between them only needs to be fine enough for the display.
+export function computeSeriesRange(tiers, mrr, discount, lo, hi, maxPoints = HIGH_RES_POINTS) {
+  const plan = compileTiers(tiers);
+  const fills = Math.min(Math.floor(maxPoints / 5), 4 * DISPLAY_BUCKETS);
+  const labels = Float64Array.from(hi > lo ? samplePoints(plan, hi, maxPoints, lo, fills) : []);
+  const costs = new Float64Array(labels.length);
+  const rates = new Float64Array(labels.length);
+  priceLabels(plan, labels, costs, rates, 0);
+  return finishSeries(labels, costs, rates, mrr, discount);
+}
+
+// High-resolution mode evaluates up to this many points: every breakpoint
+// unless a plan has more, then fill for the average line.
+export const HIGH_RES_POINTS = 200000;
+// ...and draws about this many min/max buckets of them.
+export const DISPLAY_BUCKETS = 1000;
+
+// Downsample a series for display, keeping its shape: the unit range
+// [lo, hi] is cut into `buckets` equal-width buckets and each keeps its
+// first and last point plus the points where any of the three lines is
+// lowest or highest. Price jumps and marginal-rate steps therefore survive
+// at sub-bucket precision, as do the ends of gaps in the average line.
+export function decimateSeries(series, lo, hi, buckets = DISPLAY_BUCKETS) {
+  const { labels, cumulative, average, current } = series;
+  const n = labels.length;
+  if (n <= 4 * buckets || !(hi > lo)) return series;
+  const keep = [];
+  const scale = buckets / (hi - lo);
+  const lines = [cumulative, average, current];
+  const lowest = new Int32Array(3);
+  const highest = new Int32Array(3);
+  let bucket = -1;
+  let firstIndex = 0;
+  const flush = (lastIndex) => {
+    const picked = [firstIndex, lastIndex];
+    for (let s = 0; s < 3; s++) {
+      if (lowest[s] >= 0) picked.push(lowest[s], highest[s]);
+    }
+    picked.sort((a, b) => a - b);
+    for (let k = 0; k < picked.length; k++) {
+      if (k === 0 || picked[k] !== picked[k - 1]) keep.push(picked[k]);
+    }
+  };
+  for (let i = 0; i < n; i++) {
+    const b = Math.min(buckets - 1, Math.floor((labels[i] - lo) * scale));
+    const gapEdge = i > 0 && Number.isNaN(average[i]) !== Number.isNaN(average[i - 1]);
+    if (b !== bucket || gapEdge) {
+      if (bucket !== -1) flush(i - 1);
+      bucket = b;
+      firstIndex = i;
+      lowest.fill(-1);
+      highest.fill(-1);
+    }
+    for (let s = 0; s < 3; s++) {
+      const y = lines[s][i];
+      if (Number.isNaN(y)) continue;
+      if (lowest[s] < 0 || y < lines[s][lowest[s]]) lowest[s] = i;
+      if (highest[s] < 0 || y > lines[s][highest[s]]) highest[s] = i;
+    }
+  }
+  flush(n - 1);
+
+  const pick = (values) => Float64Array.from(keep, (i) => values[i]);
+  return { labels: pick(labels), cumulative: pick(cumulative), average: pick(average), current: pick(current) };
+}
+
+// Tier fields in snapshot order. The first PRICED_FIELDS decide what a
+// compiled tier costs; sequence only matters before sorting.
+const TIER_FIELDS = ['units', 'price', 'unitPrice', 'freeUnits', 'multiplier', 'sequence'];
+const PRICED_FIELDS = 5;
+
+// Tier objects are edited in place, so the values priced last time are
+// kept as a flat copy to diff against.
+function tierSnapshot(tiers) {
+  const values = new Float64Array(tiers.length * TIER_FIELDS.length);
+  let k = 0;
+  for (const tier of tiers) {
+    values[k++] = tier.units;
+    values[k++] = tier.price;
+    values[k++] = tier.unitPrice;
+    values[k++] = tier.freeUnits;
+    values[k++] = tier.multiplier;
+    values[k++] = tier.sequence;
+  }
+  return values;
+}
+
+// Index of the first tier whose first `fields` values differ; the shorter
+// length if one list extends the other, and -1 if nothing changed.
+function firstChangedTier(before, after, fields = PRICED_FIELDS) {
+  const width = TIER_FIELDS.length;
+  const n = Math.min(before.length, after.length);
+  for (let k = 0; k < n; k++) {
+    if (before[k] !== after[k] && k % width < fields && !(Number.isNaN(before[k]) && Number.isNaN(after[k]))) {
+      return Math.floor(k / width);
+    }
+  }
+  return before.length === after.length ? -1 : n / width;
+}
+
+// Fields that leave a compiled tier's order and unit offsets alone.
+const COST_FIELDS = new Set([1, 2, 3]);
+
+// Diff the component's tiers against the last call. Returns -1 if nothing
+// changed, the first compiled tier touched if only costs changed (price,
+// unit price, free units) on tiers still in `plan`, and null otherwise,
+// when the plan has to be recompiled.
+function costOnlyEdit(before, after, tiers, plan) {
+  if (before.length !== after.length) return null;
+  const width = TIER_FIELDS.length;
+  let first = -1;
+  for (let k = 0; k < after.length; k++) {
+    if (before[k] === after[k] || (Number.isNaN(before[k]) && Number.isNaN(after[k]))) continue;
+    if (!COST_FIELDS.has(k % width)) return null;
+    const i = Math.floor(k / width);
+    // Compiled tiers are the component's own objects, edited in place.
+    const index = plan.tiers.indexOf(tiers[i]);
+    if (index === -1) return null;
+    if (first === -1 || index < first) first = index;
+    k = i * width + width - 1;
+  }
+  return first;
+}
+
+// Whether tiers from `from` on still produce the sample positions they did
+// before: same axis range, repetition edges, flat-fee steps and free-unit
+// edges (see samplePoints()). `snapshot` holds the previous tier values.
+function sameEdges(previous, snapshot, plan, from) {
+  if (previous.axisUnits !== plan.axisUnits || previous.tiers.length !== plan.tiers.length) return false;
+  const width = TIER_FIELDS.length;
+  for (let i = from; i < plan.tiers.length; i++) {
+    const { units, price, freeUnits } = plan.tiers[i];
+    const oldFree = snapshot[i * width + 3];
+    if (units !== snapshot[i * width] || plan.reps[i] !== previous.reps[i]) return false;
+    if ((price > 0) !== (snapshot[i * width + 1] > 0)) return false;
+    const edge = freeUnits > 0 && freeUnits < units;
+    if (edge !== (oldFree > 0 && oldFree < units) || (edge && freeUnits !== oldFree)) return false;
+  }
+  return true;
+}
+
+// computeSeries() that remembers its last result. Points at or below the
+// start of the first edited tier cost the same as before, so an edit
+// reprices only the points after it (the sample positions are reused when
+// the edit cannot move them, e.g. a unit price), and an MRR or discount
+// change only reapplies the floor and discount to the stored raw costs.
+// The finished points before an edited tier are copied rather than redone
+// too. `last` reports what the latest update() did: `mode` is 'full',
+// 'suffix' or 'rescale', `repriced` the number of points evaluated;
+// `exact` is whether the sample positions include every breakpoint.
+export class SeriesCache {
+  constructor() {
+    this.plan = null;
+    this.input = null;
+    this.snapshot = null;
+    this.maxPoints = 0;
+    this.labels = null;
+    this.costs = null;
+    this.rates = null;
+    this.series = null;
+    this.mrr = null;
+    this.discount = null;
+    this.exact = false;
+    this.last = null;
+  }
+
+  // The series as fresh typed arrays: callers may keep or transfer the
+  // result, so it never aliases the cache.
+  update(tiers, mrr, discount, maxPoints = MAX_POINTS) {
+    this.refresh(tiers, mrr, discount, maxPoints);
+    const { cumulative, average, current } = this.series;
+    return { labels: this.labels.slice(), cumulative: cumulative.slice(), average: average.slice(), current: current.slice() };
+  }
+
+  // update() without the copies: the result is left in `labels` and
+  // `series`, which the next call overwrites.
+  refresh(tiers, mrr, discount, maxPoints = MAX_POINTS) {
+    const input = tierSnapshot(tiers);
+    const reusable = this.plan !== null && maxPoints === this.maxPoints;
+    let plan = this.plan;
+    let changed = reusable ? costOnlyEdit(this.input, input, tiers, plan) : null;
+    if (changed === -1) {
+      // Only MRR or discount moved: not even a compile.
+      this.last = { mode: 'rescale', repriced: 0 };
+      this._finish(this.labels.length, mrr, discount);
+      return;
+    }
+    if (changed === null) {
+      plan = compileTiers(tiers);
+      changed = reusable ? firstChangedTier(this.snapshot, tierSnapshot(plan.tiers)) : 0;
+    }
+    // Patched in place below, so the previous plan's reps/axis are this one's.
+    const previous = this.plan;
+
+    let mode = 'full';
+    let from = 0;
+    if (reusable && changed === -1) {
+      // Only the order or sequence numbers changed, not the sorted tiers.
+      mode = 'rescale';
+      from = this.labels.length;
+    } else if (reusable && changed < plan.tiers.length && sameEdges(previous, this.snapshot, plan, changed)) {
+      if (plan === previous) accumulateCosts(plan, changed);
+      // First label past the tier's start; cost is left-continuous, so a
+      // label exactly on the start still belongs to the tier before it.
+      const start = plan.starts[changed];
+      let lo = 0;
+      let hi = this.labels.length;
+      while (lo < hi) {
+        const mid = (lo + hi) >> 1;
+        if (this.labels[mid] <= start) lo = mid + 1;
+        else hi = mid;
+      }
+      mode = 'suffix';
+      from = lo;
+    } else {
+      if (plan === previous) accumulateCosts(plan, changed);
+      this.labels = seriesLabels(plan, maxPoints);
+      this.exact = edgeCount(plan, plan.axisUnits) <= maxPoints;
+      this.costs = new Float64Array(this.labels.length);
+      this.rates = new Float64Array(this.labels.length);
+      this.series = null;
+    }
+    priceLabels(plan, this.labels, this.costs, this.rates, from);
+    this.plan = plan;
+    this.input = input;
+    this.snapshot = tierSnapshot(plan.tiers);
+    this.maxPoints = maxPoints;
+    this.last = { mode, repriced: this.labels.length - from };
+    this._finish(from, mrr, discount);
+  }
+
+  // Finish points from `from` on (all of them if MRR or discount changed).
+  _finish(from, mrr, discount) {
+    const n = this.labels.length;
+    if (this.series === null) {
+      this.series = { cumulative: new Float64Array(n), average: new Float64Array(n), current: new Float64Array(n) };
+      from = 0;
+    } else if (mrr !== this.mrr || discount !== this.discount) {
+      from = 0;
+    }
+    finishSeries(this.labels, this.costs, this.rates, mrr, discount, this.series, from);
+    this.mrr = mrr;
+    this.discount = discount;
+  }
+}
+
+const copySeries = ({ labels, cumulative, average, current }) => ({
+  labels: labels.slice(), cumulative: cumulative.slice(), average: average.slice(), current: current.slice(),
+});
+
+// First index in sorted `xs` whose value is above `x` (or at least `x`
+// with `inclusive`).
+function searchSorted(xs, x, inclusive) {
+  let lo = 0;
+  let hi = xs.length;
+  while (lo < hi) {
+    const mid = (lo + hi) >> 1;
+    if (xs[mid] < x || (!inclusive && xs[mid] === x)) lo = mid + 1;
+    else hi = mid;
+  }
+  return lo;
+}
+
+// The high-resolution chart series for the unit range `view` ([lo, hi],
+// the whole axis when null), decimated to `buckets` (see decimateSeries()).
+// The whole axis is evaluated at up to HIGH_RES_POINTS points through
+// `cache`, so edits stay incremental, and a zoom only cuts its range out
+// of those points. It is sampled afresh instead when the stored points
+// skip breakpoints (strided repetitions) or are too sparse to fill the
+// buckets. Safe to call from a worker.
+export function highResSeries(cache, tiers, mrr, discount, view = null, buckets = DISPLAY_BUCKETS) {
+  cache.refresh(tiers, mrr, discount, HIGH_RES_POINTS);
+  const { labels } = cache;
+  const full = { labels, ...cache.series };
+  const end = labels.length ? labels[labels.length - 1] : 0;
+  let [lo, hi] = view || [0, end];
+  lo = Math.max(0, lo);
+  let series = full;
+  if (view) {
+    const a = searchSorted(labels, lo, true);
+    const b = searchSorted(labels, hi, false);
+    if (cache.exact && hi <= end && b - a >= buckets) {
+      series = {
+        labels: labels.subarray(a, b),
+        cumulative: full.cumulative.subarray(a, b),
+        average: full.average.subarray(a, b),
+        current: full.current.subarray(a, b),
+      };
+    } else {
+      series = computeSeriesRange(tiers, mrr, discount, lo, hi);
+    }
+  }
+  const shown = decimateSeries(series, lo, hi, buckets);
+  return shown === full || shown.labels.buffer === labels.buffer ? copySeries(shown) : shown;
+}
@@ -0,0 +1,31 @@
+import { SeriesCache, computeSeriesRange, highResSeries } from './pricing-engine.js';
+
+// Prices tier configs off the main thread for PricingComponent's worker
+// mode. Each worker serves one component, so its caches see that
+// component's successive edits and reprice incrementally; slider previews
+// have their own cache so they do not reset the full-resolution one. The
+// series buffers are transferred back rather than copied.
+const series = new SeriesCache();
+const previewSeries = new SeriesCache();
+const detail = new SeriesCache();
+
+self.onmessage = (e) => {
+  const { id, tiers, mrr, discount, maxPoints, preview, highRes, view } = e.data;
+  let result;
+  let update = null;
+  if (highRes) {
+    result = highResSeries(detail, tiers, mrr, discount, view);
+    update = detail.last;
+  } else if (view) {
+    result = computeSeriesRange(tiers, mrr, discount, view[0], view[1], maxPoints);
+  } else {
+    const cache = preview ? previewSeries : series;
+    result = cache.update(tiers, mrr, discount, maxPoints);
+    update = cache.last;
+  }
+  const { labels, cumulative, average, current } = result;
+  self.postMessage(
+    { id, labels, cumulative, average, current, update },
+    [labels.buffer, cumulative.buffer, average.buffer, current.buffer],
+  );
+};
@@ -0,0 +1,306 @@
+"""Offline batch invoicing: price a usage dump against an exported config.
+
+Usage rows are ``customer_id,units`` CSV lines (an optional header is
+skipped) or JSON lines with ``customer_id`` and ``units`` keys. The input is
+read in fixed-size blocks that are parsed and summed per customer on a
+process pool, with a bounded window of blocks in flight. The per-block sums
+are merged by customer id, and the merged totals are then priced and
+formatted on the pool in chunks. Memory grows with the number of distinct
+customers, not with the number of rows.
+
+    python3 pricing_batch.py pricing-config.json usage.csv -o invoices.csv
+
+Each output row is ``customer_id,units,total,unit_price``, one per customer
+in order of first appearance. ``units`` is the customer's summed usage;
+``total`` has the MRR floor and discount applied and is written with the
+currency's decimals (none for JPY or KRW); ``unit_price`` is
+``total / units`` (empty for zero usage). Ids with commas or quotes are
+quoted. CSV ids may hold line breaks if they are quoted.
+
+With ``--per-row`` every input row is priced on its own instead, so a
+customer listed twice is billed twice; rows are then streamed straight
+through in constant memory and ``units`` is copied from the input.
+
+With ``--fixed`` totals are computed in integer minor units of the
+config's currency (see ``pricing_engine.quote_fixed``) and written with
+its number of decimals, e.g. none for JPY; usage must then be whole units.
+"""
+
+import argparse
+import collections
+import csv
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pricing_engine
+
+BLOCK_BYTES = 8 << 20
+# Merged customers priced per task in the second pass.
+PRICE_ROWS = 1 << 18
+OUTPUT_HEADER = b"customer_id,units,total,unit_price\n"
+
+_plan = None
+_fixed = False
+
+
+def _init_worker(plan, fixed=False):
+    global _plan, _fixed
+    _plan = plan
+    _fixed = fixed
+
+
+def parse_csv_block(block):
+    """Split a block of ``customer_id,units`` lines into ids and a units array.
+
+    Each row is split on its last comma, so ids may contain spaces and
+    commas; blocks with quoted fields go through the ``csv`` module.
+    """
+    if b'"' in block:
+        rows = [row for row in csv.reader(io.StringIO(block.decode(), newline="")) if row]
+        if any(len(row) < 2 for row in rows):
+            raise ValueError("malformed CSV block: expected two columns per row")
+        ids = [",".join(row[:-1]).strip().encode() for row in rows]
+        unit_tokens = [row[-1].strip().encode() for row in rows]
+    else:
+        data = block.replace(b"\r", b"").strip(b"\n")
+        raw = np.frombuffer(data, dtype=np.uint8)
+        separators = raw[(raw == ord(",")) | (raw == ord("\n"))]
+        one_comma = len(separators) == 2 * (data.count(b"\n") + 1) - 1 if data else True
+        if one_comma and (separators[0::2] == ord(",")).all() and (separators[1::2] == ord("\n")).all():
+            # Exactly one comma per row (the common case): split every
+            # separator at once.
+            tokens = data.replace(b",", b"\n").split(b"\n") if data else []
+            ids = [cid.strip() for cid in tokens[0::2]]
+            unit_tokens = tokens[1::2]
+        else:
+            lines = [line.rpartition(b",") for line in data.split(b"\n") if line.strip()]
+            if any(not sep for _, sep, _ in lines):
+                raise ValueError("malformed CSV block: expected two columns per row")
+            ids = [cid.strip() for cid, _, _ in lines]
+            unit_tokens = [units.strip() for _, _, units in lines]
+    return ids, unit_tokens, np.array(unit_tokens, dtype=bytes).astype(np.float64)
+
+
+def parse_jsonl_block(block):
+    """Parse a block of JSON lines into ids and a units array.
+
+    ``units`` may be a number or a numeric string.
+    """
+    ids = []
+    unit_tokens = []
+    for line in block.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        ids.append(str(row["customer_id"]).encode())
+        unit_tokens.append(str(row["units"]).strip().encode())
+    return ids, unit_tokens, np.array(unit_tokens, dtype=bytes).astype(np.float64)
+
+
+def _csv_field(value):
+    """Quote an id for the output CSV when it holds a comma, quote or line break."""
+    if b"," in value or b'"' in value or b"\n" in value or b"\r" in value:
+        return b'"' + value.replace(b'"', b'""') + b'"'
+    return value
+
+
+def sum_block(block, fmt):
+    """Parse one block and sum its units per customer.
+
+    Returns ``(ids, units, rows)``: the block's distinct ids in order of
+    first appearance, their summed units and the number of rows parsed.
+    """
+    parse = parse_jsonl_block if fmt == "jsonl" else parse_csv_block
+    ids, _, units = parse(block)
+    if not ids:
+        return [], np.zeros(0), 0
+    keys, first, inverse = np.unique(np.array(ids, dtype=object), return_index=True, return_inverse=True)
+    sums = np.bincount(inverse.reshape(-1), weights=units, minlength=len(keys))
+    order = np.argsort(first, kind="stable")
+    return keys[order].tolist(), sums[order], len(ids)
+
+
+def price_block(block, fmt):
+    """Parse, price and format one block row by row; returns ``(output bytes, rows)``."""
+    parse = parse_jsonl_block if fmt == "jsonl" else parse_csv_block
+    ids, unit_tokens, units = parse(block)
+    return price_rows(ids, unit_tokens, units), len(ids)
+
+
+def price_totals(ids, units):
+    """Price and format summed usage; returns the output bytes."""
+    return price_rows(ids, [b"%.15g" % u for u in units.tolist()], units)
+
+
+def price_rows(ids, unit_tokens, units):
+    """Output lines for ``ids`` using ``units``, echoing ``unit_tokens``."""
+    if _fixed:
+        minor = _plan.quote_minor(units)
+        totals = minor / 10**_plan.decimals
+        texts = [t.encode() for t in pricing_engine.format_minor(minor, _plan.decimals)]
+    else:
+        totals = _plan.quote(units).cumulative
+        decimals = _plan.decimals
+        texts = [b"%.*f" % (decimals, total) for total in totals.tolist()]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        prices = np.where(units > 0, totals / units, np.nan)
+    lines = [
+        b"%b,%b,%b,%b\n" % (_csv_field(cid), u, total, b"" if price != price else b"%.4f" % price)
+        for cid, u, total, price in zip(ids, unit_tokens, texts, prices.tolist())
+    ]
+    return b"".join(lines)
+
+
+def iter_blocks(stream, block_bytes=BLOCK_BYTES, quoted=False):
+    """Yield chunks of roughly ``block_bytes`` that end on a line boundary.
+
+    With ``quoted`` (CSV input) a line break inside a quoted field is not
+    a boundary, so a quoted id holding a newline stays in one block.
+    """
+    tail = b""
+    while True:
+        data = stream.read(block_bytes)
+        if not data:
+            break
+        data = tail + data
+        cut = data.rfind(b"\n") + 1
+        if quoted and cut:
+            # A break is outside quotes when an even number of quote
+            # characters ("" escapes included) comes before it.
+            quotes = data.count(b'"', 0, cut)
+            while cut and quotes % 2:
+                prev = data.rfind(b"\n", 0, cut - 1) + 1
+                quotes -= data.count(b'"', prev, cut)
+                cut = prev
+        tail = data[cut:]
+        if cut:
+            yield data[:cut]
+    if tail.strip():
+        yield tail + b"\n"
+
+
+def skip_csv_header(stream):
+    """Consume a header line if present; return the first line otherwise."""
+    first = stream.readline()
+    try:
+        float(first.rsplit(b",", 1)[-1].strip().strip(b'"'))
+    except ValueError:
+        return b""
+    return first
+
+
+def _ordered(pool, tasks, window):
+    """Results of ``(fn, *args)`` tasks in order, with at most ``window`` in flight."""
+    pending = collections.deque()
+    try:
+        for fn, *args in tasks:
+            pending.append(pool.submit(fn, *args))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+def invoice(config, usage_stream, out_stream, fmt="csv", workers=None, block_bytes=BLOCK_BYTES, fixed=False,
+            per_row=False):
+    """Price the usage on ``usage_stream`` and write one invoice per customer.
+
+    ``config`` is a ``toJSON()`` config or a :class:`pricing_engine.PricingPlan`;
+    it is compiled once here and the plan is sent to the workers as is.
+    ``fixed`` prices in integer minor units instead of floating point;
+    ``per_row`` prices and writes every row on its own. Returns the number
+    of input rows. A malformed row raises ``ValueError`` (``KeyError`` for
+    a JSON line without ``customer_id`` or ``units``).
+    """
+    workers = workers or os.cpu_count() or 1
+    plan = pricing_engine.plan_cache.plan(config)
+    head = skip_csv_header(usage_stream) if fmt == "csv" else b""
+
+    def blocks():
+        first = True
+        for block in iter_blocks(usage_stream, block_bytes, quoted=fmt == "csv"):
+            if first:
+                block = head + block
+                first = False
+            yield block
+        if first and head:
+            yield head
+
+    out_stream.write(OUTPUT_HEADER)
+    rows = 0
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(plan, fixed)) as pool:
+        if per_row:
+            for data, n in _ordered(pool, ((price_block, block, fmt) for block in blocks()), 2 * workers):
+                out_stream.write(data)
+                rows += n
+            return rows
+
+        totals = {}
+        for ids, sums, n in _ordered(pool, ((sum_block, block, fmt) for block in blocks()), 2 * workers):
+            for cid, u in zip(ids, sums.tolist()):
+                totals[cid] = totals.get(cid, 0.0) + u
+            rows += n
+        ids = list(totals)
+        units = np.fromiter(totals.values(), dtype=np.float64, count=len(ids))
+        chunks = (
+            (price_totals, ids[i:i + PRICE_ROWS], units[i:i + PRICE_ROWS]) for i in range(0, len(ids), PRICE_ROWS)
+        )
+        for data in _ordered(pool, chunks, 2 * workers):
+            out_stream.write(data)
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("config", help="pricing-config.json exported from the UI")
+    parser.add_argument("usage", help="usage CSV/JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output CSV (default: stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from extension)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--block-bytes", type=int, default=BLOCK_BYTES, help="input bytes per chunk")
+    parser.add_argument("--fixed", action="store_true", help="exact integer totals in the currency's minor units")
+    parser.add_argument("--per-row", action="store_true", help="price every row on its own, without summing per customer")
+    args = parser.parse_args(argv)
+
+    fmt = args.format or ("jsonl" if args.usage.endswith((".jsonl", ".ndjson")) else "csv")
+    config = pricing_engine.load_config(args.config)
+    usage_stream = sys.stdin.buffer if args.usage == "-" else open(args.usage, "rb")
+    # Written next to the output and renamed on success, so a bad row never
+    # leaves a truncated invoice file behind.
+    tmp = None if args.output == "-" else f"{args.output}.tmp"
+    out_stream = sys.stdout.buffer if tmp is None else open(tmp, "wb")
+
+    start = time.perf_counter()
+    rows = None
+    try:
+        rows = invoice(config, usage_stream, out_stream, fmt, args.workers, args.block_bytes, args.fixed, args.per_row)
+    except (ValueError, KeyError) as e:
+        message = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+        print(f"{args.usage}: bad usage row: {message}", file=sys.stderr)
+        return 1
+    finally:
+        if usage_stream is not sys.stdin.buffer:
+            usage_stream.close()
+        if tmp is not None:
+            out_stream.close()
+            if rows is None:
+                os.remove(tmp)
+            else:
+                os.replace(tmp, args.output)
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"priced {rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,242 @@
+"""Fixed-width binary column files for usage dumps and invoice results.
+
+A file is a small header, a column directory and then each column as one
+packed, 64-byte aligned array, so every column can be memory-mapped as a
+NumPy array and sliced without copying or parsing:
+
+=========  ==========================================================
+offset     content
+=========  ==========================================================
+0          ``MAGIC``, format version, column count, row count
+24         per column: name, NumPy dtype string, byte offset
+aligned    column data, ``rows`` fixed-width values each
+=========  ==========================================================
+
+Usage files hold ``customer_id`` (fixed-width bytes) and ``units``
+(float64). Invoice files hold ``total`` (rounded to cents) and
+``unit_price`` (NaN for zero usage) for the same rows, in the same order;
+priced with ``--fixed``, ``total_minor`` (int64 minor units of the
+currency, exact) replaces ``total``.
+Convert an export once and price it as often as needed:
+
+    python3 pricing_columns.py convert usage.csv usage.bin
+    python3 pricing_columns.py invoice pricing-config.json usage.bin invoices.bin
+
+Pricing maps both files in every worker process and hands out row ranges,
+so no usage or result data is parsed, pickled or copied between
+processes.
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import pricing_batch
+import pricing_engine
+
+MAGIC = b"PRCCOLS1"
+VERSION = 1
+HEADER = struct.Struct("<8sIIQ")
+COLUMN = struct.Struct("<24s8sQ")
+ALIGN = 64
+INVOICE_DTYPES = {"total": "<f8", "unit_price": "<f8"}
+FIXED_INVOICE_DTYPES = {"total_minor": "<i8", "unit_price": "<f8"}
+# Rows priced per task; a slice of each column is a few MB.
+SLICE_ROWS = 1 << 19
+
+_plan = None
+_usage = None
+_out = None
+
+
+def _aligned(offset):
+    return -(-offset // ALIGN) * ALIGN
+
+
+def create(path, rows, dtypes):
+    """Create a column file for ``rows`` rows and map it for writing.
+
+    ``dtypes`` maps column names to NumPy dtypes; returns the writable
+    columns by name.
+    """
+    dtypes = {name: np.dtype(dtype) for name, dtype in dtypes.items()}
+    offset = _aligned(HEADER.size + COLUMN.size * len(dtypes))
+    directory = []
+    for name, dtype in dtypes.items():
+        directory.append(COLUMN.pack(name.encode(), dtype.str.encode(), offset))
+        offset = _aligned(offset + rows * dtype.itemsize)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(dtypes), rows))
+        f.write(b"".join(directory))
+        f.truncate(offset)
+    return open_columns(path, mode="r+")
+
+
+def open_columns(path, mode="r"):
+    """Map every column of a column file; returns arrays by name.
+
+    The arrays are views of the file (``np.memmap``): slicing them reads
+    only the pages touched, and with ``mode="r+"`` writes go to the file.
+    """
+    with open(path, "rb") as f:
+        head = f.read(HEADER.size)
+        if len(head) < HEADER.size:
+            raise ValueError(f"{path}: not a column file (too short)")
+        magic, version, count, rows = HEADER.unpack(head)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a column file (bad magic {magic!r})")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported column file version {version}")
+        entries = [COLUMN.unpack(f.read(COLUMN.size)) for _ in range(count)]
+    columns = {}
+    for name, dtype, offset in entries:
+        dtype = np.dtype(dtype.rstrip(b"\0").decode())
+        name = name.rstrip(b"\0").decode()
+        if rows == 0:
+            columns[name] = np.zeros(0, dtype=dtype)
+        else:
+            columns[name] = np.memmap(path, dtype=dtype, mode=mode, offset=offset, shape=(rows,))
+    return columns
+
+
+def is_column_file(path):
+    """Whether ``path`` starts with the column file magic."""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def _parsed_blocks(path, fmt, block_bytes):
+    parse = pricing_batch.parse_jsonl_block if fmt == "jsonl" else pricing_batch.parse_csv_block
+    with open(path, "rb") as f:
+        head = pricing_batch.skip_csv_header(f) if fmt == "csv" else b""
+        first = True
+        for block in pricing_batch.iter_blocks(f, block_bytes, quoted=fmt == "csv"):
+            if first:
+                block = head + block
+                first = False
+            ids, _, units = parse(block)
+            yield ids, units
+        if first and head:
+            ids, _, units = parse(head)
+            yield ids, units
+
+
+def convert(src, dst, fmt=None, block_bytes=None):
+    """Convert a ``customer_id,units`` CSV or JSONL export to a usage column file.
+
+    Two streaming passes: the first sizes the file (rows and the widest
+    customer id), the second fills it, so memory stays at one block.
+    Returns the number of rows.
+    """
+    fmt = fmt or ("jsonl" if src.endswith((".jsonl", ".ndjson")) else "csv")
+    block_bytes = block_bytes or pricing_batch.BLOCK_BYTES
+    rows = 0
+    width = 1
+    for ids, _ in _parsed_blocks(src, fmt, block_bytes):
+        rows += len(ids)
+        if ids:
+            width = max(width, max(map(len, ids)))
+    out = create(dst, rows, {"customer_id": f"S{width}", "units": "<f8"})
+    row = 0
+    for ids, units in _parsed_blocks(src, fmt, block_bytes):
+        out["customer_id"][row:row + len(ids)] = ids
+        out["units"][row:row + len(ids)] = units
+        row += len(ids)
+    _flush(out)
+    return rows
+
+
+def _flush(columns):
+    for column in columns.values():
+        if isinstance(column, np.memmap):
+            column.flush()
+
+
+def _init_worker(plan, usage_path, out_path):
+    global _plan, _usage, _out
+    _plan = plan
+    _usage = open_columns(usage_path)["units"]
+    _out = open_columns(out_path, mode="r+")
+
+
+def price_slice(lo, hi):
+    """Price usage rows ``[lo, hi)`` straight into the mapped output."""
+    units = _usage[lo:hi]
+    unit_price = _out["unit_price"][lo:hi]
+    if "total_minor" in _out:
+        minor = _out["total_minor"][lo:hi]
+        minor[:] = _plan.quote_minor(units)
+        total = minor / 10**_plan.decimals
+    else:
+        total = _out["total"][lo:hi]
+        np.round(_plan.quote(units).cumulative, 2, out=total)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        np.divide(total, units, out=unit_price)
+    unit_price[units <= 0] = np.nan
+    _flush(_out)
+    return hi - lo
+
+
+def invoice_columns(config, usage_path, out_path, workers=None, slice_rows=SLICE_ROWS, fixed=False):
+    """Price a usage column file into an invoice column file.
+
+    ``config`` may also be a compiled :class:`pricing_engine.PricingPlan`;
+    the workers receive the compiled plan.
+
+    ``fixed`` writes exact ``total_minor`` integers instead of ``total``.
+    Returns the number of rows priced.
+    """
+    rows = len(open_columns(usage_path)["units"])
+    create(out_path, rows, FIXED_INVOICE_DTYPES if fixed else INVOICE_DTYPES)
+    if rows == 0:
+        return 0
+    slices = [(lo, min(lo + slice_rows, rows)) for lo in range(0, rows, slice_rows)]
+    workers = min(workers or os.cpu_count() or 1, len(slices))
+    initargs = (pricing_engine.plan_cache.plan(config), usage_path, out_path)
+    if workers == 1:
+        _init_worker(*initargs)
+        return sum(price_slice(lo, hi) for lo, hi in slices)
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+        return sum(pool.map(price_slice, *zip(*slices)))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    to_binary = commands.add_parser("convert", help="convert a CSV/JSONL usage export to a column file")
+    to_binary.add_argument("usage", help="customer_id,units CSV or JSONL export")
+    to_binary.add_argument("output", help="column file to write (e.g. usage.bin)")
+    to_binary.add_argument("--format", choices=("csv", "jsonl"), help="input format (default: from extension)")
+    pricing = commands.add_parser("invoice", help="price a usage column file into an invoice column file")
+    pricing.add_argument("config", help="pricing-config.json exported from the UI")
+    pricing.add_argument("usage", help="usage column file")
+    pricing.add_argument("output", help="invoice column file to write")
+    pricing.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    pricing.add_argument("--fixed", action="store_true", help="exact integer totals in the currency's minor units")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    if args.command == "convert":
+        rows = convert(args.usage, args.output, args.format)
+        verb = "converted"
+    else:
+        rows = invoice_columns(
+            pricing_engine.load_config(args.config), args.usage, args.output, args.workers, fixed=args.fixed
+        )
+        verb = "priced"
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed if elapsed > 0 else 0
+    print(f"{verb} {rows:,} rows in {elapsed:.1f}s ({rate:,.0f} rows/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,277 @@
+"""Bulk loading of saved ``pricing-config.json`` files.
+
+Every file is checked against the ``PricingComponent.toJSON()`` schema,
+reduced to ``pricing_engine.canonical_config()`` and keyed by its hash, so
+files that price identically collapse to one plan. Directories are parsed
+on a process pool, with ``orjson`` when it is installed.
+
+    python3 pricing_configs.py plans/ --errors
+
+Invalid files are reported with the file, the line and column of a JSON
+syntax error or the path of the offending field (``tiers[2].units``), and
+never stop the rest of the scan.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import pricing_engine
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Files handed to a worker at a time; small enough to spread a few thousand
+# files over every core, large enough to amortise the task overhead.
+CHUNK_FILES = 256
+TIER_FIELDS = ("sequence", "units", "price", "unitPrice", "freeUnits")
+CURRENCY_CODE = re.compile(r"[A-Z]{3}\Z")
+# Exact types: bool is an int subclass but not a valid amount.
+NUMBER_TYPES = (int, float)
+
+
+class ConfigError(ValueError):
+    """A config file that cannot be read, parsed or validated.
+
+    ``location`` is the field path (``tiers[1].multiplier``) for schema
+    errors; ``line`` and ``column`` are set for JSON syntax errors.
+    """
+
+    def __init__(self, message, path=None, location=None, line=None, column=None):
+        super().__init__(message)
+        self.message = message
+        self.path = path
+        self.location = location
+        self.line = line
+        self.column = column
+
+    def __str__(self):
+        where = self.path or "<config>"
+        if self.line is not None:
+            where += f":{self.line}:{self.column}"
+        if self.location:
+            where += f": {self.location}"
+        return f"{where}: {self.message}"
+
+    def __reduce__(self):
+        return (ConfigError, (self.message, self.path, self.location, self.line, self.column))
+
+
+class LoadedConfig(NamedTuple):
+    """One valid file: its path, plan hash and canonical config."""
+
+    path: str
+    key: str
+    config: dict
+
+
+class ConfigSet(NamedTuple):
+    """The distinct plans found by :func:`load_directory`."""
+
+    plans: dict
+    files: dict
+    errors: list
+
+    @property
+    def duplicates(self):
+        """Plans saved in more than one file, as ``key -> paths``."""
+        return {key: paths for key, paths in self.files.items() if len(paths) > 1}
+
+
+def _is_number(value):
+    return type(value) in NUMBER_TYPES
+
+
+def _number_error(value, location, maximum=None):
+    if not _is_number(value) or not math.isfinite(value):
+        return ConfigError(f"must be a finite number, got {value!r}", location=location)
+    if value < 0:
+        return ConfigError(f"must not be negative, got {value!r}", location=location)
+    return ConfigError(f"must be at most {maximum}, got {value!r}", location=location)
+
+
+def validate_config(config):
+    """Check a parsed config against the ``toJSON()`` schema.
+
+    Raises :class:`ConfigError` naming the first offending field; returns
+    the config unchanged otherwise. ``currency``, ``mrr`` and ``discount``
+    may be omitted, as ``loadJSON()`` keeps its current values for them.
+    """
+    if not isinstance(config, dict):
+        raise ConfigError(f"config must be an object, got {type(config).__name__}")
+    currency = config.get("currency", "USD")
+    if not isinstance(currency, str) or not CURRENCY_CODE.match(currency):
+        raise ConfigError(f"must be a three-letter currency code, got {currency!r}", location="currency")
+    for field, maximum in (("mrr", math.inf), ("discount", 100)):
+        value = config.get(field, 0)
+        if not (_is_number(value) and 0 <= value <= maximum and value < math.inf):
+            raise _number_error(value, field, maximum)
+
+    tiers = config.get("tiers")
+    if not isinstance(tiers, list) or not tiers:
+        raise ConfigError("must be a non-empty array of tiers", location="tiers")
+    seen = {}
+    # Thousands of files go through here, so the common all-valid case is
+    # checked inline and the messages are only built for a failure.
+    for i, tier in enumerate(tiers):
+        if type(tier) is not dict:
+            raise ConfigError(f"must be an object, got {type(tier).__name__}", location=f"tiers[{i}]")
+        for field in TIER_FIELDS:
+            value = tier.get(field)
+            if type(value) not in NUMBER_TYPES or not 0 <= value < math.inf:
+                if field not in tier:
+                    raise ConfigError("is missing", location=f"tiers[{i}].{field}")
+                raise _number_error(value, f"tiers[{i}].{field}")
+        multiplier = tier.get("multiplier", 1)
+        if multiplier != "infinity" and (type(multiplier) not in NUMBER_TYPES or not 0 <= multiplier < math.inf):
+            raise ConfigError(
+                f"must be a non-negative number or 'infinity', got {multiplier!r}",
+                location=f"tiers[{i}].multiplier",
+            )
+        sequence = tier["sequence"]
+        if sequence in seen:
+            raise ConfigError(
+                f"duplicate sequence {sequence!r} (also tiers[{seen[sequence]}])",
+                location=f"tiers[{i}].sequence",
+            )
+        seen[sequence] = i
+    return config
+
+
+def parse_config(data, path=None):
+    """Parse, validate and canonicalise one file's bytes.
+
+    Returns ``(key, canonical config)``.
+    """
+    try:
+        config = orjson.loads(data) if orjson else json.loads(data)
+    except json.JSONDecodeError as e:
+        # orjson.JSONDecodeError subclasses the stdlib one.
+        raise ConfigError(f"invalid JSON: {e.msg}", path=path, line=e.lineno, column=e.colno) from None
+    except UnicodeDecodeError as e:
+        raise ConfigError(f"not UTF-8: {e.reason} at byte {e.start}", path=path) from None
+    try:
+        validate_config(config)
+    except ConfigError as e:
+        e.path = path
+        raise
+    canonical = pricing_engine.canonical_config(config)
+    return pricing_engine.canonical_hash(canonical), canonical
+
+
+def load_config_file(path):
+    """Read one config file into a :class:`LoadedConfig`."""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        raise ConfigError(e.strerror or str(e), path=path) from None
+    key, canonical = parse_config(data, path)
+    return LoadedConfig(path, key, canonical)
+
+
+def _load_chunk(paths):
+    """Load a list of files; errors are returned alongside the results."""
+    results = []
+    for path in paths:
+        try:
+            results.append(load_config_file(path))
+        except ConfigError as e:
+            results.append(e)
+    return results
+
+
+def find_config_files(directory, suffix=".json", recursive=True):
+    """Paths of the files under ``directory`` whose names end in ``suffix``, sorted."""
+    found = []
+    if recursive:
+        for root, dirs, files in os.walk(directory):
+            dirs.sort()
+            found.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(suffix))
+    else:
+        with os.scandir(directory) as entries:
+            found = sorted(e.path for e in entries if e.is_file() and e.name.endswith(suffix))
+    return found
+
+
+def load_configs(paths, workers=None):
+    """Load many config files and collapse them to distinct plans.
+
+    Files are read in chunks of ``CHUNK_FILES`` on ``workers`` processes
+    (default: CPU count; 1 loads in this process). The result lists plans
+    and their files in input order, and every invalid file in ``errors``.
+    """
+    paths = list(paths)
+    workers = workers or os.cpu_count() or 1
+    chunks = [paths[i:i + CHUNK_FILES] for i in range(0, len(paths), CHUNK_FILES)]
+    if workers == 1 or len(chunks) <= 1:
+        results = map(_load_chunk, chunks)
+        return _collect(results)
+    with ProcessPoolExecutor(min(workers, len(chunks))) as pool:
+        return _collect(pool.map(_load_chunk, chunks))
+
+
+def _collect(results):
+    plans = {}
+    files = {}
+    errors = []
+    for chunk in results:
+        for item in chunk:
+            if isinstance(item, ConfigError):
+                errors.append(item)
+                continue
+            if item.key not in plans:
+                plans[item.key] = item.config
+                files[item.key] = []
+            files[item.key].append(item.path)
+    return ConfigSet(plans, files, errors)
+
+
+def load_directory(directory, suffix=".json", recursive=True, workers=None):
+    """Load every config file under ``directory``; see :func:`load_configs`."""
+    return load_configs(find_config_files(directory, suffix, recursive), workers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("paths", nargs="+", help="config files or directories to scan")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    parser.add_argument("--errors", action="store_true", help="list every invalid file")
+    parser.add_argument("-o", "--output", help="write the distinct canonical plans to this JSON file")
+    args = parser.parse_args(argv)
+
+    paths = []
+    for path in args.paths:
+        paths.extend(find_config_files(path) if os.path.isdir(path) else [path])
+
+    start = time.perf_counter()
+    result = load_configs(paths, args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result.plans, f, indent=2)
+            f.write("\n")
+    if args.errors:
+        for error in result.errors:
+            print(error, file=sys.stderr)
+    rate = len(paths) / elapsed if elapsed > 0 else 0
+    print(
+        f"loaded {len(paths):,} files in {elapsed:.2f}s ({rate:,.0f} files/s): "
+        f"{len(result.plans):,} distinct plans, {len(result.duplicates):,} saved more than once, "
+        f"{len(result.errors):,} invalid",
+        file=sys.stderr,
+    )
+    return 1 if result.errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
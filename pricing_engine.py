@@ -0,0 +1,855 @@
+"""Vectorised pricing engine for configs exported by ``PricingComponent.toJSON()``.
+
+Mirrors ``compileTiers``/``evaluateTiers`` in ``pricing-engine.js``: tiers
+are compiled once into prefix sums over tier boundaries, then every usage
+value is priced with a binary search (``np.searchsorted``) and closed-form
+arithmetic, so a whole array of usages is quoted without a Python loop.
+"""
+
+import collections
+import decimal
+import hashlib
+import json
+import math
+import threading
+from typing import NamedTuple
+
+import numpy as np
+
+# Usages priced per block; keeps every temporary inside the CPU cache.
+BLOCK_SIZE = 1 << 14
+# ISO 4217 minor-unit digits where they differ from 2; mirrors the
+# ``decimals`` of CURRENCIES in pricing-engine.js.
+CURRENCY_DECIMALS = {"JPY": 0, "KRW": 0}
+# Fixed-point amounts are held this many digits below the minor unit
+# (millionths of a dollar), so per-unit prices such as 0.0015 are exact.
+SUBUNIT_DIGITS = 4
+# Discounts are held in millionths of the whole (0.0001 %).
+DISCOUNT_SCALE = 10**6
+INT64_MAX = np.iinfo(np.int64).max
+
+
+class CompiledTiers(NamedTuple):
+    """Sorted tiers as parallel arrays plus per-tier prefix sums."""
+
+    units: np.ndarray
+    price: np.ndarray
+    unit_price: np.ndarray
+    free_units: np.ndarray
+    reps: np.ndarray
+    starts: np.ndarray
+    start_costs: np.ndarray
+    rep_costs: np.ndarray
+    base_costs: np.ndarray
+    capacity: float
+    total_cost: float
+
+
+class Quote(NamedTuple):
+    """Per-usage price series, matching the three chart lines."""
+
+    cumulative: np.ndarray
+    average: np.ndarray
+    marginal: np.ndarray
+
+
+class FixedTiers(NamedTuple):
+    """Sorted tiers as int64 arrays: whole units and sub-minor-unit amounts.
+
+    Amounts are in units of ``10 ** -(decimals + SUBUNIT_DIGITS)`` of the
+    currency. Unlimited repetitions, and the starts and start costs of the
+    unreachable tiers after them, are ``INT64_MAX``; so is the capacity of
+    a plan with an unlimited tier.
+    """
+
+    units: np.ndarray
+    price: np.ndarray
+    unit_price: np.ndarray
+    free_units: np.ndarray
+    reps: np.ndarray
+    starts: np.ndarray
+    start_costs: np.ndarray
+    rep_costs: np.ndarray
+    capacity: int
+    total_cost: int
+    decimals: int
+
+
+class Projection(NamedTuple):
+    """Expected revenue of a usage histogram, per bucket and in total.
+
+    ``revenue`` and ``on_floor`` (customers paying the MRR floor) are per
+    bucket; ``average_price`` is total revenue per unit of usage.
+    """
+
+    edges: np.ndarray
+    counts: np.ndarray
+    revenue: np.ndarray
+    on_floor: np.ndarray
+    total: float
+    customers: float
+    floor_share: float
+    average_price: float
+
+
+def parse_multiplier(value):
+    """Return the repetition count for a serialized ``multiplier`` value."""
+    if value == "infinity" or value == float("inf"):
+        return float("inf")
+    return value or 1
+
+
+def load_config(path):
+    """Read a ``pricing-config.json`` file exported from the UI."""
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def compile_tiers(tiers):
+    """Compile a ``toJSON()`` tier list into prefix-sum arrays.
+
+    Tiers are ordered by ``sequence`` and tiers without units are dropped,
+    exactly as ``compileTiers`` in pricing-engine.js does. Tiers after an
+    unlimited tier start at infinity and are therefore never reached.
+    """
+    ordered = sorted(
+        (t for t in tiers if t["units"] > 0), key=lambda t: t["sequence"]
+    )
+    units = np.array([t["units"] for t in ordered], dtype=np.float64)
+    price = np.array([t["price"] for t in ordered], dtype=np.float64)
+    unit_price = np.array([t["unitPrice"] for t in ordered], dtype=np.float64)
+    free_units = np.array([t["freeUnits"] for t in ordered], dtype=np.float64)
+    reps = np.array(
+        [parse_multiplier(t.get("multiplier")) for t in ordered], dtype=np.float64
+    )
+    reps = np.ceil(np.maximum(reps, 1))
+
+    rep_costs = price + np.maximum(units - free_units, 0) * unit_price
+    spans = units * reps
+    with np.errstate(invalid="ignore"):
+        # 0 * inf is nan for a free unlimited tier; it still costs nothing.
+        tier_costs = np.where(rep_costs == 0, 0.0, rep_costs * reps)
+    starts = np.concatenate(([0.0], np.cumsum(spans)[:-1]))
+    start_costs = np.concatenate(([0.0], np.cumsum(tier_costs)[:-1]))
+    return CompiledTiers(
+        units=units,
+        price=price,
+        unit_price=unit_price,
+        free_units=free_units,
+        reps=reps,
+        starts=starts,
+        start_costs=start_costs,
+        rep_costs=rep_costs,
+        base_costs=start_costs + price,
+        capacity=float(spans.sum()) if len(spans) else 0.0,
+        total_cost=float(tier_costs.sum()) if len(spans) else 0.0,
+    )
+
+
+def usage_cost(compiled, usage):
+    """Return the raw usage cost and marginal rate for every usage value.
+
+    No MRR floor or discount is applied here; see :func:`quote`.
+    """
+    usage = np.asarray(usage, dtype=np.float64)
+    cost = np.zeros(usage.shape)
+    rate = np.zeros(usage.shape)
+    if len(compiled.units) == 0:
+        return cost, rate
+
+    scratch = _Scratch(min(usage.size, BLOCK_SIZE))
+    flat_usage = usage.reshape(-1)
+    flat_cost = cost.reshape(-1)
+    flat_rate = rate.reshape(-1)
+    for block in _blocks(flat_usage.size):
+        _price_block(compiled, flat_usage[block], flat_cost[block], flat_rate[block], scratch)
+    return cost, rate
+
+
+def _blocks(size):
+    for lo in range(0, size, BLOCK_SIZE):
+        yield slice(lo, lo + BLOCK_SIZE)
+
+
+class _Scratch:
+    """Reusable per-block buffers so the hot loop never allocates."""
+
+    def __init__(self, size):
+        self.idx = np.empty(size, dtype=np.intp)
+        self.a = np.empty(size)
+        self.b = np.empty(size)
+        self.c = np.empty(size)
+        self.mask = np.empty(size, dtype=bool)
+
+    def view(self, n):
+        return self.idx[:n], self.a[:n], self.b[:n], self.c[:n], self.mask[:n]
+
+
+def _price_block(compiled, usage, cost, rate, scratch):
+    idx, local, rep, tmp, mask = scratch.view(len(usage))
+
+    # Last tier starting strictly before each usage, i.e. usage in (start, end].
+    idx[:] = np.searchsorted(compiled.starts, usage, side="left")
+    idx -= 1
+    np.maximum(idx, 0, out=idx)
+
+    # Offset into the tier -> completed repetitions -> units consumed in the
+    # current repetition (left in ``local``).
+    np.take(compiled.starts, idx, out=local)
+    np.subtract(usage, local, out=local)
+    np.take(compiled.units, idx, out=tmp)
+    np.divide(local, tmp, out=rep)
+    np.ceil(rep, out=rep)
+    rep -= 1
+    tmp *= rep
+    local -= tmp
+
+    # Marginal rate: the tier's unit price unless still inside free units.
+    np.take(compiled.free_units, idx, out=tmp)
+    np.less_equal(local, tmp, out=mask)
+    local -= tmp
+    np.maximum(local, 0, out=local)
+    np.take(compiled.unit_price, idx, out=rate)
+    np.multiply(local, rate, out=cost)
+    rate[mask] = 0.0
+
+    np.take(compiled.rep_costs, idx, out=tmp)
+    rep *= tmp
+    cost += rep
+    np.take(compiled.base_costs, idx, out=tmp)
+    cost += tmp
+
+    np.less_equal(usage, 0, out=mask)
+    cost[mask] = 0.0
+    rate[mask] = 0.0
+    if usage.max() > compiled.capacity:
+        np.greater(usage, compiled.capacity, out=mask)
+        cost[mask] = compiled.total_cost
+        rate[mask] = 0.0
+
+
+def quote(config, usage):
+    """Price an array of usages against a ``toJSON()`` config.
+
+    Applies the MRR floor and discount the same way ``calculate()`` does:
+    ``cumulative = max(mrr, cost) * (1 - discount / 100)``. ``average`` is
+    NaN where the chart shows a gap (zero usage or still under the MRR
+    floor) and ``marginal`` is 0 while under the floor.
+
+    The compiled plan comes from :data:`plan_cache`, so quoting the same
+    config repeatedly compiles it once.
+    """
+    return plan_cache.plan(config).quote(usage)
+
+
+def quote_compiled(compiled, usage, mrr=0.0, discount=0.0):
+    """Like :func:`quote`, for tiers already compiled with :func:`compile_tiers`."""
+    mrr = float(mrr)
+    factor = 1 - float(discount) / 100
+
+    usage = np.asarray(usage, dtype=np.float64)
+    cumulative = np.zeros(usage.shape)
+    average = np.empty(usage.shape)
+    marginal = np.zeros(usage.shape)
+    if len(compiled.units) == 0:
+        cumulative += mrr * factor
+        average.fill(np.nan)
+        return Quote(cumulative=cumulative, average=average, marginal=marginal)
+
+    scratch = _Scratch(min(usage.size, BLOCK_SIZE))
+    flat_usage = usage.reshape(-1)
+    flat_cum = cumulative.reshape(-1)
+    flat_avg = average.reshape(-1)
+    flat_marg = marginal.reshape(-1)
+    for block in _blocks(flat_usage.size):
+        u, cum, avg, marg = flat_usage[block], flat_cum[block], flat_avg[block], flat_marg[block]
+        _price_block(compiled, u, cum, marg, scratch)
+        under_floor = scratch.mask[: len(u)]
+        np.less(cum, mrr, out=under_floor)
+        np.maximum(cum, mrr, out=cum)
+        cum *= factor
+        marg *= factor
+        marg[under_floor] = 0.0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            np.divide(cum, u, out=avg)
+        avg[under_floor] = np.nan
+        avg[u <= 0] = np.nan
+    return Quote(cumulative=cumulative, average=average, marginal=marginal)
+
+
+def cost_integral(compiled, usage):
+    """Integral of the raw usage cost from 0 to each usage value.
+
+    Closed form: the cost is linear past each repetition's flat price and
+    free units, so whole repetitions are summed as an arithmetic series and
+    only the current one is integrated piecewise.
+    """
+    usage = np.asarray(usage, dtype=np.float64)
+    if len(compiled.units) == 0:
+        return np.zeros(usage.shape)
+
+    def within(i, offset):
+        # Integral over the first ``offset`` units of one repetition,
+        # excluding the cost already accrued before it.
+        billable = np.maximum(offset - compiled.free_units[i], 0)
+        return compiled.price[i] * offset + compiled.unit_price[i] * billable * billable / 2
+
+    every = np.arange(len(compiled.units))
+    finite = np.isfinite(compiled.reps)
+    reps = np.where(finite, compiled.reps, 0)
+    full_rep = within(every, compiled.units)
+    with np.errstate(invalid="ignore"):
+        # Tiers after an unlimited one start at an infinite cost and are
+        # never reached; their nan terms are discarded.
+        tier_integrals = np.where(
+            finite,
+            reps * compiled.units * compiled.start_costs
+            + compiled.units * compiled.rep_costs * reps * (reps - 1) / 2
+            + reps * full_rep,
+            0.0,
+        )
+    before = np.concatenate(([0.0], np.cumsum(tier_integrals)[:-1]))
+
+    x = np.clip(usage, 0, compiled.capacity)
+    i = np.maximum(np.searchsorted(compiled.starts, x, side="left") - 1, 0)
+    local = x - compiled.starts[i]
+    rep = np.maximum(np.ceil(local / compiled.units[i]) - 1, 0)
+    consumed = local - rep * compiled.units[i]
+    start_cost = compiled.start_costs[i]
+    result = (
+        before[i]
+        + rep * compiled.units[i] * start_cost
+        + compiled.units[i] * compiled.rep_costs[i] * rep * (rep - 1) / 2
+        + rep * full_rep[i]
+        + consumed * (start_cost + rep * compiled.rep_costs[i])
+        + within(i, consumed)
+    )
+    beyond = usage > compiled.capacity
+    if beyond.any():
+        result[beyond] += compiled.total_cost * (usage[beyond] - compiled.capacity)
+    return result
+
+
+def project_compiled(compiled, edges, counts, mrr=0.0, discount=0.0, means=None):
+    """Expected revenue of ``counts[k]`` customers in each usage bucket
+    ``[edges[k], edges[k + 1]]``.
+
+    Customers are taken to be spread evenly over their bucket or, when the
+    mean usage of each bucket is known (``means``), over the part of it
+    centred on that mean. Either way every bucket is priced from
+    :func:`cost_integral` at two points, never per customer, and a bucket
+    lying on one linear stretch of the cost curve is priced exactly. A
+    zero-width bucket holds customers at exactly that usage. Returns a
+    :class:`Projection`.
+    """
+    edges = np.asarray(edges, dtype=np.float64)
+    counts = np.asarray(counts, dtype=np.float64)
+    if edges.ndim != 1 or counts.ndim != 1 or len(edges) != len(counts) + 1:
+        raise ValueError("need one more bucket edge than bucket counts")
+    if not np.isfinite(edges).all() or (edges < 0).any() or (np.diff(edges) < 0).any():
+        raise ValueError("bucket edges must be finite, non-negative and sorted")
+    if not np.isfinite(counts).all() or (counts < 0).any():
+        raise ValueError("bucket counts must be finite and non-negative")
+    mrr = float(mrr)
+    factor = 1 - float(discount) / 100
+    be = break_even_usage(compiled, mrr)
+    be = math.inf if be is None else be
+
+    lo, hi = edges[:-1], edges[1:]
+    if means is None:
+        centre = (lo + hi) / 2
+    else:
+        centre = np.clip(np.asarray(means, dtype=np.float64), lo, hi)
+        if centre.shape != counts.shape:
+            raise ValueError("need one mean per bucket")
+        # The widest even spread inside the bucket with that mean.
+        half = np.minimum(centre - lo, hi - centre)
+        lo, hi = centre - half, centre + half
+
+    # Integral of max(mrr, cost): below the break-even usage the floor applies.
+    def floored(x):
+        m = np.minimum(x, be)
+        return cost_integral(compiled, x) + mrr * m - cost_integral(compiled, m)
+
+    width = hi - lo
+    spread = width > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_cost = np.where(spread, (floored(hi) - floored(lo)) / width, 0.0)
+        floor_fraction = np.where(spread, np.clip((be - lo) / width, 0, 1), lo < be)
+    if not spread.all():
+        mean_cost[~spread] = np.maximum(usage_cost(compiled, lo[~spread])[0], mrr)
+    revenue = counts * mean_cost * factor
+    on_floor = counts * floor_fraction
+
+    customers = float(counts.sum())
+    total = float(revenue.sum())
+    units = float((counts * centre).sum())
+    return Projection(
+        edges=edges,
+        counts=counts,
+        revenue=revenue,
+        on_floor=on_floor,
+        total=total,
+        customers=customers,
+        floor_share=float(on_floor.sum()) / customers if customers else math.nan,
+        average_price=total / units if units > 0 else math.nan,
+    )
+
+
+def usage_histogram(usage, bins=100):
+    """Equal-count buckets for raw usage samples: ``(edges, counts, means)``.
+
+    Repeated quantiles are merged, so heavily repeated values get fewer,
+    wider buckets; all-equal samples give one zero-width bucket.
+    """
+    usage = np.asarray(usage, dtype=np.float64).reshape(-1)
+    if usage.size == 0:
+        raise ValueError("need at least one usage sample")
+    edges = np.unique(np.quantile(usage, np.linspace(0, 1, bins + 1)))
+    if len(edges) == 1:
+        edges = np.array([edges[0], edges[0]])
+    # Buckets are [lo, hi) except the last, which also takes its upper edge.
+    bucket = np.clip(np.searchsorted(edges, usage, side="right") - 1, 0, len(edges) - 2)
+    counts = np.bincount(bucket, minlength=len(edges) - 1).astype(np.float64)
+    sums = np.bincount(bucket, weights=usage, minlength=len(edges) - 1)
+    with np.errstate(invalid="ignore"):
+        means = np.where(counts > 0, sums / counts, (edges[:-1] + edges[1:]) / 2)
+    return edges, counts, means
+
+
+def project_revenue(config, edges, counts, means=None):
+    """Expected revenue of a usage histogram under a ``toJSON()`` config.
+
+    See :func:`project_compiled`; the plan comes from :data:`plan_cache`.
+    """
+    return plan_cache.plan(config).project(edges, counts, means)
+
+
+def project_usage(config, usage, bins=100):
+    """Like :func:`project_revenue`, bucketing raw usage samples first."""
+    return project_revenue(config, *usage_histogram(usage, bins))
+
+
+def units_for_cost(compiled, cost):
+    """Most usage whose raw cost stays within ``cost``.
+
+    Exact, including flat-price jumps and free units; ``math.inf`` if the
+    plan never costs more than ``cost`` and ``None`` for a negative cost.
+    """
+    return None if cost < 0 else _invert_cost(compiled, cost, strict=False)
+
+
+def break_even_usage(compiled, mrr):
+    """Usage from which the raw cost is at least ``mrr`` (``None`` if never)."""
+    return 0.0 if mrr <= 0 else _invert_cost(compiled, mrr, strict=True)
+
+
+def _invert_cost(compiled, target, strict):
+    # Supremum of the usages costing at most (or, if strict, below) target:
+    # binary search over tier start costs, then the repetition, then a
+    # linear solve past the flat price and free units. Mirrors invertCost()
+    # in pricing-engine.js.
+    tiers = len(compiled.units)
+    reachable = int(np.searchsorted(compiled.starts[:tiers], np.inf))
+    cap = 0.0
+    if reachable:
+        k = reachable - 1
+        rep_cost = compiled.rep_costs[k]
+        cap = compiled.start_costs[k] if rep_cost == 0 else compiled.start_costs[k] + rep_cost * compiled.reps[k]
+    if (target > cap) if strict else (target >= cap):
+        return None if strict else math.inf
+
+    side = "left" if strict else "right"
+    i = int(np.searchsorted(compiled.start_costs[:reachable], target, side=side)) - 1
+    units = float(compiled.units[i])
+    price = float(compiled.price[i])
+    rep_cost = float(compiled.rep_costs[i])
+    last_rep = float(compiled.reps[i]) - 1
+    spent = target - float(compiled.start_costs[i])
+    rep = math.ceil(spent / rep_cost) - 1 if strict else math.floor(spent / rep_cost)
+    rep = min(max(rep, 0), last_rep)
+    # Undo a rounding slip of the division at an exact repetition boundary.
+    left = spent - rep * rep_cost
+    if rep > 0 and (left <= 0 if strict else left < 0):
+        rep -= 1
+    elif rep < last_rep and (left > rep_cost if strict else left >= rep_cost):
+        rep += 1
+    left = spent - rep * rep_cost
+    start = float(compiled.starts[i]) + rep * units
+    if (left <= price) if strict else (left < price):
+        return start
+    unit_price = float(compiled.unit_price[i])
+    if unit_price == 0:
+        return start + units
+    linear = start + min(float(compiled.free_units[i]), units) + (left - price) / unit_price
+    return min(linear, start + units)
+
+
+def currency_decimals(currency):
+    """Digits of the minor unit of an ISO 4217 code (2 unless listed)."""
+    return CURRENCY_DECIMALS.get(currency, 2)
+
+
+def to_fixed(value, digits):
+    """``value`` as an integer count of ``10 ** -digits``, rounded half up.
+
+    A float is taken as its shortest decimal form (what the UI shows and
+    ``toJSON()`` writes), so ``0.1`` is exactly one tenth.
+    """
+    scaled = decimal.Decimal(repr(float(value))).scaleb(digits)
+    return int(scaled.to_integral_value(rounding=decimal.ROUND_HALF_UP))
+
+
+def _whole(value, name):
+    if not float(value).is_integer():
+        raise ValueError(f"fixed-point pricing needs whole {name}, got {value!r}")
+    return int(value)
+
+
+def compile_fixed(tiers, decimals=2):
+    """Compile a ``toJSON()`` tier list for integer pricing in minor units.
+
+    Tier order and repetition counts follow :func:`compile_tiers`. Tier
+    sizes and free units must be whole units; prices and unit prices are
+    rounded half up to ``SUBUNIT_DIGITS`` digits below the minor unit.
+    Prefix sums are exact Python integers, capped at ``INT64_MAX``.
+    """
+    digits = decimals + SUBUNIT_DIGITS
+    ordered = sorted((t for t in tiers if t["units"] > 0), key=lambda t: t["sequence"])
+    rows = []
+    start = cost = 0
+    for t in ordered:
+        units = _whole(t["units"], "tier units")
+        free = _whole(t["freeUnits"], "free units")
+        reps = parse_multiplier(t.get("multiplier"))
+        reps = None if math.isinf(reps) else math.ceil(max(1, reps))
+        price = to_fixed(t["price"], digits)
+        unit_price = to_fixed(t["unitPrice"], digits)
+        rep_cost = price + max(units - free, 0) * unit_price
+        rows.append((units, price, unit_price, free, reps, start, cost, rep_cost))
+        if start is None or reps is None:
+            start = cost = None
+        else:
+            start += units * reps
+            cost += rep_cost * reps
+
+    def column(k):
+        return np.array(
+            [INT64_MAX if r[k] is None else min(r[k], INT64_MAX) for r in rows], dtype=np.int64
+        )
+
+    return FixedTiers(
+        units=column(0),
+        price=column(1),
+        unit_price=column(2),
+        free_units=column(3),
+        reps=column(4),
+        starts=column(5),
+        start_costs=column(6),
+        rep_costs=column(7),
+        capacity=INT64_MAX if start is None else min(start, INT64_MAX),
+        total_cost=INT64_MAX if cost is None else min(cost, INT64_MAX),
+        decimals=decimals,
+    )
+
+
+def fixed_cost(fixed, usage):
+    """Raw cost of each whole-unit usage, in sub-minor units (int64).
+
+    Integer version of :func:`usage_cost`: the same tier search and
+    repetition step, with every product exact.
+    """
+    usage = np.asarray(usage, dtype=np.int64)
+    cost = np.zeros(usage.shape, dtype=np.int64)
+    if len(fixed.units) == 0:
+        return cost
+    i = np.maximum(np.searchsorted(fixed.starts, usage, side="left") - 1, 0)
+    local = usage - fixed.starts[i]
+    # ceil(local / units) - 1 for local > 0; usage 0 is zeroed below.
+    rep = (local - 1) // fixed.units[i]
+    consumed = local - rep * fixed.units[i]
+    np.add(fixed.start_costs[i], rep * fixed.rep_costs[i], out=cost)
+    cost += fixed.price[i]
+    cost += np.maximum(consumed - fixed.free_units[i], 0) * fixed.unit_price[i]
+    cost[usage <= 0] = 0
+    cost[usage > fixed.capacity] = fixed.total_cost
+    return cost
+
+
+def quote_fixed(fixed, usage, mrr=0.0, discount=0.0):
+    """Invoice totals in integer minor units (e.g. cents, or yen for JPY).
+
+    ``max(mrr, cost) * (1 - discount / 100)`` is evaluated exactly in
+    int64 and rounded half up to the minor unit once, at the end. Usage
+    must be whole units. Raises ``OverflowError`` if a cost does not fit
+    in int64 sub-minor units (about 9 trillion at 2 decimals).
+    """
+    usage = np.asarray(usage, dtype=np.float64)
+    if usage.size and not (np.isfinite(usage).all() and (usage == np.floor(usage)).all()):
+        raise ValueError("fixed-point pricing needs whole, finite units of usage")
+    usage = usage.astype(np.int64)
+    # Cost never decreases with usage, so the largest usage bounds every
+    # intermediate product.
+    if usage.size and _exact_cost(fixed, int(usage.max())) > INT64_MAX:
+        raise OverflowError("cost exceeds the int64 fixed-point range")
+    cost = fixed_cost(fixed, usage)
+    floored = np.maximum(cost, to_fixed(mrr, fixed.decimals + SUBUNIT_DIGITS))
+    keep = DISCOUNT_SCALE - to_fixed(discount, 4)
+    divisor = DISCOUNT_SCALE * 10**SUBUNIT_DIGITS
+    # floored * keep / divisor without overflowing: whole multiples of the
+    # divisor scale exactly, and only the remainder is rounded.
+    whole, part = np.divmod(floored, divisor)
+    return whole * keep + (2 * part * keep + divisor) // (2 * divisor)
+
+
+def _exact_cost(fixed, usage):
+    # fixed_cost() for one usage in Python integers, for the overflow check.
+    if usage <= 0 or len(fixed.units) == 0:
+        return 0
+    if usage > fixed.capacity:
+        return int(fixed.total_cost)
+    i = max(int(np.searchsorted(fixed.starts, usage, side="left")) - 1, 0)
+    local = usage - int(fixed.starts[i])
+    rep = (local - 1) // int(fixed.units[i])
+    consumed = local - rep * int(fixed.units[i])
+    return (
+        int(fixed.start_costs[i]) + rep * int(fixed.rep_costs[i]) + int(fixed.price[i])
+        + max(consumed - int(fixed.free_units[i]), 0) * int(fixed.unit_price[i])
+    )
+
+
+def quote_minor(config, usage):
+    """Exact invoice totals in minor units of the config's currency.
+
+    See :func:`quote_fixed`; the plan comes from :data:`plan_cache`.
+    """
+    return plan_cache.plan(config).quote_minor(usage)
+
+
+def format_minor(amounts, decimals):
+    """Minor-unit integers as decimal strings (``12345`` -> ``'123.45'``)."""
+    amounts = np.asarray(amounts, dtype=np.int64).reshape(-1).tolist()
+    if decimals == 0:
+        return [str(a) for a in amounts]
+    scale = 10**decimals
+    return [
+        f"{'-' if a < 0 else ''}{abs(a) // scale}.{abs(a) % scale:0{decimals}d}" for a in amounts
+    ]
+
+
+def canonical_config(config):
+    """Return the normalised ``toJSON()`` form that identifies a price list.
+
+    Tiers without units are dropped, the rest are stably ordered by
+    ``sequence`` and renumbered from 1, numbers become floats and the
+    multiplier becomes the repetition count actually used (or
+    ``'infinity'``). Configs that price identically in the component map to
+    the same canonical form.
+    """
+    ordered = sorted(
+        (t for t in config["tiers"] if t["units"] > 0), key=lambda t: t["sequence"]
+    )
+    tiers = []
+    for sequence, t in enumerate(ordered, 1):
+        reps = parse_multiplier(t.get("multiplier"))
+        tiers.append({
+            "sequence": sequence,
+            "units": float(t["units"]),
+            "price": float(t["price"]),
+            "unitPrice": float(t["unitPrice"]),
+            "freeUnits": float(t["freeUnits"]),
+            "multiplier": "infinity" if math.isinf(reps) else math.ceil(max(1, reps)),
+        })
+    return {
+        "currency": config.get("currency", "USD"),
+        "mrr": float(config.get("mrr", 0)),
+        "discount": float(config.get("discount", 0)),
+        "tiers": tiers,
+    }
+
+
+def config_hash(config):
+    """SHA-256 hex digest of :func:`canonical_config`."""
+    return canonical_hash(canonical_config(config))
+
+
+def canonical_hash(canonical):
+    """SHA-256 hex digest of a config already in canonical form."""
+    text = json.dumps(canonical, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _freeze(tiers):
+    """Mark every array field of compiled tiers read-only, in place."""
+    for value in tiers:
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return tiers
+
+
+def _restore_plan(compiled, currency, mrr, discount, key, tiers, fixed):
+    """Rebuild a pickled :class:`PricingPlan` without compiling it."""
+    plan = object.__new__(PricingPlan)
+    object.__setattr__(plan, "compiled", _freeze(compiled))
+    object.__setattr__(plan, "currency", currency)
+    object.__setattr__(plan, "mrr", mrr)
+    object.__setattr__(plan, "discount", discount)
+    object.__setattr__(plan, "key", key)
+    object.__setattr__(plan, "_hash", int(key[:16], 16))
+    object.__setattr__(plan, "_tiers", tiers)
+    object.__setattr__(plan, "_fixed", None if fixed is None else _freeze(fixed))
+    return plan
+
+
+class PricingPlan:
+    """An immutable compiled config, hashable by its canonical content.
+
+    The prefix-sum arrays are read-only, and two plans compare equal exactly
+    when their canonical configs do, so plans can be used as dict keys and
+    shared freely between threads. Pickling keeps the compiled arrays, so
+    plans can be handed to worker processes as they are.
+    """
+
+    __slots__ = ("compiled", "currency", "mrr", "discount", "key", "_hash", "_fixed", "_tiers")
+
+    def __init__(self, config):
+        canonical = canonical_config(config)
+        compiled = _freeze(compile_tiers(canonical["tiers"]))
+        key = canonical_hash(canonical)
+        object.__setattr__(self, "compiled", compiled)
+        object.__setattr__(self, "currency", canonical["currency"])
+        object.__setattr__(self, "mrr", canonical["mrr"])
+        object.__setattr__(self, "discount", canonical["discount"])
+        object.__setattr__(self, "key", key)
+        object.__setattr__(self, "_hash", int(key[:16], 16))
+        object.__setattr__(self, "_tiers", canonical["tiers"])
+        object.__setattr__(self, "_fixed", None)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, PricingPlan):
+            return NotImplemented
+        return self.key == other.key
+
+    def __hash__(self):
+        return self._hash
+
+    def __reduce__(self):
+        # Pickled with its compiled arrays, so a plan sent to a worker
+        # process is not compiled again there.
+        return _restore_plan, (self.compiled, self.currency, self.mrr, self.discount, self.key, self._tiers, self._fixed)
+
+    def __repr__(self):
+        return f"PricingPlan({self.key[:12]}, tiers={len(self.compiled.units)})"
+
+    def quote(self, usage):
+        """Price an array of usages; see :func:`quote`."""
+        return quote_compiled(self.compiled, usage, mrr=self.mrr, discount=self.discount)
+
+    @property
+    def decimals(self):
+        """Minor-unit digits of the plan's currency."""
+        return currency_decimals(self.currency)
+
+    def quote_minor(self, usage):
+        """Exact totals in minor units; see :func:`quote_fixed`.
+
+        The integer tiers are compiled on first use, as plans whose tiers
+        are not whole units can still be quoted in floating point.
+        """
+        if self._fixed is None:
+            object.__setattr__(self, "_fixed", _freeze(compile_fixed(self._tiers, self.decimals)))
+        return quote_fixed(self._fixed, usage, self.mrr, self.discount)
+
+    def project(self, edges, counts, means=None):
+        """Expected revenue of a usage histogram; see :func:`project_compiled`."""
+        return project_compiled(self.compiled, edges, counts, self.mrr, self.discount, means)
+
+    def units_for_budget(self, budget):
+        """Most usage whose discounted, MRR-floored price fits in ``budget``.
+
+        ``math.inf`` if the plan never costs more, ``None`` if even zero
+        usage (the discounted MRR) is over budget.
+        """
+        factor = 1 - self.discount / 100
+        if factor <= 0:
+            return math.inf if budget >= 0 else None
+        if budget < max(self.mrr, 0) * factor:
+            return None
+        return units_for_cost(self.compiled, budget / factor)
+
+    def break_even(self):
+        """Usage from which the usage cost reaches the MRR floor."""
+        return break_even_usage(self.compiled, self.mrr)
+
+
+class PlanCache:
+    """Bounded LRU caches of compiled plans and of single-usage quotes.
+
+    ``plan()`` compiles each distinct canonical config once while it stays
+    among the ``max_plans`` most recently used; ``quote()`` memoises the
+    scalar quote for each ``(plan key, usage)`` pair. Safe to share between
+    threads.
+    """
+
+    def __init__(self, max_plans=256, max_quotes=1 << 16):
+        self.max_plans = max_plans
+        self.max_quotes = max_quotes
+        self.compiles = 0
+        self._plans = collections.OrderedDict()
+        self._quotes = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def plan(self, config):
+        """Return the compiled :class:`PricingPlan` for a config (or a plan)."""
+        if isinstance(config, PricingPlan):
+            return config
+        key = config_hash(config)
+        with self._lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                return plan
+        plan = PricingPlan(config)
+        with self._lock:
+            self.compiles += 1
+            self._plans[key] = plan
+            self._plans.move_to_end(key)
+            while len(self._plans) > self.max_plans:
+                self._plans.popitem(last=False)
+        return plan
+
+    def quote(self, config, usage):
+        """Quote one usage value, returning a :class:`Quote` of floats."""
+        plan = self.plan(config)
+        key = (plan.key, float(usage))
+        with self._lock:
+            cached = self._quotes.get(key)
+            if cached is not None:
+                self._quotes.move_to_end(key)
+                return cached
+        q = plan.quote(np.array([key[1]]))
+        result = Quote(
+            cumulative=float(q.cumulative[0]),
+            average=float(q.average[0]),
+            marginal=float(q.marginal[0]),
+        )
+        with self._lock:
+            self._quotes[key] = result
+            while len(self._quotes) > self.max_quotes:
+                self._quotes.popitem(last=False)
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+            self._quotes.clear()
+
+
+# Shared by quote() and any long-running consumer of this module.
+plan_cache = PlanCache()
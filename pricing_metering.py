@@ -0,0 +1,296 @@
+"""Live per-customer spend from a stream of usage increments.
+
+A :class:`Meter` keeps one cursor per customer: the tier reached, the
+repetition within it, the units consumed in that repetition and the cost
+so far. An increment moves the cursor forward instead of re-pricing the
+running total from unit 0:
+
+* inside the current repetition, only the offset and the linear part of
+  the cost change;
+* across repetitions of the same tier, the repetition count is one
+  division and the cost is closed-form;
+* only when a customer leaves a tier is its position found with a binary
+  search over the tier starts, at most once per tier a customer passes.
+
+Events are taken in batches (``record(ids, units)``), vectorised over the
+customers in each batch. Readings apply the MRR floor and discount the
+same way :func:`pricing_engine.quote` does. All cursors can be written to
+a compact binary snapshot and restored against the same plan:
+
+    python3 pricing_metering.py pricing-config.json events.csv \\
+        --restore meter.bin --snapshot meter.bin -o readings.csv
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from typing import NamedTuple
+
+import numpy as np
+
+import pricing_batch
+import pricing_engine
+
+MAGIC = b"PRCMETR1"
+VERSION = 1
+# Magic, version, customer id width, customers, plan key (SHA-256 digest).
+HEADER = struct.Struct("<8sIIQ32s")
+CURSOR = np.dtype([
+    ("tier", "<i4"), ("rep", "<f8"), ("offset", "<f8"), ("cost", "<f8"), ("usage", "<f8"),
+])
+# Cursors allocated up front; the arrays double when they fill up.
+INITIAL_CUSTOMERS = 1024
+
+
+class Reading(NamedTuple):
+    """Live usage and price of some customers, in cursor order.
+
+    ``total`` has the MRR floor and discount applied; ``marginal`` is the
+    discounted rate of the last unit consumed, left-continuous like
+    ``quote().marginal`` and the chart's current line, so at a tier
+    boundary it is still the rate of the tier just filled (0 while under
+    the floor or before any usage).
+    """
+
+    customer_ids: list
+    usage: np.ndarray
+    total: np.ndarray
+    marginal: np.ndarray
+
+
+class Meter:
+    """Per-customer cursors over one compiled plan.
+
+    ``config`` is a ``toJSON()`` config or a :class:`pricing_engine.PricingPlan`.
+    Customer ids are strings; a customer's cursor is created by its first
+    event.
+    """
+
+    def __init__(self, config):
+        self.plan = pricing_engine.plan_cache.plan(config)
+        self._index = {}
+        self._ids = []
+        self._tier = np.zeros(INITIAL_CUSTOMERS, dtype=np.int32)
+        self._rep = np.zeros(INITIAL_CUSTOMERS)
+        self._offset = np.zeros(INITIAL_CUSTOMERS)
+        self._cost = np.zeros(INITIAL_CUSTOMERS)
+        self._usage = np.zeros(INITIAL_CUSTOMERS)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, customer_id):
+        return customer_id in self._index
+
+    def _row(self, customer_id):
+        row = self._index.get(customer_id)
+        if row is None:
+            row = len(self._ids)
+            if row == len(self._usage):
+                self._grow(2 * row)
+            self._index[customer_id] = row
+            self._ids.append(customer_id)
+        return row
+
+    def _grow(self, size):
+        for name in ("_tier", "_rep", "_offset", "_cost", "_usage"):
+            old = getattr(self, name)
+            new = np.zeros(size, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def record(self, customer_ids, units):
+        """Add a batch of usage increments and return the customers' readings.
+
+        ``customer_ids[k]`` used ``units[k]`` more units; a customer may
+        appear several times in one batch. The reading covers each customer
+        in the batch once.
+        """
+        units = np.asarray(units, dtype=np.float64).reshape(-1)
+        if len(customer_ids) != len(units):
+            raise ValueError("need one units value per customer id")
+        if not (np.isfinite(units).all() and (units >= 0).all()):
+            raise ValueError("usage increments must be finite and non-negative")
+        rows = np.fromiter(map(self._row, customer_ids), dtype=np.intp, count=len(units))
+        rows, inverse = np.unique(rows, return_inverse=True)
+        delta = np.bincount(inverse, weights=units, minlength=len(rows))
+        moved = delta > 0
+        self._advance(rows[moved], delta[moved])
+        return self._reading(rows)
+
+    def _advance(self, rows, delta):
+        compiled = self.plan.compiled
+        usage = self._usage[rows] + delta
+        self._usage[rows] = usage
+        tiers = len(compiled.units)
+        if tiers == 0:
+            return
+
+        tier = self._tier[rows]
+        t = np.minimum(tier, tiers - 1)
+        units = compiled.units[t]
+        # Repetitions completed by the increment, counted from the current one.
+        local = self._offset[rows] + delta
+        passed = np.ceil(local / units) - 1
+        rep = self._rep[rows] + passed
+        offset = local - passed * units
+
+        # Customers leaving their tier are placed from their total usage.
+        jump = (rep >= compiled.reps[t]) & (tier < tiers)
+        if jump.any():
+            u = usage[jump]
+            j = np.maximum(np.searchsorted(compiled.starts, u, side="left") - 1, 0)
+            into = u - compiled.starts[j]
+            r = np.maximum(np.ceil(into / compiled.units[j]) - 1, 0)
+            t[jump] = j
+            rep[jump] = r
+            offset[jump] = into - r * compiled.units[j]
+            tier[jump] = np.where(u > compiled.capacity, tiers, j)
+
+        cost = (
+            compiled.base_costs[t]
+            + rep * compiled.rep_costs[t]
+            + np.maximum(offset - compiled.free_units[t], 0) * compiled.unit_price[t]
+        )
+        spent = tier >= tiers
+        cost[spent] = compiled.total_cost
+        self._tier[rows] = tier
+        self._rep[rows] = rep
+        self._offset[rows] = offset
+        self._cost[rows] = cost
+
+    def _reading(self, rows):
+        compiled = self.plan.compiled
+        factor = 1 - self.plan.discount / 100
+        usage = self._usage[rows]
+        cost = self._cost[rows]
+        tier = self._tier[rows]
+        live = (usage > 0) & (tier < len(compiled.units))
+        marginal = np.zeros(len(rows))
+        if live.any():
+            t = tier[live]
+            paying = self._offset[rows][live] > compiled.free_units[t]
+            marginal[live] = np.where(paying, compiled.unit_price[t], 0.0)
+        marginal[cost < self.plan.mrr] = 0.0
+        return Reading(
+            customer_ids=[self._ids[r] for r in rows],
+            usage=usage,
+            total=np.maximum(cost, self.plan.mrr) * factor,
+            marginal=marginal * factor,
+        )
+
+    def reading(self, customer_ids=None):
+        """Readings of the given customers (default: all, in first-seen order).
+
+        Raises ``KeyError`` for a customer without events.
+        """
+        if customer_ids is None:
+            rows = np.arange(len(self._ids))
+        else:
+            rows = np.fromiter((self._index[c] for c in customer_ids), dtype=np.intp)
+        return self._reading(rows)
+
+    def snapshot(self, path):
+        """Write every cursor to ``path``, replacing it atomically.
+
+        The file is a header (with the plan key) followed by the packed
+        customer ids and one 36-byte cursor per customer.
+        """
+        count = len(self._ids)
+        ids = np.array([c.encode() for c in self._ids], dtype=bytes)
+        width = max(ids.dtype.itemsize, 1)
+        cursors = np.empty(count, dtype=CURSOR)
+        for name in CURSOR.names:
+            cursors[name] = getattr(self, f"_{name}")[:count]
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, width, count, bytes.fromhex(self.plan.key)))
+            f.write(ids.astype(f"S{width}").tobytes())
+            f.write(cursors.tobytes())
+        os.replace(tmp, path)
+
+    @classmethod
+    def restore(cls, path, config):
+        """A meter with the cursors of a snapshot taken under the same plan."""
+        meter = cls(config)
+        with open(path, "rb") as f:
+            data = f.read()
+        if len(data) < HEADER.size:
+            raise ValueError(f"{path}: not a meter snapshot (too short)")
+        magic, version, width, count, key = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a meter snapshot (bad magic {magic!r})")
+        if version != VERSION:
+            raise ValueError(f"{path}: unsupported meter snapshot version {version}")
+        if key.hex() != meter.plan.key:
+            raise ValueError(f"{path}: snapshot was taken for plan {key.hex()[:12]}, not {meter.plan.key[:12]}")
+        ids_end = HEADER.size + width * count
+        if len(data) != ids_end + CURSOR.itemsize * count:
+            raise ValueError(f"{path}: truncated meter snapshot")
+        ids = np.frombuffer(data, dtype=f"S{width}", count=count, offset=HEADER.size)
+        cursors = np.frombuffer(data, dtype=CURSOR, count=count, offset=ids_end)
+
+        meter._ids = [c.decode() for c in ids]
+        meter._index = {c: row for row, c in enumerate(meter._ids)}
+        meter._grow(max(count, INITIAL_CUSTOMERS))
+        for name in CURSOR.names:
+            getattr(meter, f"_{name}")[:count] = cursors[name]
+        return meter
+
+
+def iter_events(path, fmt=None):
+    """``(customer_ids, units)`` batches from a CSV or JSONL event log, one per block."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    parse = pricing_batch.parse_jsonl_block if fmt == "jsonl" else pricing_batch.parse_csv_block
+    with open(path, "rb") as f:
+        head = pricing_batch.skip_csv_header(f) if fmt == "csv" else b""
+        if head:
+            ids, _, units = parse(head)
+            yield [c.decode() for c in ids], units
+        for block in pricing_batch.iter_blocks(f, quoted=fmt == "csv"):
+            ids, _, units = parse(block)
+            yield [c.decode() for c in ids], units
+
+
+def write_readings(reading, stream):
+    """One ``customer_id,usage,total,marginal`` row per customer."""
+    stream.write("customer_id,usage,total,marginal\n")
+    for row in zip(reading.customer_ids, reading.usage.tolist(), reading.total.tolist(), reading.marginal.tolist()):
+        stream.write("%s,%.10g,%.2f,%.6g\n" % row)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("config", help="pricing-config.json exported from the UI")
+    parser.add_argument("events", help="customer_id,units CSV or JSONL of usage increments")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="event format (default: from extension)")
+    parser.add_argument("--restore", help="start from this meter snapshot")
+    parser.add_argument("--snapshot", help="write the cursors to this file afterwards")
+    parser.add_argument("-o", "--output", help="write every customer's reading to this CSV")
+    args = parser.parse_args(argv)
+
+    config = pricing_engine.load_config(args.config)
+    restore = args.restore and os.path.exists(args.restore)
+    meter = Meter.restore(args.restore, config) if restore else Meter(config)
+
+    start = time.perf_counter()
+    events = 0
+    for ids, units in iter_events(args.events, args.format):
+        meter.record(ids, units)
+        events += len(ids)
+    elapsed = time.perf_counter() - start
+
+    if args.snapshot:
+        meter.snapshot(args.snapshot)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_readings(meter.reading(), f)
+    rate = events / elapsed if elapsed > 0 else 0
+    print(f"metered {events:,} events for {len(meter):,} customers in {elapsed:.1f}s ({rate:,.0f} events/s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
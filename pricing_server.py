@@ -0,0 +1,254 @@
+"""Local quoting service: the demo page plus JSON pricing endpoints.
+
+    python3 pricing_server.py --port 8000
+
+Listens on 127.0.0.1 unless ``--host`` says otherwise, and serves the demo
+page and its scripts (nothing else from this directory) plus, over
+keep-alive HTTP/1.1 with one thread per connection:
+
+``POST /quote``
+    ``{"config": <toJSON()>, "units": 1200}`` -> one quote.
+``POST /quote/batch``
+    ``{"config": <toJSON()>, "units": [0, 10, ...]}`` -> arrays of quotes.
+``GET /status``
+    Request count, throughput and p50/p99 latency of recent API calls.
+
+Quotes are rounded to cents like ``calculate()``; ``average`` is ``null``
+where the chart leaves a gap. Compiled plans come from
+``pricing_engine.plan_cache``, so a config is compiled once however many
+requests use it.
+"""
+
+import argparse
+import collections
+import functools
+import http.server
+import json
+import math
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+import pricing_engine
+
+DIR = os.path.dirname(os.path.abspath(__file__))
+# Recent API calls kept for the latency percentiles and throughput.
+STATS_WINDOW = 10_000
+MAX_BODY_BYTES = 64 << 20
+# The only files served; everything else next to this module stays private.
+STATIC_FILES = frozenset({"index.html", "pricing-component.js", "pricing-engine.js", "pricing-worker.js"})
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ServiceStats:
+    """Rolling latency and throughput over the last ``STATS_WINDOW`` calls."""
+
+    def __init__(self, window=STATS_WINDOW):
+        self.started = time.monotonic()
+        self.requests = 0
+        self.errors = 0
+        self.units = 0
+        self._samples = collections.deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, duration, units, ok=True):
+        with self._lock:
+            self.requests += 1
+            self.units += units
+            if not ok:
+                self.errors += 1
+            self._samples.append((time.monotonic(), duration))
+
+    def snapshot(self):
+        with self._lock:
+            samples = list(self._samples)
+            result = {
+                "uptime": round(time.monotonic() - self.started, 3),
+                "requests": self.requests,
+                "errors": self.errors,
+                "units": self.units,
+                "plans": pricing_engine.plan_cache.compiles,
+            }
+        if samples:
+            stamps, durations = np.array(samples).T
+            span = time.monotonic() - stamps[0]
+            p50, p99 = np.percentile(durations, [50, 99]) * 1000
+            result["latency_ms"] = {"p50": round(p50, 3), "p99": round(p99, 3)}
+            result["throughput"] = round(len(samples) / span, 1) if span > 0 else None
+        else:
+            result["latency_ms"] = {"p50": None, "p99": None}
+            result["throughput"] = None
+        return result
+
+
+def _cents(values):
+    """Round to cents and turn NaN into ``None`` for JSON."""
+    rounded = np.round(values, 2)
+    if np.isnan(rounded).any():
+        return [None if v != v else v for v in rounded.tolist()]
+    return rounded.tolist()
+
+
+def quote_one(config, units):
+    plan = pricing_engine.plan_cache.plan(config)
+    q = pricing_engine.plan_cache.quote(plan, units)
+    cumulative, average, marginal = _cents(np.array(q))
+    return {"plan": plan.key, "cumulative": cumulative, "average": average, "marginal": marginal}
+
+
+def quote_batch(config, units):
+    plan = pricing_engine.plan_cache.plan(config)
+    q = plan.quote(units)
+    return {
+        "plan": plan.key,
+        "cumulative": _cents(q.cumulative),
+        "average": _cents(q.average),
+        "marginal": _cents(q.marginal),
+    }
+
+
+def encode_json(body):
+    """Compact JSON; ``ValueError`` for NaN or infinity, which JSON lacks."""
+    return json.dumps(body, separators=(",", ":"), allow_nan=False).encode()
+
+
+class QuoteHandler(http.server.SimpleHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0]
+        if path == "/status":
+            self.send_json(200, self.server.stats.snapshot())
+        elif self.is_static(path):
+            super().do_GET()
+        else:
+            self.send_error(404)
+
+    def do_HEAD(self):
+        if self.is_static(self.path.split("?", 1)[0]):
+            super().do_HEAD()
+        else:
+            self.send_error(404)
+
+    def is_static(self, path):
+        return (path.lstrip("/") or "index.html") in STATIC_FILES
+
+    def do_POST(self):
+        start = time.perf_counter()
+        path = self.path.split("?", 1)[0]
+        count = 0
+        try:
+            if path not in ("/quote", "/quote/batch"):
+                self.close_connection = True
+                self.send_json(404, {"error": f"unknown endpoint {path}"})
+                return
+            config, units = self.read_request()
+            if path == "/quote":
+                # bool is an int subclass, but true/false are not usage.
+                if isinstance(units, bool) or not isinstance(units, (int, float)):
+                    raise BadRequest("units must be a number")
+                if not math.isfinite(units):
+                    raise BadRequest("units must be finite")
+                count = 1
+                body = quote_one(config, units)
+            else:
+                if not isinstance(units, list) or any(isinstance(u, bool) for u in units):
+                    raise BadRequest("units must be an array of numbers")
+                usage = np.array(units, dtype=np.float64)
+                if usage.ndim != 1:
+                    raise BadRequest("units must be a flat array of numbers")
+                if not np.isfinite(usage).all():
+                    raise BadRequest("units must be finite")
+                count = len(usage)
+                body = quote_batch(config, usage)
+            # Encoded here so a non-finite result (e.g. from an infinite
+            # MRR) is reported like any other bad input.
+            data = encode_json(body)
+        except (BadRequest, KeyError, TypeError, ValueError, ArithmeticError) as e:
+            message = f"missing field {e}" if isinstance(e, KeyError) else str(e)
+            self.send_json(400, {"error": message})
+            self.server.stats.record(time.perf_counter() - start, 0, ok=False)
+            return
+        except Exception as e:
+            # Anything else is our bug, not the client's: answer instead of dropping the connection.
+            self.close_connection = True
+            self.send_json(500, {"error": f"internal error: {type(e).__name__}"})
+            self.server.stats.record(time.perf_counter() - start, 0, ok=False)
+            self.log_error("quote failed: %r", e)
+            return
+        self.send_body(200, data)
+        self.server.stats.record(time.perf_counter() - start, count)
+
+    def read_request(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        if length < 0:
+            # The body's extent is unknown, so the connection cannot be reused.
+            self.close_connection = True
+            raise BadRequest("invalid Content-Length")
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            raise BadRequest("request body too large")
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except json.JSONDecodeError as e:
+            raise BadRequest(f"invalid JSON: {e}") from None
+        if not isinstance(payload, dict):
+            raise BadRequest("request body must be a JSON object")
+        config = payload["config"]
+        if not isinstance(config, dict) or not isinstance(config.get("tiers"), list):
+            raise BadRequest("config must be a toJSON() object with a tiers array")
+        return config, payload["units"]
+
+    def send_json(self, status, body):
+        self.send_body(status, encode_json(body))
+
+    def send_body(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+
+class QuoteServer(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, directory=DIR, verbose=False):
+        super().__init__(address, functools.partial(QuoteHandler, directory=directory))
+        self.stats = ServiceStats()
+        self.verbose = verbose
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--host", default="127.0.0.1", help="interface to bind (default: 127.0.0.1; '' for all)")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("-v", "--verbose", action="store_true", help="log every request")
+    args = parser.parse_args(argv)
+
+    server = QuoteServer((args.host, args.port), verbose=args.verbose)
+    print(f"Serving on http://localhost:{server.server_port}/", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,246 @@
+"""What-if grids: revenue of every config variant over one usage dataset.
+
+    python3 pricing_sweep.py pricing-config.json usage.csv \\
+        --axis 'tier[2].unitPrice=5:9:100' --axis mrr=0:2000:100 -o sweep.csv
+
+An axis is ``name=start:stop:count`` (evenly spaced, both ends included) or
+``name=v1,v2,...``. Names are ``mrr``, ``discount`` or
+``tier[<sequence>].<field>`` for any tier field; the number is the tier's
+``sequence``, as shown in the Seq column. Every combination of axis values
+is priced against the same customers, one row per ``customer_id,units``
+line of the usage file (CSV, JSON lines, a ``pricing_columns`` file or a
+``.npy`` array of units).
+
+The usage is sorted once and shared with every worker process, so each
+tier variant is priced in a single vectorised pass and comes out sorted
+by cost. MRR and discount values then cost a binary search each instead
+of another pass. Output is one CSV row per grid cell (axis values,
+``revenue``, ``floor_share``, ``average_price``), ready for a heatmap, or
+the grid arrays themselves with ``-o sweep.npz``.
+"""
+
+import argparse
+import itertools
+import math
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple
+
+import numpy as np
+
+import pricing_batch
+import pricing_columns
+import pricing_engine
+
+AXIS_NAME = re.compile(r"(mrr|discount)|tier\[(\d+)\]\.(units|price|unitPrice|freeUnits|multiplier)")
+GLOBAL_AXES = ("mrr", "discount")
+
+_config = None
+_usage = None
+_globals = None
+
+
+class Axis(NamedTuple):
+    """One swept parameter and the values it takes."""
+
+    name: str
+    values: np.ndarray
+
+
+class SweepResult(NamedTuple):
+    """Grid metrics indexed by the axes, in the order they were given.
+
+    ``revenue`` has the MRR floor and discount applied, ``floor_share`` is
+    the share of customers paying the floor and ``average_price`` is
+    revenue per unit of usage.
+    """
+
+    axes: list
+    revenue: np.ndarray
+    floor_share: np.ndarray
+    average_price: np.ndarray
+
+
+def parse_axis(spec):
+    """Parse ``name=start:stop:count`` or ``name=v1,v2,...`` into an :class:`Axis`."""
+    name, sep, values = spec.partition("=")
+    name = name.strip()
+    if not sep or not AXIS_NAME.fullmatch(name):
+        raise ValueError(f"bad axis {spec!r}: expected mrr, discount or tier[<sequence>].<field>, then =values")
+    try:
+        if ":" in values:
+            start, stop, count = values.split(":")
+            grid = np.linspace(float(start), float(stop), int(count))
+        else:
+            grid = np.array([float(v) for v in values.split(",")])
+    except ValueError:
+        raise ValueError(f"bad axis {spec!r}: values must be start:stop:count or a comma list") from None
+    if grid.size == 0 or np.isnan(grid).any() or (np.isinf(grid).any() and not name.endswith(".multiplier")):
+        raise ValueError(f"bad axis {spec!r}: needs finite values (inf only for a multiplier)")
+    if (grid < 0).any():
+        raise ValueError(f"bad axis {spec!r}: values must not be negative")
+    return Axis(name, grid)
+
+
+def variant_config(config, assignments):
+    """A copy of ``config`` with ``{axis name: value}`` applied."""
+    variant = dict(config, tiers=[dict(t) for t in config["tiers"]])
+    for name, value in assignments.items():
+        if name in GLOBAL_AXES:
+            variant[name] = float(value)
+            continue
+        _, sequence, field = AXIS_NAME.fullmatch(name).groups()
+        matches = [t for t in variant["tiers"] if t["sequence"] == int(sequence)]
+        if not matches:
+            raise ValueError(f"axis {name}: no tier with sequence {sequence}")
+        for tier in matches:
+            tier[field] = "infinity" if field == "multiplier" and math.isinf(value) else float(value)
+    return variant
+
+
+def _init_worker(config, usage, global_axes):
+    global _config, _usage, _globals
+    _config = config
+    _usage = usage
+    _globals = global_axes
+
+
+def _price_variant(assignments):
+    """Metrics of one tier variant over every MRR x discount combination."""
+    compiled = pricing_engine.compile_tiers(variant_config(_config, assignments)["tiers"])
+    # Usage is sorted and cost never decreases with usage, so the costs come
+    # out sorted: customers under any MRR floor are a prefix.
+    cost = pricing_engine.usage_cost(compiled, _usage)[0]
+    prefix = np.concatenate(([0.0], np.cumsum(cost)))
+    mrr = _globals.get("mrr", np.array([float(_config.get("mrr", 0))]))
+    discount = _globals.get("discount", np.array([float(_config.get("discount", 0))]))
+
+    under = np.searchsorted(cost, mrr, side="left")
+    floored = mrr * under + (prefix[-1] - prefix[under])
+    revenue = floored[:, None] * (1 - discount[None, :] / 100)
+    floor_share = np.broadcast_to((under / max(len(cost), 1))[:, None], revenue.shape)
+    return revenue, floor_share
+
+
+def sweep(config, usage, axes, workers=None):
+    """Evaluate the full grid of ``axes`` against one usage array.
+
+    Tier variants are spread over ``workers`` processes (default: CPU
+    count; 1 runs in this process); MRR and discount are folded into each
+    variant's single pricing pass. Returns a :class:`SweepResult`.
+    """
+    names = [axis.name for axis in axes]
+    if len(set(names)) != len(names):
+        raise ValueError("each axis may only be swept once")
+    usage = np.sort(np.asarray(usage, dtype=np.float64).reshape(-1))
+    global_axes = {a.name: a.values for a in axes if a.name in GLOBAL_AXES}
+    tier_axes = [a for a in axes if a.name not in GLOBAL_AXES]
+    variants = [
+        dict(zip((a.name for a in tier_axes), values))
+        for values in itertools.product(*(a.values.tolist() for a in tier_axes))
+    ]
+    variant_config(config, variants[0])  # fail fast on a missing tier
+
+    workers = workers or os.cpu_count() or 1
+    initargs = (config, usage, global_axes)
+    if workers == 1 or len(variants) == 1:
+        _init_worker(*initargs)
+        results = list(map(_price_variant, variants))
+    else:
+        chunksize = max(1, len(variants) // (4 * workers))
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.map(_price_variant, variants, chunksize=chunksize))
+
+    # Stack as (tier axes..., mrr, discount), then reorder to the axis order.
+    inner = [len(global_axes.get("mrr", [0])), len(global_axes.get("discount", [0]))]
+    shape = [len(a.values) for a in tier_axes] + inner
+    revenue = np.stack([r for r, _ in results]).reshape(shape)
+    floor_share = np.stack([f for _, f in results]).reshape(shape)
+    order = [a.name for a in tier_axes] + ["mrr", "discount"]
+    kept = [order.index(name) for name in names]
+    # Unswept MRR/discount dimensions have length 1 and are dropped.
+    permutation = kept + [i for i in range(len(order)) if i not in kept]
+    revenue = np.transpose(revenue, permutation).reshape([len(a.values) for a in axes])
+    floor_share = np.transpose(floor_share, permutation).reshape(revenue.shape)
+
+    total_units = usage.sum()
+    average_price = revenue / total_units if total_units > 0 else np.full(revenue.shape, np.nan)
+    return SweepResult(list(axes), revenue, np.ascontiguousarray(floor_share), average_price)
+
+
+def write_csv(result, stream):
+    """One row per grid cell: axis values, revenue, floor share, average price."""
+    header = [a.name for a in result.axes] + ["revenue", "floor_share", "average_price"]
+    stream.write(",".join(header) + "\n")
+    grids = np.meshgrid(*(a.values for a in result.axes), indexing="ij")
+    columns = [g.reshape(-1) for g in grids] + [
+        result.revenue.reshape(-1), result.floor_share.reshape(-1), result.average_price.reshape(-1),
+    ]
+    formats = ["%.10g"] * len(result.axes) + ["%.2f", "%.6f", "%.6f"]
+    np.savetxt(stream, np.column_stack(columns), fmt=formats, delimiter=",")
+
+
+def write_npz(result, path):
+    """The grid arrays plus each axis' values, keyed by axis name."""
+    np.savez_compressed(
+        path,
+        revenue=result.revenue,
+        floor_share=result.floor_share,
+        average_price=result.average_price,
+        axes=np.array([a.name for a in result.axes]),
+        **{f"axis_{i}": a.values for i, a in enumerate(result.axes)},
+    )
+
+
+def load_usage(path, fmt=None):
+    """The units column of a usage file as a float array."""
+    if path.endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if pricing_columns.is_column_file(path):
+        return pricing_columns.open_columns(path)["units"]
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    parse = pricing_batch.parse_jsonl_block if fmt == "jsonl" else pricing_batch.parse_csv_block
+    parts = []
+    with open(path, "rb") as f:
+        head = pricing_batch.skip_csv_header(f) if fmt == "csv" else b""
+        if head:
+            parts.append(parse(head)[2])
+        for block in pricing_batch.iter_blocks(f, quoted=fmt == "csv"):
+            parts.append(parse(block)[2])
+    return np.concatenate(parts) if parts else np.zeros(0)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("config", help="pricing-config.json exported from the UI")
+    parser.add_argument("usage", help="usage CSV/JSONL, column file or .npy array of units")
+    parser.add_argument("--axis", action="append", required=True, type=parse_axis, help="name=start:stop:count or name=v1,v2,...")
+    parser.add_argument("-o", "--output", default="-", help="output CSV, or .npz for arrays (default: CSV on stdout)")
+    parser.add_argument("--format", choices=("csv", "jsonl"), help="usage format (default: from extension)")
+    parser.add_argument("-j", "--workers", type=int, help="worker processes (default: CPU count)")
+    args = parser.parse_args(argv)
+
+    config = pricing_engine.load_config(args.config)
+    usage = load_usage(args.usage, args.format)
+
+    start = time.perf_counter()
+    result = sweep(config, usage, args.axis, args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.output.endswith(".npz"):
+        write_npz(result, args.output)
+    elif args.output == "-":
+        write_csv(result, sys.stdout)
+    else:
+        with open(args.output, "w", encoding="utf-8") as f:
+            write_csv(result, f)
+    cells = result.revenue.size
+    print(f"swept {cells:,} variants over {len(usage):,} customers in {elapsed:.1f}s", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,219 @@
+import math
+import random
+import socket
+import threading
+import time
+import unittest
+
+import numpy as np
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+
+import pricing_engine
+from test_pricing import PORT, start_server
+
+CASES = 2000
+SEED = 1234
+MAX_POINTS = 1000  # samplePoints() budget in pricing-engine.js
+
+# Runs calculate() for every config in one round trip. The math it checks is
+# pricing-engine.js (compileTiers, samplePoints, SeriesCache); calculate()
+# only wraps it, reading tiers, mrr, discount and its series cache, so it is
+# called on plain objects instead of constructing a component (and its DOM
+# and chart) per case. The cache is shared, so consecutive cases also go
+# through its reuse checks.
+PARITY_SCRIPT = """
+const mod = await import('./pricing-component.js');
+const calculate = mod.PricingComponent.prototype.calculate;
+const series = new mod.SeriesCache();
+return arguments[0].map((config) => calculate.call({
+    _series: series,
+    mrr: config.mrr,
+    discount: config.discount,
+    tiers: config.tiers.map((t) => ({
+        ...t,
+        multiplier: t.multiplier === 'infinity' ? Infinity : t.multiplier,
+    })),
+}));
+"""
+
+
+def ensure_server():
+    """Start the static file server unless another test module already did."""
+    with socket.socket() as sock:
+        if sock.connect_ex(("localhost", PORT)) == 0:
+            return
+    threading.Thread(target=start_server, daemon=True).start()
+    time.sleep(0.5)
+
+
+def random_config(rng):
+    """A random toJSON() config biased towards the engine's edge cases."""
+    tiers = []
+    for _ in range(rng.randint(1, 6)):
+        units = rng.choice([0, rng.randint(1, 10), rng.randint(1, 200)])
+        tiers.append({
+            "sequence": rng.randint(0, 6),  # duplicates keep insertion order
+            "units": units,
+            "price": rng.choice([0, 0, rng.randint(1, 100), rng.randint(0, 999) / 100]),
+            "unitPrice": rng.choice([0, rng.randint(0, 20) / 2, rng.randint(0, 999) / 100]),
+            # Free units below, equal to and above the tier size.
+            "freeUnits": rng.choice([0, 0, rng.randint(0, units + 1), units + rng.randint(1, 50)]),
+            "multiplier": rng.choice([1, 1, 2, 3, 7, "infinity"]),
+        })
+    return {
+        "currency": "USD",
+        # Includes floors far above what the whole chart range can cost.
+        "mrr": rng.choice([0, 0, rng.randint(1, 500), rng.randint(1000, 100_000)]),
+        "discount": rng.choice([0, 0, rng.randint(1, 100), rng.randint(0, 1000) / 10]),
+        "tiers": tiers,
+    }
+
+
+def axis_units(tiers):
+    """Chart x-axis range: unlimited tiers are shown for 5 repetitions."""
+    total = 0
+    for t in tiers:
+        if t["units"] <= 0:
+            continue
+        reps = pricing_engine.parse_multiplier(t["multiplier"])
+        total += t["units"] * (5 if math.isinf(reps) else math.ceil(max(1, reps)))
+    return total
+
+
+def breakpoints(config, limit):
+    """Repetition starts and free-unit edges inside the chart range."""
+    compiled = pricing_engine.compile_tiers(config["tiers"])
+    points = set()
+    for start, units, free, reps in zip(compiled.starts, compiled.units, compiled.free_units, compiled.reps):
+        rep = 0
+        while rep < reps and start + rep * units < limit:
+            points.add(start + rep * units)
+            if 0 < free < units and start + rep * units + free <= limit:
+                points.add(start + rep * units + free)
+            rep += 1
+    return points
+
+
+def walk_quote(config, usage):
+    """Price by walking every tier and repetition from unit 0.
+
+    Deliberately naive and independent of pricing_engine's prefix sums and
+    binary search: the same walk as test_pricing_engine.reference_cost(),
+    run for all usages at once, then the MRR floor and discount.
+    """
+    usage = np.asarray(usage, dtype=np.float64)
+    cost = np.zeros(usage.shape)
+    rate = np.zeros(usage.shape)
+    remaining = usage.copy()
+    for tier in sorted(config["tiers"], key=lambda t: t["sequence"]):
+        if tier["units"] <= 0:
+            continue
+        reps = pricing_engine.parse_multiplier(tier["multiplier"])
+        rep = 0
+        while rep < max(1, reps) and (remaining > 0).any():
+            active = remaining > 0
+            consumed = np.minimum(remaining, tier["units"])
+            billable = np.maximum(consumed - tier["freeUnits"], 0)
+            cost += np.where(active, tier["price"] + billable * tier["unitPrice"], 0.0)
+            last = active & (remaining <= tier["units"])
+            rate[last] = np.where(consumed[last] <= tier["freeUnits"], 0.0, tier["unitPrice"])
+            remaining -= consumed
+            rep += 1
+
+    mrr = config["mrr"]
+    factor = 1 - config["discount"] / 100
+    over = cost >= mrr
+    cumulative = np.maximum(cost, mrr) * factor
+    with np.errstate(divide="ignore", invalid="ignore"):
+        average = np.where(over & (usage > 0), cumulative / usage, np.nan)
+    return cost, pricing_engine.Quote(cumulative, average, np.where(over, rate * factor, 0.0))
+
+
+class PricingParityTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        ensure_server()
+        opts = Options()
+        opts.add_argument("--headless=new")
+        opts.add_argument("--no-sandbox")
+        opts.add_argument("--disable-dev-shm-usage")
+        cls.driver = webdriver.Chrome(options=opts)
+        cls.driver.get(f"http://localhost:{PORT}/index.html")
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.driver.quit()
+
+    def assert_series_match(self, config, actual):
+        total = axis_units(config["tiers"])
+        ctx = f"config={config}"
+        if total == 0:
+            self.assertEqual(actual["labels"], [], ctx)
+            return
+
+        # The sampler must hit every breakpoint exactly, within its budget.
+        usage = np.array(actual["labels"], dtype=np.float64)
+        self.assertEqual(usage[0], 0, ctx)
+        self.assertEqual(usage[-1], total, ctx)
+        self.assertTrue(np.all(np.diff(usage) > 0), ctx)
+        self.assertLessEqual(len(usage), 1.5 * MAX_POINTS, ctx)
+        edges = breakpoints(config, total)
+        if len(edges) <= MAX_POINTS // 3:
+            self.assertLessEqual(edges, set(usage.tolist()), ctx)
+
+        # The naive walk is the oracle; the Python engine is checked too, so
+        # a disagreement shows which side drifted.
+        cost, walked = walk_quote(config, usage)
+        self.assert_quote_match(config, actual, cost, walked)
+        engine_cost, _ = pricing_engine.usage_cost(pricing_engine.compile_tiers(config["tiers"]), usage)
+        self.assert_quote_match(config, actual, engine_cost, pricing_engine.quote(config, usage))
+
+    def assert_quote_match(self, config, actual, cost, q):
+        ctx = f"config={config}"
+        # calculate() rounds to cents; allow one cent either way.
+        np.testing.assert_allclose(actual["cumulative"], q.cumulative, rtol=1e-9, atol=0.0101, err_msg=ctx)
+
+        # Exactly at the MRR crossover a last-bit difference may flip which
+        # side of the floor a point is on; compare everywhere else.
+        mrr = config["mrr"]
+        settled = np.abs(cost - mrr) > 1e-6 * max(1, mrr)
+        average = np.array([np.nan if v is None else v for v in actual["average"]])
+        np.testing.assert_array_equal(np.isnan(average)[settled], np.isnan(q.average)[settled], ctx)
+        np.testing.assert_allclose(average[settled], q.average[settled], rtol=1e-9, atol=0.0101, err_msg=ctx)
+        np.testing.assert_allclose(
+            np.array(actual["current"])[settled], q.marginal[settled], rtol=1e-9, atol=0.0101, err_msg=ctx
+        )
+
+    def test_01_random_configs_match_python_engine(self):
+        """calculate() agrees with a naive tier walk (and pricing_engine) on thousands of random configs."""
+        rng = random.Random(SEED)
+        configs = [random_config(rng) for _ in range(CASES)]
+        results = self.driver.execute_script(PARITY_SCRIPT, configs)
+        self.assertEqual(len(results), len(configs))
+        for config, actual in zip(configs, results):
+            self.assert_series_match(config, actual)
+
+    def test_02_fixed_point_totals_match_python_engine(self):
+        """quoteMinor() and quote_minor() produce identical integers in every currency."""
+        rng = random.Random(SEED + 1)
+        cases = []
+        for _ in range(CASES // 4):
+            config = random_config(rng)
+            config["currency"] = rng.choice(["USD", "EUR", "JPY", "KRW"])
+            cases.append((config, [rng.randint(0, 5000) for _ in range(20)]))
+        results = self.driver.execute_script("""
+            const engine = await import('./pricing-engine.js');
+            return arguments[0].map(([config, usages]) => {
+                const { tiers } = engine.configFromJSON(config);
+                return engine.quoteMinor(tiers, config.mrr, config.discount, config.currency, usages).map(String);
+            });
+        """, cases)
+        for (config, usages), actual in zip(cases, results):
+            expected = [str(m) for m in pricing_engine.quote_minor(config, usages)]
+            self.assertEqual(actual, expected, f"config={config}")
+
+
+if __name__ == "__main__":
+    unittest.main()
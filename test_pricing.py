@@ -1,4 +1,3 @@
-import http.server
 import os
 import threading
 import time
@@ -12,14 +11,15 @@ from selenium.webdriver.common.action_chains import ActionChains
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 
+import pricing_engine
+import pricing_server
+
 PORT = 8791
 DIR = os.path.dirname(os.path.abspath(__file__))
 
 
 def start_server():
-    handler = http.server.SimpleHTTPRequestHandler
-    os.chdir(DIR)
-    server = http.server.HTTPServer(("", PORT), handler)
+    server = pricing_server.QuoteServer(("", PORT), directory=DIR)
     server.serve_forever()
 
 
@@ -45,14 +45,37 @@ class PricingComponentTest(unittest.TestCase):
         cls.driver.quit()
 
     def _wait_chart(self):
-        """Wait until the Chart.js canvas has rendered (non-zero dimensions)."""
+        """Scroll the chart into view and wait until Chart.js has rendered it.
+
+        The chart is only created once its section is visible.
+        """
         self.wait.until(
             lambda d: d.execute_script(
                 "const c = document.getElementById('pricing-chart-canvas');"
-                "return c && c.getBoundingClientRect().height > 50;"
+                "if (c) c.scrollIntoView({block: 'nearest'});"
+                "return c && c.getBoundingClientRect().height > 50"
+                "  && Object.keys(Chart.instances).length > 0;"
             )
         )
 
+    def _wait_idle(self):
+        """Wait until no chart update is scheduled or computing.
+
+        Input handlers only schedule a redraw, so after an action this
+        returns once the resulting `pricing-update` event has fired.
+        """
+        self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const comp = window.pricingComponent;
+            if (!comp.getMetrics().pending) return done();
+            const onUpdate = () => {
+                if (comp.getMetrics().pending) return;
+                comp.container.removeEventListener('pricing-update', onUpdate);
+                done();
+            };
+            comp.container.addEventListener('pricing-update', onUpdate);
+        """)
+
     def _get_tier_inputs(self):
         """Return all input rows grouped by tier index (excludes range sliders)."""
         rows = self.driver.find_elements(By.CSS_SELECTOR, ".tier-table tbody tr")
@@ -161,7 +184,7 @@ class PricingComponentTest(unittest.TestCase):
         unit_price_input = tiers[0]["unitPrice"]
         unit_price_input.clear()
         unit_price_input.send_keys("20")
-        time.sleep(0.3)
+        self._wait_idle()
 
         data_after = self._chart_data()
         last_cum_after = data_after["cumulative"][-1]
@@ -170,7 +193,7 @@ class PricingComponentTest(unittest.TestCase):
         # Restore original value
         unit_price_input.clear()
         unit_price_input.send_keys("10")
-        time.sleep(0.3)
+        self._wait_idle()
 
     def test_09_add_tier(self):
         """Clicking '+ Add Tier' adds a row and updates the chart."""
@@ -179,7 +202,7 @@ class PricingComponentTest(unittest.TestCase):
 
         add_btn = self.driver.find_element(By.CSS_SELECTOR, ".btn-add")
         add_btn.click()
-        time.sleep(0.3)
+        self._wait_idle()
 
         tiers_after = self._get_tier_inputs()
         self.assertEqual(len(tiers_after), len(tiers_before) + 1)
@@ -195,7 +218,7 @@ class PricingComponentTest(unittest.TestCase):
 
         remove_btns = self.driver.find_elements(By.CSS_SELECTOR, ".btn-remove")
         remove_btns[-1].click()
-        time.sleep(0.3)
+        self._wait_idle()
 
         tiers_after = self._get_tier_inputs()
         self.assertEqual(len(tiers_after), count_before - 1)
@@ -208,11 +231,11 @@ class PricingComponentTest(unittest.TestCase):
                 break
             remove_btn = self.driver.find_elements(By.CSS_SELECTOR, ".btn-remove")[0]
             remove_btn.click()
-            time.sleep(0.2)
+            self._wait_idle()
 
         remove_btn = self.driver.find_elements(By.CSS_SELECTOR, ".btn-remove")[0]
         remove_btn.click()
-        time.sleep(0.2)
+        self._wait_idle()
 
         tiers = self._get_tier_inputs()
         self.assertEqual(len(tiers), 1)
@@ -230,7 +253,7 @@ class PricingComponentTest(unittest.TestCase):
         for val in ["150", "200", "100"]:
             inp.clear()
             inp.send_keys(val)
-            time.sleep(0.3)
+            self._wait_idle()
 
         canvas = self.driver.find_element(By.ID, "pricing-chart-canvas")
         final_height = canvas.rect["height"]
@@ -284,7 +307,7 @@ class PricingComponentTest(unittest.TestCase):
         mult_input = tiers[2]["multiplier"]  # tier 3, currently ∞
         mult_input.clear()
         mult_input.send_keys("1")
-        time.sleep(0.3)
+        self._wait_idle()
 
         data_after = self._chart_data()
         max_after = data_after["labels"][-1]
@@ -295,7 +318,7 @@ class PricingComponentTest(unittest.TestCase):
         # Restore
         mult_input.clear()
         mult_input.send_keys("\u221e")
-        time.sleep(0.3)
+        self._wait_idle()
 
     def test_17_edit_multiplier_to_infinity(self):
         """Typing ∞ into multiplier sets unlimited repetitions."""
@@ -304,7 +327,7 @@ class PricingComponentTest(unittest.TestCase):
         mult_input = tiers[0]["multiplier"]  # tier 1, currently 1
         mult_input.clear()
         mult_input.send_keys("\u221e")
-        time.sleep(0.3)
+        self._wait_idle()
 
         # With tier1 unlimited (100*5=500), tier2 never reached
         # Total should be 500 for just tier 1's chart range
@@ -319,17 +342,13 @@ class PricingComponentTest(unittest.TestCase):
     def test_18_multiplier_cost_calculation(self):
         """Verify cost is correct: each repetition charges price + billable * unitPrice."""
         self._reload()
-        # Use JS to directly test the calculation engine with known tiers
+        # The pricing engine needs no component, DOM or chart.
         result = self.driver.execute_script("""
             // Single tier: units=100, price=10, unitPrice=2, freeUnits=0, multiplier=3
-            const container = document.createElement('div');
-            document.body.appendChild(container);
-            const mod = await import('./pricing-component.js');
-            const comp = new mod.PricingComponent(container, [
+            const engine = await import('./pricing-engine.js');
+            const data = engine.computeSeries([
                 { sequence: 1, units: 100, price: 10, unitPrice: 2, freeUnits: 0, multiplier: 3 }
-            ]);
-            const data = comp.calculate();
-            document.body.removeChild(container);
+            ], 0, 0);
 
             // At 300 units (full 3 reps): 3 * (10 + 100*2) = 630
             const lastLabel = data.labels[data.labels.length - 1];
@@ -364,7 +383,7 @@ class PricingComponentTest(unittest.TestCase):
             "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
             slider,
         )
-        time.sleep(0.3)
+        self._wait_idle()
 
         # Number input should reflect the new value
         self.assertEqual(inputs[0]["units"].get_attribute("value"), "500")
@@ -383,7 +402,7 @@ class PricingComponentTest(unittest.TestCase):
 
         inputs[0]["units"].clear()
         inputs[0]["units"].send_keys("800")
-        time.sleep(0.3)
+        self._wait_idle()
 
         slider_val = sliders[0]["units"].get_attribute("value")
         self.assertEqual(slider_val, "800")
@@ -402,7 +421,7 @@ class PricingComponentTest(unittest.TestCase):
             "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
             slider,
         )
-        time.sleep(0.3)
+        self._wait_idle()
 
         self.assertEqual(inputs[0]["multiplier"].get_attribute("value"), "\u221e")
 
@@ -421,7 +440,7 @@ class PricingComponentTest(unittest.TestCase):
             "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
             slider,
         )
-        time.sleep(0.3)
+        self._wait_idle()
 
         self.assertEqual(inputs[2]["multiplier"].get_attribute("value"), "3")
 
@@ -456,7 +475,7 @@ class PricingComponentTest(unittest.TestCase):
             if option.get_attribute("value") == "EUR":
                 option.click()
                 break
-        time.sleep(0.3)
+        self._wait_idle()
 
         axis_label = self.driver.execute_script(
             "const chart = Chart.instances[Object.keys(Chart.instances)[0]];"
@@ -471,7 +490,7 @@ class PricingComponentTest(unittest.TestCase):
             if option.get_attribute("value") == "USD":
                 option.click()
                 break
-        time.sleep(0.3)
+        self._wait_idle()
 
     def test_27_mrr_and_discount_inputs_present(self):
         """MRR and Discount inputs and sliders exist."""
@@ -486,7 +505,7 @@ class PricingComponentTest(unittest.TestCase):
         mrr_input = self.driver.find_element(By.ID, "mrr-input")
         mrr_input.clear()
         mrr_input.send_keys("5000")
-        time.sleep(0.3)
+        self._wait_idle()
 
         data = self._chart_data()
         # At 0 units, cumulative = MRR = 5000
@@ -507,7 +526,7 @@ class PricingComponentTest(unittest.TestCase):
         disc_input = self.driver.find_element(By.ID, "discount-input")
         disc_input.clear()
         disc_input.send_keys("50")
-        time.sleep(0.3)
+        self._wait_idle()
 
         data_after = self._chart_data()
         # Cumulative at max should be roughly half
@@ -530,7 +549,7 @@ class PricingComponentTest(unittest.TestCase):
             "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
             slider,
         )
-        time.sleep(0.3)
+        self._wait_idle()
 
         self.assertEqual(inp.get_attribute("value"), "200")
         self._reload()
@@ -546,7 +565,7 @@ class PricingComponentTest(unittest.TestCase):
             "arguments[0].dispatchEvent(new Event('input', {bubbles: true}));",
             slider,
         )
-        time.sleep(0.3)
+        self._wait_idle()
 
         self.assertEqual(inp.get_attribute("value"), "25")
         self._reload()
@@ -566,7 +585,7 @@ class PricingComponentTest(unittest.TestCase):
         disc_input = self.driver.find_element(By.ID, "discount-input")
         disc_input.clear()
         disc_input.send_keys("50")
-        time.sleep(0.3)
+        self._wait_idle()
 
         data_after = self._chart_data()
         rate_after = None
@@ -587,24 +606,20 @@ class PricingComponentTest(unittest.TestCase):
         self.assertEqual(import_btn.text, "Import JSON")
 
     def test_34_to_json_returns_config(self):
-        """toJSON() returns current state with tiers, currency, mrr, discount."""
+        """configToJSON() (behind toJSON()) writes tiers, currency code, mrr and discount."""
         self._reload()
         config = self.driver.execute_script("""
-            const comp = document.querySelector('#pricing-container').__pricingComponent;
-            // Attach reference for test access
-            return null;
-        """)
-        # Use the component directly via JS on the page
-        config = self.driver.execute_script("""
-            const container = document.createElement('div');
-            document.body.appendChild(container);
-            const mod = await import('./pricing-component.js');
-            const comp = new mod.PricingComponent(container);
-            comp.mrr = 200;
-            comp.discount = 15;
-            const json = comp.toJSON();
-            document.body.removeChild(container);
-            return json;
+            const engine = await import('./pricing-engine.js');
+            return engine.configToJSON({
+                currency: engine.CURRENCIES[0],
+                mrr: 200,
+                discount: 15,
+                tiers: [
+                    { sequence: 1, units: 100, price: 0, unitPrice: 10, freeUnits: 10, multiplier: 1 },
+                    { sequence: 2, units: 200, price: 50, unitPrice: 7, freeUnits: 0, multiplier: 2 },
+                    { sequence: 3, units: 500, price: 0, unitPrice: 3, freeUnits: 0, multiplier: Infinity },
+                ],
+            });
         """)
         self.assertEqual(config["currency"], "USD")
         self.assertEqual(config["mrr"], 200)
@@ -614,14 +629,11 @@ class PricingComponentTest(unittest.TestCase):
         self.assertEqual(config["tiers"][2]["multiplier"], "infinity")
 
     def test_35_load_json_restores_config(self):
-        """loadJSON() restores tiers, currency, mrr, discount."""
+        """configFromJSON() (behind loadJSON()) restores tiers, currency, mrr and discount."""
         self._reload()
         result = self.driver.execute_script("""
-            const container = document.createElement('div');
-            document.body.appendChild(container);
-            const mod = await import('./pricing-component.js');
-            const comp = new mod.PricingComponent(container);
-            comp.loadJSON({
+            const engine = await import('./pricing-engine.js');
+            const state = engine.configFromJSON({
                 currency: 'EUR',
                 mrr: 500,
                 discount: 10,
@@ -629,16 +641,635 @@ class PricingComponentTest(unittest.TestCase):
                     { sequence: 1, units: 50, price: 5, unitPrice: 2, freeUnits: 0, multiplier: 'infinity' }
                 ]
             });
-            const json = comp.toJSON();
-            document.body.removeChild(container);
-            return json;
+            return {
+                currency: state.currency.code,
+                unlimited: state.tiers[0].multiplier === Infinity,
+                json: engine.configToJSON(state),
+            };
         """)
         self.assertEqual(result["currency"], "EUR")
-        self.assertEqual(result["mrr"], 500)
-        self.assertEqual(result["discount"], 10)
-        self.assertEqual(len(result["tiers"]), 1)
-        self.assertEqual(result["tiers"][0]["units"], 50)
-        self.assertEqual(result["tiers"][0]["multiplier"], "infinity")
+        self.assertTrue(result["unlimited"])
+        json = result["json"]
+        self.assertEqual(json["currency"], "EUR")
+        self.assertEqual(json["mrr"], 500)
+        self.assertEqual(json["discount"], 10)
+        self.assertEqual(len(json["tiers"]), 1)
+        self.assertEqual(json["tiers"][0]["units"], 50)
+        self.assertEqual(json["tiers"][0]["multiplier"], "infinity")
+
+    def test_36_add_tier_keeps_existing_rows(self):
+        """Adding a tier appends one row and leaves existing rows untouched."""
+        self._reload()
+        self.driver.execute_script(
+            "document.querySelector('.tier-table tbody tr').dataset.marker = 'kept';"
+        )
+        self.driver.find_element(By.CSS_SELECTOR, ".btn-add").click()
+        self._wait_idle()
+
+        marker = self.driver.execute_script(
+            "return document.querySelector('.tier-table tbody tr').dataset.marker;"
+        )
+        self.assertEqual(marker, "kept")
+        self.assertEqual(len(self._get_tier_inputs()), 4)
+
+        self._reload()
+
+    def test_37_long_tier_list_is_virtualized(self):
+        """Only rows near the visible window are mounted for long tier lists."""
+        self._reload()
+        result = self.driver.execute_script("""
+            const container = document.createElement('div');
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const tiers = [];
+            for (let i = 1; i <= 300; i++) {
+                tiers.push({ sequence: i, units: 10, price: 0, unitPrice: 1, freeUnits: 0, multiplier: 1 });
+            }
+            const comp = new mod.PricingComponent(container, tiers);
+            const mounted = container.querySelectorAll('.tier-table tbody tr').length;
+            comp.removeTier(0);
+            const first = container.querySelector('.tier-table tbody tr [data-field="sequence"]').value;
+            document.body.removeChild(container);
+            return { mounted, first, count: comp.tiers.length };
+        """)
+        self.assertGreater(result["mounted"], 0)
+        self.assertLess(result["mounted"], 100)
+        self.assertEqual(result["first"], "2")
+        self.assertEqual(result["count"], 299)
+
+    def test_38_worker_mode_matches_calculate(self):
+        """Worker mode draws the same series as calculate() on the main thread."""
+        self._reload()
+        result = self.driver.execute_script("""
+            const container = document.createElement('div');
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const comp = new mod.PricingComponent(container, undefined, undefined, { worker: true, deferChart: false });
+            comp.mrr = 300;
+            comp.updateChart();
+            for (let i = 0; i < 50 && !(comp.chart && !comp._inFlight); i++) {
+                await new Promise((r) => setTimeout(r, 50));
+            }
+            const points = comp.chart.data.datasets[0].data;
+            const expected = comp.calculate();
+            const parsing = comp.chart.options.parsing;
+            comp.destroy();
+            document.body.removeChild(container);
+            return {
+                parsing,
+                xs: points.map((p) => p.x),
+                ys: points.map((p) => p.y),
+                labels: expected.labels,
+                cumulative: expected.cumulative,
+            };
+        """)
+        self.assertFalse(result["parsing"])
+        self.assertEqual(result["xs"], result["labels"])
+        self.assertEqual(result["ys"], result["cumulative"])
+
+    def test_39_inverse_queries(self):
+        """unitsForBudget() and breakEven() solve the default curve exactly."""
+        self._reload()
+        result = self.driver.execute_script("""
+            const container = document.createElement('div');
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const comp = new mod.PricingComponent(container);
+            const before = { tierJump: comp.unitsForBudget(900), free: comp.unitsForBudget(0), breakEven: comp.breakEven() };
+            comp.mrr = 1000;
+            comp.discount = 10;
+            const after = { budget: comp.unitsForBudget(900), breakEven: comp.breakEven() };
+            const under = comp.unitsForBudget(899);
+            comp.destroy();
+            document.body.removeChild(container);
+            return { before, after, under };
+        """)
+        self.assertEqual(result["before"], {"tierJump": 100, "free": 10, "breakEven": 0})
+        self.assertAlmostEqual(result["after"]["budget"], 100 + 50 / 7)
+        self.assertAlmostEqual(result["after"]["breakEven"], 100 + 50 / 7)
+        self.assertIsNone(result["under"])
+
+    def test_40_plan_comparison(self):
+        """Several configs share one chart and report exact crossovers."""
+        self._reload()
+        result = self.driver.execute_script("""
+            const container = document.createElement('div');
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const tier = (unitPrice, extra) => ({ sequence: 1, units: 1000, price: 0, unitPrice, freeUnits: 0, multiplier: 1, ...extra });
+            const configs = [
+                { name: 'Metered', mrr: 0, discount: 0, tiers: [tier(2)] },
+                { name: 'Committed', mrr: 500, discount: 0, tiers: [tier(1)] },
+                { name: 'Blocks', mrr: 0, discount: 0, tiers: [tier(0, { units: 100, price: 150, multiplier: 'infinity' })] },
+            ];
+            const before = Object.keys(Chart.instances).length;
+            const cmp = new mod.PricingComparison(container, configs);
+            const out = {
+                datasets: cmp.chart.data.datasets.map((d) => d.label),
+                crossovers: cmp.result.crossovers.map((c) => [c.units, c.cheaper, c.dearer]),
+                items: container.querySelectorAll('.crossover-list li').length,
+                charts: Object.keys(Chart.instances).length - before,
+            };
+            cmp.destroy();
+            document.body.removeChild(container);
+            return out;
+        """)
+        self.assertEqual(result["datasets"], ["Metered", "Committed", "Blocks"])
+        self.assertEqual(result["crossovers"][:3], [[75, 2, 0], [100, 0, 2], [150, 2, 0]])
+        self.assertIn([250, 1, 0], result["crossovers"])
+        self.assertEqual(result["items"], len(result["crossovers"]))
+        self.assertEqual(result["charts"], 1)
+
+    def test_41_metrics_and_update_event(self):
+        """getMetrics() counts instrumented calls; each redraw emits a new generation."""
+        self._reload()
+        before = self.driver.execute_script("return window.pricingComponent.getMetrics();")
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const comp = window.pricingComponent;
+            const slider = comp.container.querySelector('#mrr-slider');
+            comp.container.addEventListener('pricing-update', (e) => {
+                done({
+                    detail: e.detail,
+                    metrics: comp.getMetrics(),
+                    measures: performance.getEntriesByName('pricing:calculate').length,
+                });
+            }, { once: true });
+            for (let i = 1; i <= 20; i++) {
+                slider.value = i * 10;
+                slider.dispatchEvent(new Event('input', { bubbles: true }));
+            }
+        """)
+        metrics = result["metrics"]
+        self.assertEqual(result["detail"]["generation"], before["generation"] + 1)
+        self.assertEqual(metrics["generation"], result["detail"]["generation"])
+        # Twenty input events coalesce into a single redraw.
+        self.assertEqual(metrics["calculate"]["count"], before["calculate"]["count"] + 1)
+        self.assertEqual(metrics["render"]["count"], before["render"]["count"])
+        self.assertEqual(metrics["points"], result["detail"]["points"])
+        self.assertGreater(metrics["points"], 0)
+        self.assertGreaterEqual(result["measures"], 1)
+        for name in ("calculate", "render", "bindInputs", "updateChart"):
+            self.assertLessEqual(metrics[name]["p50"], metrics[name]["p95"])
+        # A slider drag draws a preview; the full-resolution redraw follows.
+        self.assertTrue(metrics["preview"])
+        self.assertTrue(metrics["pending"])
+        self._wait_idle()
+        self.assertFalse(self.driver.execute_script("return window.pricingComponent.getMetrics().pending;"))
+
+    def test_42_chart_deferred_until_visible(self):
+        """An off-screen component renders once and creates its chart when scrolled to."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const container = document.createElement('div');
+            container.style.marginTop = '5000px';
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const config = { currency: 'EUR', mrr: 100, discount: 0, tiers: [
+                { sequence: 1, units: 50, price: 0, unitPrice: 2, freeUnits: 0, multiplier: 'infinity' },
+            ] };
+            const comp = new mod.PricingComponent(container, undefined, undefined, { config });
+            const before = { chart: comp.chart !== null, metrics: comp.getMetrics(), rows: container.querySelectorAll('.tier-table tbody tr').length };
+            container.addEventListener('pricing-update', () => {
+                const after = { chart: comp.chart !== null, metrics: comp.getMetrics() };
+                comp.destroy();
+                document.body.removeChild(container);
+                window.scrollTo(0, 0);
+                done({ before, after });
+            }, { once: true });
+            container.querySelector('#pricing-chart-canvas').scrollIntoView();
+        """)
+        before, after = result["before"], result["after"]
+        self.assertFalse(before["chart"])
+        self.assertEqual(before["rows"], 1)
+        self.assertEqual(before["metrics"]["render"]["count"], 1)
+        self.assertEqual(before["metrics"]["calculate"]["count"], 0)
+        self.assertTrue(after["chart"])
+        self.assertEqual(after["metrics"]["render"]["count"], 1)
+        self.assertEqual(after["metrics"]["generation"], 1)
+
+    def test_43_config_from_url_hash(self):
+        """The page starts from a #pricing= config and writes edits back to the hash."""
+        self.driver.get(f"http://localhost:{PORT}/index.html#pricing=EUR,100,0;1,50,0,2,0,~")
+        self._wait_chart()
+        self.assertEqual(len(self._get_tier_inputs()), 1)
+        self.assertEqual(self.driver.find_element(By.ID, "currency-select").get_attribute("value"), "EUR")
+        self.assertEqual(self.driver.find_element(By.ID, "mrr-input").get_attribute("value"), "100")
+        self.assertEqual(
+            self.driver.execute_script("return window.pricingComponent.getMetrics().render.count;"), 1
+        )
+
+        mrr_input = self.driver.find_element(By.ID, "mrr-input")
+        mrr_input.clear()
+        mrr_input.send_keys("250")
+        self._wait_idle()
+        self.assertEqual(
+            self.driver.execute_script("return location.hash;"), "#pricing=EUR,250,0;1,50,0,2,0,~"
+        )
+        self._reload()
+
+    def test_44_slider_drag_previews_then_refines(self):
+        """A drag redraws at preview resolution and refines on release."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const mod = await import('./pricing-component.js');
+            const comp = window.pricingComponent;
+            const tiers = [];
+            for (let i = 0; i < 500; i++) {
+                tiers.push({ sequence: i + 1, units: 100, price: 0, unitPrice: 10 - i * 0.01, freeUnits: 0, multiplier: i === 499 ? 'infinity' : 2 });
+            }
+            comp.loadJSON({ currency: 'USD', mrr: 0, discount: 0, tiers });
+            const nextUpdate = () => new Promise((resolve) => {
+                comp.container.addEventListener('pricing-update', (e) => resolve(e.detail.points), { once: true });
+            });
+            let update = nextUpdate();
+            comp.updateChart();
+            const full = await update;
+
+            const slider = comp.container.querySelector('#mrr-slider');
+            update = nextUpdate();
+            for (let i = 1; i <= 10; i++) {
+                slider.value = i * 100;
+                slider.dispatchEvent(new Event('input', { bubbles: true }));
+            }
+            const preview = await update;
+            const previewMetrics = comp.getMetrics();
+
+            update = nextUpdate();
+            slider.dispatchEvent(new Event('change', { bubbles: true }));
+            const refined = await update;
+            done({ full, preview, previewMetrics, refined, after: comp.getMetrics(), PREVIEW_POINTS: mod.PREVIEW_POINTS });
+        """)
+        self.assertGreater(result["full"], result["PREVIEW_POINTS"])
+        self.assertLessEqual(result["preview"], result["PREVIEW_POINTS"])
+        self.assertTrue(result["previewMetrics"]["preview"])
+        self.assertEqual(result["refined"], result["full"])
+        self.assertFalse(result["after"]["preview"])
+        self.assertFalse(result["after"]["pending"])
+        self.assertEqual(self.driver.find_element(By.ID, "mrr-input").get_attribute("value"), "1000")
+        self._reload()
+
+    def test_45_usage_histogram_projection_overlay(self):
+        """A usage histogram is overlaid on the chart and its revenue matches the Python engine."""
+        self._reload()
+        histogram = {"edges": [0, 10, 100, 250, 2000], "counts": [40, 90, 25, 5]}
+        result = self.driver.execute_async_script("""
+            const [histogram, done] = arguments;
+            const comp = window.pricingComponent;
+            comp.mrr = 500;
+            comp.discount = 10;
+            comp.container.addEventListener('pricing-update', () => {
+                const { total, customers, floorShare, averagePrice, revenue } = comp.projection;
+                done({
+                    datasets: comp.chart.data.datasets.map((d) => d.label),
+                    overlay: comp.chart.data.datasets[3].data,
+                    summary: comp.container.querySelector('.projection-summary').textContent,
+                    projection: { total, customers, floorShare, averagePrice, revenue: Array.from(revenue) },
+                    config: comp.toJSON(),
+                });
+            }, { once: true });
+            comp.setUsageHistogram(histogram);
+        """, histogram)
+        self.assertEqual(len(result["datasets"]), 4)
+        self.assertEqual(result["datasets"][3], "Customers (usage histogram)")
+        self.assertEqual(result["overlay"][0], {"x": 0, "y": 40})
+        self.assertIn("from 160 customers", result["summary"])
+
+        expected = pricing_engine.project_revenue(result["config"], histogram["edges"], histogram["counts"])
+        projection = result["projection"]
+        self.assertEqual(projection["customers"], 160)
+        self.assertAlmostEqual(projection["total"], expected.total, places=6)
+        self.assertAlmostEqual(projection["floorShare"], expected.floor_share, places=9)
+        self.assertAlmostEqual(projection["averagePrice"], expected.average_price, places=9)
+        for got, want in zip(projection["revenue"], expected.revenue):
+            self.assertAlmostEqual(got, want, places=6)
+
+        self.driver.execute_script("window.pricingComponent.setUsageHistogram(null);")
+        self._wait_idle()
+        self.assertEqual(
+            self.driver.execute_script("return window.pricingComponent.chart.data.datasets.length;"), 3
+        )
+        self._reload()
+
+    def test_46_incremental_recalculation(self):
+        """Editing a late tier reprices only the points after it; MRR only rescales."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const mod = await import('./pricing-component.js');
+            const comp = window.pricingComponent;
+            const tiers = [];
+            for (let i = 0; i < 500; i++) {
+                tiers.push({ sequence: i + 1, units: 100, price: i % 3 ? 0 : 25, unitPrice: 10 - i * 0.01, freeUnits: 0, multiplier: i === 499 ? 'infinity' : 2 });
+            }
+            comp.loadJSON({ currency: 'USD', mrr: 0, discount: 0, tiers });
+            const loaded = comp.getMetrics().series;
+
+            const plain = (s) => ({
+                labels: Array.from(s.labels),
+                cumulative: Array.from(s.cumulative),
+                average: Array.from(s.average, (v) => (Number.isNaN(v) ? null : v)),
+                current: Array.from(s.current),
+            });
+            const steps = [];
+            const edit = (apply) => {
+                apply();
+                const series = comp.calculate();
+                const expected = plain(mod.computeSeries(comp.tiers, comp.mrr, comp.discount));
+                steps.push({ update: comp.getMetrics().series, same: JSON.stringify(series) === JSON.stringify(expected) });
+            };
+            edit(() => { comp.tiers[480].unitPrice = 2.5; });
+            edit(() => { comp.tiers[489].price = 40; });
+            edit(() => { comp.mrr = 5000; comp.discount = 10; });
+            edit(() => { comp.tiers[480].units = 50; });
+            done({ loaded, steps, points: comp.calculate().labels.length });
+        """)
+        self.assertEqual(result["loaded"]["mode"], "full")
+        late, fee, floor, units = result["steps"]
+        for step in result["steps"]:
+            self.assertTrue(step["same"], step)
+        self.assertEqual(late["update"]["mode"], "suffix")
+        self.assertLess(late["update"]["repriced"], result["points"] // 10)
+        self.assertEqual(fee["update"]["mode"], "suffix")
+        self.assertEqual(floor["update"], {"mode": "rescale", "repriced": 0})
+        # Changing a tier's size moves every later sample position.
+        self.assertEqual(units["update"]["mode"], "full")
+        self._reload()
+
+    def test_47_high_resolution_and_zoom(self):
+        """High-resolution mode keeps every breakpoint; a zoom shows a single free-unit window."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const comp = window.pricingComponent;
+            comp.loadJSON({ currency: 'USD', mrr: 0, discount: 0, tiers: [
+                { sequence: 1, units: 1000000, price: 0, unitPrice: 0.01, freeUnits: 1000, multiplier: 1 },
+                { sequence: 2, units: 10, price: 50, unitPrice: 5, freeUnits: 3, multiplier: 1 },
+                { sequence: 3, units: 250, price: 2, unitPrice: 0.02, freeUnits: 100, multiplier: 20000 },
+                { sequence: 4, units: 1000000, price: 0, unitPrice: 0.005, freeUnits: 0, multiplier: 'infinity' },
+            ] });
+            const normal = comp.calculate();
+            const nextUpdate = () => new Promise((resolve) => {
+                comp.container.addEventListener('pricing-update', (e) => resolve(e.detail.points), { once: true });
+            });
+            let update = nextUpdate();
+            comp.setHighResolution(true);
+            const highResPoints = await update;
+            const highRes = comp.getMetrics().series;
+
+            // Repetition 12345 of the 250-unit tier, which starts at 1000010.
+            const repStart = 1000010 + 12345 * 250;
+            update = nextUpdate();
+            comp.zoomTo(repStart, repStart + 250);
+            await update;
+            const { labels, datasets } = comp.chart.data;
+            const freeEdge = labels.indexOf(repStart + 100);
+            const zoomed = {
+                min: comp.chart.options.scales.x.min,
+                max: comp.chart.options.scales.x.max,
+                rates: [datasets[2].data[freeEdge], datasets[2].data[freeEdge + 1]],
+                fee: [datasets[0].data[labels.indexOf(repStart)], datasets[0].data[labels.indexOf(repStart + 1)]],
+            };
+            update = nextUpdate();
+            comp.resetZoom();
+            await update;
+            done({
+                normalHasEdge: normal.labels.includes(repStart + 100),
+                highResPoints, highRes, zoomed, repStart,
+                reset: comp.chart.options.scales.x.min,
+            });
+        """)
+        # The regular series strides the 20000 repetitions and skips this one.
+        self.assertFalse(result["normalHasEdge"])
+        # Every breakpoint is evaluated, then decimated for display.
+        self.assertEqual(result["highRes"]["mode"], "full")
+        self.assertGreater(result["highRes"]["repriced"], 60000)
+        self.assertLess(result["highResPoints"], 10000)
+        zoomed = result["zoomed"]
+        self.assertEqual([zoomed["min"], zoomed["max"]], [result["repStart"], result["repStart"] + 250])
+        self.assertEqual(zoomed["rates"], [0, 0.02])
+        self.assertAlmostEqual(zoomed["fee"][1] - zoomed["fee"][0], 2, places=6)
+        self.assertIsNone(result["reset"])
+        self._reload()
+
+    def test_48_engine_runs_without_dom(self):
+        """pricing-engine.js runs in a worker, which has no DOM, and matches the component."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const engineUrl = new URL('./pricing-engine.js', location.href).href;
+            const source = `
+                import * as engine from '${engineUrl}';
+                self.onmessage = (e) => {
+                    const state = engine.configFromJSON(e.data);
+                    const series = engine.computeSeries(state.tiers, state.mrr, state.discount);
+                    self.postMessage({
+                        hasDocument: typeof document !== 'undefined',
+                        json: engine.configToJSON(state),
+                        last: series.cumulative[series.cumulative.length - 1],
+                        points: series.labels.length,
+                    });
+                };
+            `;
+            const worker = new Worker(URL.createObjectURL(new Blob([source], { type: 'text/javascript' })), { type: 'module' });
+            const config = window.pricingComponent.toJSON();
+            config.mrr = 750;
+            config.discount = 20;
+            worker.onmessage = async (e) => {
+                worker.terminate();
+                const mod = await import('./pricing-component.js');
+                const engine = await import('./pricing-engine.js');
+                const container = document.createElement('div');
+                const comp = new mod.PricingComponent(container, undefined, undefined, { config, deferChart: false });
+                const expected = comp.calculate();
+                comp.destroy();
+                done({
+                    ...e.data, config,
+                    expectedLast: expected.cumulative[expected.cumulative.length - 1],
+                    expectedPoints: expected.labels.length,
+                    reexported: mod.computeSeries === engine.computeSeries,
+                });
+            };
+            worker.postMessage(config);
+        """)
+        self.assertFalse(result["hasDocument"])
+        self.assertEqual(result["json"], result["config"])
+        self.assertEqual(result["last"], result["expectedLast"])
+        self.assertEqual(result["points"], result["expectedPoints"])
+        self.assertTrue(result["reexported"])
+        self._reload()
+
+    def test_49_fixed_point_invoices_match_batch_engine(self):
+        """invoiceMinor() gives the same integers as pricing_engine.quote_minor, in yen for JPY."""
+        self._reload()
+        usages = [0, 1, 9, 10, 100, 250, 1301, 4999]
+        result = self.driver.execute_script("""
+            const comp = window.pricingComponent;
+            comp.mrr = 500;
+            comp.discount = 12.5;
+            const out = {};
+            for (const code of ['USD', 'JPY']) {
+                comp.loadJSON({ ...comp.toJSON(), currency: code });
+                out[code] = {
+                    config: comp.toJSON(),
+                    minor: comp.invoiceMinor(arguments[0]).map(String),
+                    total: comp.invoiceTotal(250),
+                };
+            }
+            let error = null;
+            try {
+                comp.invoiceMinor([2.5]);
+            } catch (e) {
+                error = e.name;
+            }
+            return { out, error };
+        """, usages)
+        for code, expected in (("USD", "1750.00"), ("JPY", "1750")):
+            with self.subTest(currency=code):
+                actual = result["out"][code]
+                self.assertEqual(actual["minor"], [str(m) for m in pricing_engine.quote_minor(actual["config"], usages)])
+                self.assertEqual(actual["total"], expected)
+        self.assertEqual(result["error"], "RangeError")
+        self._reload()
+
+    def test_50_histogram_overlay_steps_cover_their_bucket(self):
+        """Units inside bucket k are drawn at counts[k], following Chart.js's stepped rule."""
+        self._reload()
+        histogram = {"edges": [0, 10, 100, 250, 2000], "counts": [40, 90, 25, 5]}
+        result = self.driver.execute_async_script("""
+            const [histogram, done] = arguments;
+            const comp = window.pricingComponent;
+            comp.container.addEventListener('pricing-update', () => {
+                const dataset = comp.chart.data.datasets[3];
+                done({ data: dataset.data, stepped: dataset.stepped });
+            }, { once: true });
+            comp.setUsageHistogram(histogram);
+        """, histogram)
+        data = result["data"]
+
+        def drawn(x):
+            # 'after' draws the span (a, b] at b's y; 'before' (or true) at a's y.
+            for a, b in zip(data, data[1:]):
+                if a["x"] < x < b["x"]:
+                    return b["y"] if result["stepped"] == "after" else a["y"]
+            return None
+
+        edges, counts = histogram["edges"], histogram["counts"]
+        for k, count in enumerate(counts):
+            with self.subTest(bucket=k):
+                self.assertEqual(drawn((edges[k] + edges[k + 1]) / 2), count)
+        self.driver.execute_script("window.pricingComponent.setUsageHistogram(null);")
+        self._reload()
+
+    def test_51_previews_and_settled_redraws_both_stay_incremental(self):
+        """Alternating drag previews and settled redraws reprice only a suffix at each resolution."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const mod = await import('./pricing-component.js');
+            const comp = window.pricingComponent;
+            const tiers = [];
+            for (let i = 0; i < 500; i++) {
+                tiers.push({ sequence: i + 1, units: 100, price: 0, unitPrice: 10 - i * 0.01, freeUnits: 0, multiplier: i === 499 ? 'infinity' : 2 });
+            }
+            comp.loadJSON({ currency: 'USD', mrr: 0, discount: 0, tiers });
+            comp.calculate(mod.PREVIEW_POINTS);
+            comp.calculate();
+            const steps = [];
+            for (let k = 0; k < 3; k++) {
+                comp.tiers[480 + k].unitPrice = 2.5;
+                comp.calculate(mod.PREVIEW_POINTS);
+                const preview = comp.getMetrics().series;
+                comp.calculate();
+                steps.push({ preview, settled: comp.getMetrics().series });
+            }
+            done(steps);
+        """)
+        for step in result:
+            with self.subTest(step=step):
+                self.assertEqual(step["preview"]["mode"], "suffix")
+                self.assertEqual(step["settled"]["mode"], "suffix")
+        self._reload()
+
+    def test_52_edits_keep_one_chart_and_retitle_only_on_currency(self):
+        """Input edits update the same Chart instance; axis titles are rewritten only for a new currency."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const comp = window.pricingComponent;
+            const root = comp.container;
+            const before = { keys: Object.keys(Chart.instances), id: comp.chart.id };
+            const titles = () => {
+                const { scales } = Chart.instances[before.keys[0]].options;
+                return [scales.yCumulative.title.text, scales.yRate.title.text];
+            };
+            const edit = (selector, value, type = 'input') => new Promise((resolve) => {
+                root.addEventListener('pricing-update', () => resolve(), { once: true });
+                const el = root.querySelector(selector);
+                el.value = value;
+                el.dispatchEvent(new Event(type, { bubbles: true }));
+            });
+            // A sentinel shows whether a redraw rewrote the titles.
+            const { scales } = comp.chart.options;
+            scales.yCumulative.title.text = 'kept';
+            scales.yRate.title.text = 'kept';
+            await edit('#mrr-input', '300');
+            await edit('#discount-input', '5');
+            await edit('.tier-table tbody tr input[type=number][data-field=unitPrice]', '8');
+            const unchanged = titles();
+            await edit('#currency-select', 'EUR', 'change');
+            const euro = titles();
+            await edit('#mrr-input', '0');
+            const after = { keys: Object.keys(Chart.instances), id: comp.chart.id };
+            done({ before, after, unchanged, euro, final: titles() });
+        """)
+        self.assertEqual(len(result["before"]["keys"]), 1)
+        self.assertEqual(result["after"], result["before"])
+        self.assertEqual(str(result["before"]["id"]), result["before"]["keys"][0])
+        self.assertEqual(result["unchanged"], ["kept", "kept"])
+        self.assertEqual(result["euro"], ["Cumulative Price (\u20ac)", "Unit Price (\u20ac)"])
+        self.assertEqual(result["final"], result["euro"])
+        self._reload()
+
+    def test_53_failed_worker_falls_back_to_main_thread(self):
+        """A worker that cannot load is dropped and the chart is priced on the main thread."""
+        self._reload()
+        result = self.driver.execute_async_script("""
+            const done = arguments[arguments.length - 1];
+            const container = document.createElement('div');
+            document.body.appendChild(container);
+            const mod = await import('./pricing-component.js');
+            const comp = new mod.PricingComponent(container, undefined, undefined, {
+                worker: true, workerUrl: './no-such-worker.js', deferChart: false,
+            });
+            for (let i = 0; i < 50 && !(comp.chart && comp._worker === null); i++) {
+                await new Promise((r) => setTimeout(r, 50));
+            }
+            const failed = { worker: comp._worker, inFlight: comp._inFlight };
+            const update = new Promise((resolve) => {
+                container.addEventListener('pricing-update', () => resolve(), { once: true });
+            });
+            comp.mrr = 300;
+            comp.updateChart();
+            await update;
+            const expected = comp.calculate();
+            const result = {
+                ...failed,
+                parsing: comp.chart.options.parsing,
+                drawn: comp.chart.data.datasets[0].data,
+                cumulative: expected.cumulative,
+            };
+            comp.destroy();
+            document.body.removeChild(container);
+            done(result);
+        """)
+        self.assertIsNone(result["worker"])
+        self.assertFalse(result["inFlight"])
+        self.assertTrue(result["parsing"])
+        self.assertEqual(result["drawn"], result["cumulative"])
+        self._reload()
 
 
 if __name__ == "__main__":
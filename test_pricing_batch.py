@@ -0,0 +1,183 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import pricing_batch
+import pricing_engine
+from test_pricing_engine import DEFAULT_CONFIG
+
+CONFIG = dict(DEFAULT_CONFIG, mrr=500, discount=10)
+
+
+def read_invoices(data):
+    lines = data.decode().splitlines()
+    return lines[0], [line.split(",") for line in lines[1:]]
+
+
+class PricingBatchTest(unittest.TestCase):
+
+    def run_invoice(self, text, fmt="csv", block_bytes=64):
+        out = io.BytesIO()
+        rows = pricing_batch.invoice(
+            CONFIG, io.BytesIO(text.encode()), out, fmt=fmt, workers=2, block_bytes=block_bytes
+        )
+        return rows, out.getvalue()
+
+    def test_01_csv_rows_priced_in_order(self):
+        """Many small blocks across two workers come back in input order."""
+        usage = list(range(0, 3000, 7))
+        text = "customer_id,units\n" + "".join(f"c{i},{u}\n" for i, u in enumerate(usage))
+        rows, data = self.run_invoice(text)
+
+        header, invoices = read_invoices(data)
+        self.assertEqual(header, "customer_id,units,total,unit_price")
+        self.assertEqual(rows, len(usage))
+        self.assertEqual([r[0] for r in invoices], [f"c{i}" for i in range(len(usage))])
+        expected = pricing_engine.quote(CONFIG, np.array(usage, dtype=float)).cumulative
+        np.testing.assert_allclose([float(r[2]) for r in invoices], expected, atol=0.005)
+
+    def test_02_effective_unit_price(self):
+        """Unit price is total / units and left empty for zero usage."""
+        rows, data = self.run_invoice("a,0\nb,100\nc,300\n")
+        _, invoices = read_invoices(data)
+        self.assertEqual(rows, 3)
+        self.assertEqual(invoices[0], ["a", "0", "450.00", ""])
+        self.assertEqual(invoices[1], ["b", "100", "810.00", "8.1000"])
+        self.assertEqual(invoices[2], ["c", "300", "2115.00", "7.0500"])
+
+    def test_03_headerless_csv_without_trailing_newline(self):
+        """The first row is kept when there is no header, as is an unterminated last row."""
+        rows, data = self.run_invoice("a,100\nb,300", block_bytes=4)
+        _, invoices = read_invoices(data)
+        self.assertEqual(rows, 2)
+        self.assertEqual([r[0] for r in invoices], ["a", "b"])
+
+    def test_04_jsonl_input(self):
+        """JSON lines with customer_id and units are priced like CSV rows."""
+        text = "".join(json.dumps({"customer_id": cid, "units": u}) + "\n" for cid, u in [(1, 100), (2, 300)])
+        rows, data = self.run_invoice(text, fmt="jsonl")
+        _, invoices = read_invoices(data)
+        self.assertEqual(rows, 2)
+        self.assertEqual(invoices[1], ["2", "300", "2115.00", "7.0500"])
+
+    def test_05_command_line(self):
+        """The CLI reads the exported config and writes the invoice file."""
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = os.path.join(tmp, "pricing-config.json")
+            usage_path = os.path.join(tmp, "usage.csv")
+            out_path = os.path.join(tmp, "invoices.csv")
+            with open(config_path, "w") as f:
+                json.dump(CONFIG, f)
+            with open(usage_path, "w") as f:
+                f.write("customer_id,units\nx,100\n")
+
+            code = pricing_batch.main([config_path, usage_path, "-o", out_path, "-j", "1"])
+
+            self.assertEqual(code, 0)
+            with open(out_path, "rb") as f:
+                _, invoices = read_invoices(f.read())
+            self.assertEqual(invoices, [["x", "100", "810.00", "8.1000"]])
+
+    def test_06_fixed_point_minor_units(self):
+        """--fixed writes exact totals with the currency's decimals, none for JPY."""
+        for currency, expected, floor in (("USD", "810.00", "450.00"), ("JPY", "810", "450")):
+            with self.subTest(currency=currency), tempfile.TemporaryDirectory() as tmp:
+                config_path = os.path.join(tmp, "pricing-config.json")
+                usage_path = os.path.join(tmp, "usage.csv")
+                out_path = os.path.join(tmp, "invoices.csv")
+                with open(config_path, "w") as f:
+                    json.dump(dict(CONFIG, currency=currency), f)
+                with open(usage_path, "w") as f:
+                    f.write("customer_id,units\nx,100\ny,0\n")
+
+                code = pricing_batch.main([config_path, usage_path, "-o", out_path, "-j", "1", "--fixed"])
+
+                self.assertEqual(code, 0)
+                with open(out_path, "rb") as f:
+                    _, invoices = read_invoices(f.read())
+                self.assertEqual(invoices, [["x", "100", expected, "8.1000"], ["y", "0", floor, ""]])
+
+    def test_07_ids_with_spaces_commas_and_quotes(self):
+        """Rows split on their last comma; quoted ids are unquoted and re-quoted on output."""
+        text = 'customer_id,units\nAcme Corp,100\n"Smith, Jones & Co",300\nplain,0\n'
+        rows, data = self.run_invoice(text, block_bytes=1 << 16)
+        self.assertEqual(rows, 3)
+        lines = data.decode().splitlines()[1:]
+        self.assertEqual(lines[0], "Acme Corp,100,810.00,8.1000")
+        self.assertEqual(lines[1], '"Smith, Jones & Co",300,2115.00,7.0500')
+        self.assertEqual(lines[2], "plain,0,450.00,")
+        ids, _, units = pricing_batch.parse_csv_block(b"a b,1\nx,y,2\n")
+        self.assertEqual((ids, units.tolist()), ([b"a b", b"x,y"], [1.0, 2.0]))
+        with self.assertRaisesRegex(ValueError, "malformed CSV block"):
+            pricing_batch.parse_csv_block(b"a,1\nno-units\n")
+
+    def test_08_jsonl_string_units_and_currency_decimals(self):
+        """JSON units may be numeric strings; JPY totals are written without decimals."""
+        ids, tokens, units = pricing_batch.parse_jsonl_block(b'{"customer_id": "a", "units": "12"}\n')
+        self.assertEqual((ids, tokens, units.tolist()), ([b"a"], [b"12"], [12.0]))
+
+        out = io.BytesIO()
+        pricing_batch.invoice(
+            dict(CONFIG, currency="JPY"), io.BytesIO(b"a,100\nb,0\n"), out, workers=1
+        )
+        _, invoices = read_invoices(out.getvalue())
+        self.assertEqual(invoices, [["a", "100", "810", "8.1000"], ["b", "0", "450", ""]])
+
+    def test_09_usage_summed_per_customer(self):
+        """Rows of one customer are summed across blocks before tier pricing; --per-row keeps them apart."""
+        text = "".join(f"{cid},{u}\n" for cid, u in [("a", 60), ("b", 10), ("a", 60), ("c", 0), ("b", 290)] * 20)
+        rows, data = self.run_invoice(text, block_bytes=16)
+        self.assertEqual(rows, 100)
+        _, invoices = read_invoices(data)
+        self.assertEqual([r[:2] for r in invoices], [["a", "2400"], ["b", "6000"], ["c", "0"]])
+        expected = pricing_engine.quote(CONFIG, [2400.0, 6000.0, 0.0]).cumulative
+        np.testing.assert_allclose([float(r[2]) for r in invoices], expected, atol=0.005)
+
+        out = io.BytesIO()
+        rows = pricing_batch.invoice(CONFIG, io.BytesIO(b"a,60\na,60\n"), out, workers=1, per_row=True)
+        _, invoices = read_invoices(out.getvalue())
+        self.assertEqual((rows, invoices), (2, [["a", "60", "450.00", "7.5000"]] * 2))
+
+    def test_10_bad_rows_fail_without_partial_output(self):
+        """A malformed row exits non-zero with a message and leaves no output file."""
+        cases = [
+            ("usage.csv", "a,100\nb,lots\n", []),
+            ("usage.csv", "a,100\nno-units\n", []),
+            ("usage.csv", "a,1.5\n", ["--fixed"]),
+            ("usage.jsonl", '{"customer_id": "a"}\n', []),
+            ("usage.jsonl", '{"customer_id": "a", "units": \n', []),
+        ]
+        for name, text, flags in cases:
+            with self.subTest(text=text, flags=flags), tempfile.TemporaryDirectory() as tmp:
+                config_path = os.path.join(tmp, "pricing-config.json")
+                usage_path = os.path.join(tmp, name)
+                out_path = os.path.join(tmp, "invoices.csv")
+                with open(config_path, "w") as f:
+                    json.dump(CONFIG, f)
+                with open(usage_path, "w") as f:
+                    f.write(text)
+
+                with mock.patch("sys.stderr", new_callable=io.StringIO) as stderr:
+                    code = pricing_batch.main([config_path, usage_path, "-o", out_path, "-j", "1", *flags])
+
+                self.assertEqual(code, 1)
+                self.assertIn("bad usage row", stderr.getvalue())
+                self.assertEqual(sorted(os.listdir(tmp)), sorted(["pricing-config.json", name]))
+
+    def test_11_quoted_newline_stays_in_one_block(self):
+        """A quoted id holding a line break is never split between blocks."""
+        text = 'x,1\n"two\nlines",100\n"say ""hi""",300\n'
+        for block_bytes in (1, 4, 9, 1 << 16):
+            with self.subTest(block_bytes=block_bytes):
+                rows, data = self.run_invoice(text, block_bytes=block_bytes)
+                self.assertEqual(rows, 3)
+                body = data.decode().split("\n", 1)[1]
+                self.assertEqual(body, 'x,1,450.00,450.0000\n"two\nlines",100,810.00,8.1000\n"say ""hi""",300,2115.00,7.0500\n')
+
+if __name__ == "__main__":
+    unittest.main()
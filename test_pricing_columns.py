@@ -0,0 +1,137 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import pricing_batch
+import pricing_columns
+import pricing_engine
+import pricing_sweep
+from test_pricing_engine import DEFAULT_CONFIG
+
+CONFIG = dict(DEFAULT_CONFIG, mrr=500, discount=10)
+
+
+def write(directory, name, text):
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(text)
+    return path
+
+
+class PricingColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        rng = np.random.default_rng(20)
+        self.usage = np.round(rng.lognormal(5, 1.5, 2_000))
+        self.usage[::97] = 0
+        self.ids = [f"cust-{i}" for i in range(len(self.usage))]
+        self.ids[5] = "a-much-longer-customer-id"
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def usage_csv(self, header=True):
+        rows = "".join(f"{c},{int(u)}\n" for c, u in zip(self.ids, self.usage))
+        return write(self.tmp.name, "usage.csv", ("customer_id,units\n" if header else "") + rows)
+
+    def test_01_convert_round_trip(self):
+        """CSV (with or without header) and JSON lines convert to the same columns."""
+        jsonl = write(
+            self.tmp.name, "usage.jsonl",
+            "".join(f'{{"customer_id": "{c}", "units": {int(u)}}}\n' for c, u in zip(self.ids, self.usage)),
+        )
+        for src in (self.usage_csv(), self.usage_csv(header=False), jsonl):
+            with self.subTest(src=src):
+                rows = pricing_columns.convert(src, self.path("usage.bin"), block_bytes=256)
+                self.assertEqual(rows, len(self.usage))
+                columns = pricing_columns.open_columns(self.path("usage.bin"))
+                self.assertIsInstance(columns["units"], np.memmap)
+                self.assertEqual(columns["customer_id"].dtype, np.dtype("S25"))
+                self.assertEqual([c.decode() for c in columns["customer_id"]], self.ids)
+                np.testing.assert_array_equal(columns["units"], self.usage)
+
+    def test_02_layout_and_bad_files(self):
+        """Columns are 64-byte aligned; empty files open; foreign files are rejected."""
+        columns = pricing_columns.create(self.path("out.bin"), 3, {"a": "<i4", "b": "<f8"})
+        columns["a"][:] = [1, 2, 3]
+        columns["b"][:] = [0.5, 1.5, 2.5]
+        for column in columns.values():
+            self.assertEqual(column.offset % pricing_columns.ALIGN, 0)
+            column.flush()
+        reopened = pricing_columns.open_columns(self.path("out.bin"))
+        np.testing.assert_array_equal(reopened["a"], [1, 2, 3])
+        np.testing.assert_array_equal(reopened["b"], [0.5, 1.5, 2.5])
+
+        pricing_columns.create(self.path("empty.bin"), 0, {"units": "<f8"})
+        self.assertEqual(len(pricing_columns.open_columns(self.path("empty.bin"))["units"]), 0)
+
+        csv = self.usage_csv()
+        self.assertFalse(pricing_columns.is_column_file(csv))
+        self.assertTrue(pricing_columns.is_column_file(self.path("out.bin")))
+        with self.assertRaisesRegex(ValueError, "bad magic"):
+            pricing_columns.open_columns(csv)
+        with self.assertRaisesRegex(ValueError, "too short"):
+            pricing_columns.open_columns(write(self.tmp.name, "short.bin", "PRC"))
+
+    def test_03_invoice_matches_text_path(self):
+        """Slices priced in place by two workers equal the CSV invoices."""
+        src = self.usage_csv()
+        pricing_columns.convert(src, self.path("usage.bin"))
+        rows = pricing_columns.invoice_columns(
+            CONFIG, self.path("usage.bin"), self.path("invoices.bin"), workers=2, slice_rows=300
+        )
+        self.assertEqual(rows, len(self.usage))
+        invoices = pricing_columns.open_columns(self.path("invoices.bin"))
+
+        out = io.BytesIO()
+        with open(src, "rb") as f:
+            pricing_batch.invoice(CONFIG, f, out, workers=1)
+        lines = [line.split(",") for line in out.getvalue().decode().splitlines()[1:]]
+        np.testing.assert_array_equal(invoices["total"], [float(r[2]) for r in lines])
+        zero = self.usage == 0
+        self.assertTrue(np.isnan(invoices["unit_price"][zero]).all())
+        np.testing.assert_allclose(
+            invoices["unit_price"][~zero], [float(r[3]) for r, z in zip(lines, zero) if not z], atol=5e-5
+        )
+
+    def test_04_sweep_reads_column_files(self):
+        """A usage column file is a valid sweep input."""
+        pricing_columns.convert(self.usage_csv(), self.path("usage.bin"))
+        usage = pricing_sweep.load_usage(self.path("usage.bin"))
+        np.testing.assert_array_equal(usage, self.usage)
+        result = pricing_sweep.sweep(CONFIG, usage, [pricing_sweep.parse_axis("mrr=500")], workers=1)
+        expected = pricing_engine.quote(CONFIG, self.usage).cumulative.sum()
+        self.assertAlmostEqual(result.revenue[0], expected, delta=1e-9 * expected)
+
+    def test_05_command_line(self):
+        """convert then invoice from the CLI produces the priced column file."""
+        config_path = write(self.tmp.name, "config.json", json.dumps(CONFIG))
+        with mock.patch("sys.stderr"):
+            self.assertEqual(pricing_columns.main(["convert", self.usage_csv(), self.path("usage.bin")]), 0)
+            self.assertEqual(
+                pricing_columns.main(["invoice", config_path, self.path("usage.bin"), self.path("inv.bin"), "-j", "1"]),
+                0,
+            )
+        totals = pricing_columns.open_columns(self.path("inv.bin"))["total"]
+        np.testing.assert_array_equal(totals, np.round(pricing_engine.quote(CONFIG, self.usage).cumulative, 2))
+
+    def test_06_fixed_point_invoice(self):
+        """Fixed-point invoicing writes exact int64 minor units."""
+        pricing_columns.convert(self.usage_csv(), self.path("usage.bin"))
+        config = dict(CONFIG, currency="KRW")
+        pricing_columns.invoice_columns(config, self.path("usage.bin"), self.path("inv.bin"), workers=1, fixed=True)
+        invoices = pricing_columns.open_columns(self.path("inv.bin"))
+        self.assertNotIn("total", invoices)
+        self.assertEqual(invoices["total_minor"].dtype, np.dtype("<i8"))
+        np.testing.assert_array_equal(invoices["total_minor"], pricing_engine.quote_minor(config, self.usage))
+
+
+if __name__ == "__main__":
+    unittest.main()
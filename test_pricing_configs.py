@@ -0,0 +1,115 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import pricing_configs
+import pricing_engine
+from test_pricing_engine import DEFAULT_CONFIG
+
+
+def write(directory, name, content):
+    path = os.path.join(directory, name)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content if isinstance(content, str) else json.dumps(content, indent=2))
+    return path
+
+
+class PricingConfigsTest(unittest.TestCase):
+
+    def assertInvalid(self, config, location, fragment):
+        with self.assertRaises(pricing_configs.ConfigError) as ctx:
+            pricing_configs.validate_config(config)
+        self.assertEqual(ctx.exception.location, location)
+        self.assertIn(fragment, ctx.exception.message)
+
+    def test_01_schema_errors_name_the_field(self):
+        """Each schema violation reports the path of the offending field."""
+        def edited(edit):
+            config = copy.deepcopy(DEFAULT_CONFIG)
+            edit(config)
+            return config
+
+        self.assertInvalid([], None, "must be an object")
+        self.assertInvalid(edited(lambda c: c.update(currency="usd")), "currency", "currency code")
+        self.assertInvalid(edited(lambda c: c.update(mrr=-5)), "mrr", "negative")
+        self.assertInvalid(edited(lambda c: c.update(discount=150)), "discount", "at most 100")
+        self.assertInvalid(edited(lambda c: c.update(tiers=[])), "tiers", "non-empty")
+        self.assertInvalid(edited(lambda c: c["tiers"][1].update(units="200")), "tiers[1].units", "finite number")
+        self.assertInvalid(edited(lambda c: c["tiers"][2].pop("unitPrice")), "tiers[2].unitPrice", "missing")
+        self.assertInvalid(edited(lambda c: c["tiers"][0].update(price=True)), "tiers[0].price", "finite number")
+        self.assertInvalid(edited(lambda c: c["tiers"][2].update(multiplier="inf")), "tiers[2].multiplier", "'infinity'")
+        self.assertInvalid(edited(lambda c: c["tiers"][2].update(sequence=1)), "tiers[2].sequence", "tiers[0]")
+        self.assertIs(pricing_configs.validate_config(DEFAULT_CONFIG), DEFAULT_CONFIG)
+
+    def test_02_json_syntax_error_line_and_column(self):
+        """A JSON syntax error is reported with its file, line and column."""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = write(tmp, "broken.json", '{\n  "tiers": [\n    {"units": 1,,}\n  ]\n}\n')
+            with self.assertRaises(pricing_configs.ConfigError) as ctx:
+                pricing_configs.load_config_file(path)
+        error = ctx.exception
+        self.assertEqual(error.path, path)
+        self.assertEqual(error.line, 3)
+        self.assertGreater(error.column, 1)
+        self.assertTrue(str(error).startswith(f"{path}:3:{error.column}: invalid JSON"))
+
+    def test_03_equivalent_files_share_a_key(self):
+        """Reordered tiers, int/float spellings and empty tiers collapse to one plan."""
+        variant = copy.deepcopy(DEFAULT_CONFIG)
+        variant["tiers"].reverse()
+        variant["tiers"][0]["units"] = 500.0
+        variant["tiers"].append(
+            {"sequence": 9, "units": 0, "price": 5, "unitPrice": 1, "freeUnits": 0, "multiplier": 1}
+        )
+        key, canonical = pricing_configs.parse_config(json.dumps(variant).encode())
+        self.assertEqual(key, pricing_engine.config_hash(DEFAULT_CONFIG))
+        self.assertEqual(canonical, pricing_engine.canonical_config(DEFAULT_CONFIG))
+        self.assertEqual([t["sequence"] for t in canonical["tiers"]], [1, 2, 3])
+
+    def test_04_directory_dedupe_and_errors(self):
+        """A parallel directory scan keeps one plan per key and lists invalid files."""
+        cheaper = copy.deepcopy(DEFAULT_CONFIG)
+        cheaper["tiers"][2]["unitPrice"] = 2
+        with tempfile.TemporaryDirectory() as tmp:
+            expected = []
+            for i in range(40):
+                config = cheaper if i % 4 == 0 else DEFAULT_CONFIG
+                expected.append(write(tmp, f"plans/{i // 10}/plan-{i:02d}.json", config))
+            bad = write(tmp, "plans/bad.json", dict(DEFAULT_CONFIG, discount="10"))
+            write(tmp, "plans/notes.txt", "not a config")
+
+            with mock.patch.object(pricing_configs, "CHUNK_FILES", 8):
+                result = pricing_configs.load_directory(os.path.join(tmp, "plans"), workers=2)
+
+        default_key = pricing_engine.config_hash(DEFAULT_CONFIG)
+        cheaper_key = pricing_engine.config_hash(cheaper)
+        self.assertEqual(list(result.plans), [cheaper_key, default_key])
+        self.assertEqual(len(result.files[default_key]), 30)
+        self.assertEqual(result.files[cheaper_key], expected[0::4])
+        self.assertEqual(set(result.duplicates), {default_key, cheaper_key})
+        self.assertEqual([(e.path, e.location) for e in result.errors], [(bad, "discount")])
+
+    def test_05_command_line(self):
+        """The CLI writes the distinct plans and fails when a file is invalid."""
+        with tempfile.TemporaryDirectory() as tmp:
+            good = write(tmp, "a.json", DEFAULT_CONFIG)
+            write(tmp, "b.json", DEFAULT_CONFIG)
+            out_path = os.path.join(tmp, "plans.out")
+
+            code = pricing_configs.main([tmp, "-o", out_path, "-j", "1"])
+            self.assertEqual(code, 0)
+            with open(out_path) as f:
+                plans = json.load(f)
+            self.assertEqual(plans, {pricing_engine.config_hash(DEFAULT_CONFIG): pricing_engine.canonical_config(DEFAULT_CONFIG)})
+
+            write(tmp, "c.json", "[]")
+            with mock.patch("sys.stderr"):
+                self.assertEqual(pricing_configs.main([tmp, good, "-j", "1", "--errors"]), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,375 @@
+import copy
+import decimal
+import math
+import pickle
+import random
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import pricing_engine
+
+DEFAULT_CONFIG = {
+    "currency": "USD",
+    "mrr": 0,
+    "discount": 0,
+    "tiers": [
+        {"sequence": 1, "units": 100, "price": 0, "unitPrice": 10, "freeUnits": 10, "multiplier": 1},
+        {"sequence": 2, "units": 200, "price": 50, "unitPrice": 7, "freeUnits": 0, "multiplier": 2},
+        {"sequence": 3, "units": 500, "price": 0, "unitPrice": 3, "freeUnits": 0, "multiplier": "infinity"},
+    ],
+}
+
+
+def reference_cost(tiers, n):
+    """Walk every tier and repetition from unit 0, like the original calculate()."""
+    cost = 0.0
+    rate = 0.0
+    remaining = n
+    for tier in sorted(tiers, key=lambda t: t["sequence"]):
+        if remaining <= 0:
+            break
+        if tier["units"] <= 0:
+            continue
+        reps = pricing_engine.parse_multiplier(tier["multiplier"])
+        rep = 0
+        while rep < max(1, reps) and remaining > 0:
+            consumed = min(remaining, tier["units"])
+            cost += tier["price"] + max(0, consumed - tier["freeUnits"]) * tier["unitPrice"]
+            if remaining <= tier["units"]:
+                rate = 0 if consumed <= tier["freeUnits"] else tier["unitPrice"]
+            remaining -= consumed
+            rep += 1
+    return cost, rate
+
+
+def reference_inverse(compiled, target, strict):
+    """Bisect the monotone cost curve for the last usage below/at ``target``."""
+    def within(n):
+        cost = pricing_engine.usage_cost(compiled, [n])[0][0]
+        return cost < target if strict else cost <= target
+
+    lo, hi = 0.0, 1e9
+    if within(hi):
+        return None if strict else math.inf
+    for _ in range(200):
+        mid = (lo + hi) / 2
+        lo, hi = (mid, hi) if within(mid) else (lo, mid)
+    return lo
+
+
+def reference_minor(config, n):
+    """Walk the tiers like reference_cost() in Decimal, rounding once at the end."""
+    decimals = pricing_engine.currency_decimals(config.get("currency", "USD"))
+    step = decimal.Decimal(1).scaleb(-(decimals + pricing_engine.SUBUNIT_DIGITS))
+
+    def amount(x, quantum=step):
+        return decimal.Decimal(repr(float(x))).quantize(quantum, decimal.ROUND_HALF_UP)
+
+    cost = decimal.Decimal(0)
+    remaining = n
+    for tier in sorted(config["tiers"], key=lambda t: t["sequence"]):
+        if tier["units"] <= 0:
+            continue
+        reps = pricing_engine.parse_multiplier(tier["multiplier"])
+        rep = 0
+        while rep < max(1, reps) and remaining > 0:
+            consumed = min(remaining, tier["units"])
+            cost += amount(tier["price"]) + max(0, consumed - tier["freeUnits"]) * amount(tier["unitPrice"])
+            remaining -= consumed
+            rep += 1
+    total = max(cost, amount(config.get("mrr", 0)))
+    total *= 1 - amount(config.get("discount", 0), decimal.Decimal("0.0001")) / 100
+    return int(total.scaleb(decimals).to_integral_value(decimal.ROUND_HALF_UP))
+
+
+class PricingEngineTest(unittest.TestCase):
+
+    def test_01_default_config_values(self):
+        """Known points on the default three-tier curve."""
+        q = pricing_engine.quote(DEFAULT_CONFIG, [0, 10, 100, 101, 300, 3000])
+        np.testing.assert_allclose(q.cumulative, [0, 0, 900, 957, 2350, 11300])
+        np.testing.assert_allclose(q.marginal, [0, 0, 10, 7, 7, 3])
+        self.assertTrue(math.isnan(q.average[0]))
+        self.assertAlmostEqual(q.average[2], 9.0)
+
+    def test_02_mrr_floor_and_discount(self):
+        """MRR floors the usage cost, then the discount applies to both."""
+        config = dict(DEFAULT_CONFIG, mrr=1000, discount=10)
+        q = pricing_engine.quote(config, [50, 100, 300])
+        np.testing.assert_allclose(q.cumulative, [900, 900, 2115])
+        np.testing.assert_allclose(q.marginal, [0, 0, 6.3])
+        self.assertTrue(math.isnan(q.average[0]))
+        self.assertAlmostEqual(q.average[2], 7.05)
+
+    def test_03_finite_plan_saturates(self):
+        """Usage past a finite plan's capacity costs the full plan, marginal 0."""
+        config = {"tiers": [{"sequence": 1, "units": 100, "price": 10, "unitPrice": 2, "freeUnits": 0, "multiplier": 3}]}
+        q = pricing_engine.quote(config, [300, 301, 10_000])
+        np.testing.assert_allclose(q.cumulative, [630, 630, 630])
+        np.testing.assert_allclose(q.marginal, [2, 0, 0])
+
+    def test_04_free_units_larger_than_units(self):
+        """A tier whose free units exceed its size only charges the flat price."""
+        config = {"tiers": [{"sequence": 1, "units": 10, "price": 5, "unitPrice": 3, "freeUnits": 50, "multiplier": "infinity"}]}
+        q = pricing_engine.quote(config, [1, 10, 11, 25])
+        np.testing.assert_allclose(q.cumulative, [5, 5, 10, 15])
+        np.testing.assert_allclose(q.marginal, [0, 0, 0, 0])
+
+    def test_05_no_priced_tiers(self):
+        """A config whose tiers have no units prices everything at the MRR floor."""
+        config = {"mrr": 40, "discount": 50, "tiers": [{"sequence": 1, "units": 0, "price": 1, "unitPrice": 1, "freeUnits": 0, "multiplier": 1}]}
+        q = pricing_engine.quote(config, [0, 100])
+        np.testing.assert_allclose(q.cumulative, [20, 20])
+
+    def test_06_matches_reference_walk(self):
+        """Random configs agree with a per-repetition reference walk."""
+        rng = random.Random(7)
+        for _ in range(200):
+            tiers = [
+                {
+                    "sequence": rng.randint(0, 9),
+                    "units": rng.choice([0, rng.randint(1, 300)]),
+                    "price": rng.choice([0, rng.randint(0, 100)]),
+                    "unitPrice": rng.randint(0, 20) / 2,
+                    "freeUnits": rng.choice([0, rng.randint(0, 400)]),
+                    "multiplier": rng.choice([1, 2, 3, 4, "infinity"]),
+                }
+                for _ in range(rng.randint(1, 5))
+            ]
+            usage = np.array([rng.uniform(0, 3000) for _ in range(50)] + [0, 1, 100])
+            cost, rate = pricing_engine.usage_cost(pricing_engine.compile_tiers(tiers), usage)
+            for n, c, r in zip(usage, cost, rate):
+                ref_cost, ref_rate = reference_cost(tiers, n)
+                self.assertAlmostEqual(c, ref_cost, places=6, msg=f"{tiers} @ {n}")
+                self.assertEqual(r, ref_rate, f"{tiers} @ {n}")
+
+    def test_07_preserves_input_shape(self):
+        """Quotes keep the shape of the usage array across block boundaries."""
+        usage = np.arange(2 * pricing_engine.BLOCK_SIZE + 7, dtype=np.float64).reshape(-1, 1)
+        q = pricing_engine.quote(DEFAULT_CONFIG, usage)
+        self.assertEqual(q.cumulative.shape, usage.shape)
+        expected = pricing_engine.quote(DEFAULT_CONFIG, usage.ravel()).cumulative
+        np.testing.assert_array_equal(q.cumulative.ravel(), expected)
+
+    def test_08_equivalent_configs_share_a_plan(self):
+        """Tier order, sequence numbers, zero-unit tiers and int/float don't change the hash."""
+        reordered = dict(DEFAULT_CONFIG, tiers=[
+            dict(DEFAULT_CONFIG["tiers"][2], sequence=30),
+            {"sequence": 5, "units": 0, "price": 9, "unitPrice": 9, "freeUnits": 0, "multiplier": 1},
+            dict(DEFAULT_CONFIG["tiers"][0], sequence=10, unitPrice=10.0),
+            dict(DEFAULT_CONFIG["tiers"][1], sequence=20),
+        ])
+        a = pricing_engine.PricingPlan(DEFAULT_CONFIG)
+        b = pricing_engine.PricingPlan(reordered)
+        self.assertEqual(a, b)
+        self.assertEqual(hash(a), hash(b))
+        self.assertEqual(a.key, pricing_engine.config_hash(reordered))
+        self.assertNotEqual(a, pricing_engine.PricingPlan(dict(DEFAULT_CONFIG, mrr=1)))
+
+    def test_09_plan_is_immutable(self):
+        """Plans reject attribute writes and their arrays are read-only."""
+        plan = pricing_engine.PricingPlan(DEFAULT_CONFIG)
+        with self.assertRaises(AttributeError):
+            plan.mrr = 10
+        plan.quote_minor([100])
+        for tiers in (plan.compiled, plan._fixed):
+            for name, value in tiers._asdict().items():
+                if isinstance(value, np.ndarray):
+                    with self.assertRaises(ValueError, msg=name):
+                        value[0] = 1
+        np.testing.assert_array_equal(
+            plan.quote([100, 300]).cumulative, pricing_engine.quote(DEFAULT_CONFIG, [100, 300]).cumulative
+        )
+
+    def test_10_cache_compiles_once_and_evicts(self):
+        """Repeated configs reuse the compiled plan; quotes are memoised per usage."""
+        cache = pricing_engine.PlanCache(max_plans=2, max_quotes=4)
+        configs = [dict(DEFAULT_CONFIG, mrr=m) for m in (0, 100)]
+        for _ in range(50):
+            for config in configs:
+                cache.plan(config)
+        self.assertEqual(cache.compiles, 2)
+
+        q = cache.quote(DEFAULT_CONFIG, 300)
+        self.assertEqual(q.cumulative, 2350)
+        self.assertIs(cache.quote(DEFAULT_CONFIG, 300.0), q)
+        self.assertTrue(math.isnan(cache.quote(DEFAULT_CONFIG, 0).average))
+
+        cache.plan(dict(DEFAULT_CONFIG, mrr=200))
+        cache.plan(dict(DEFAULT_CONFIG, mrr=300))
+        cache.plan(DEFAULT_CONFIG)
+        self.assertEqual(cache.compiles, 5)
+
+    def test_11_inverse_queries_default_config(self):
+        """Budgets land on flat-price jumps, free units and linear stretches exactly."""
+        compiled = pricing_engine.compile_tiers(DEFAULT_CONFIG["tiers"])
+        self.assertEqual(pricing_engine.units_for_cost(compiled, 0), 10)
+        self.assertEqual(pricing_engine.units_for_cost(compiled, 500), 60)
+        self.assertEqual(pricing_engine.units_for_cost(compiled, 900), 100)
+        self.assertAlmostEqual(pricing_engine.units_for_cost(compiled, 1000), 100 + 50 / 7)
+        self.assertEqual(pricing_engine.break_even_usage(compiled, 920), 100)
+        self.assertEqual(pricing_engine.break_even_usage(compiled, 0), 0)
+
+        plan = pricing_engine.PricingPlan(dict(DEFAULT_CONFIG, mrr=1000, discount=10))
+        self.assertIsNone(plan.units_for_budget(899))
+        self.assertAlmostEqual(plan.units_for_budget(900), 100 + 50 / 7)
+        self.assertAlmostEqual(plan.break_even(), 100 + 50 / 7)
+
+        finite = pricing_engine.compile_tiers(DEFAULT_CONFIG["tiers"][:2])
+        self.assertEqual(pricing_engine.units_for_cost(finite, 3800), math.inf)
+        self.assertEqual(pricing_engine.break_even_usage(finite, 3800), 500)
+        self.assertIsNone(pricing_engine.break_even_usage(finite, 3801))
+
+    def test_12_inverse_matches_bisection(self):
+        """Random configs and targets agree with bisection on the cost curve."""
+        rng = random.Random(11)
+        for _ in range(100):
+            tiers = [
+                {
+                    "sequence": rng.randint(0, 9),
+                    "units": rng.choice([0, rng.randint(1, 300)]),
+                    "price": rng.choice([0, rng.randint(0, 100)]),
+                    "unitPrice": rng.choice([0, rng.randint(0, 20) / 2]),
+                    "freeUnits": rng.choice([0, rng.randint(0, 400)]),
+                    "multiplier": rng.choice([1, 2, 3, 4, "infinity"]),
+                }
+                for _ in range(rng.randint(1, 5))
+            ]
+            compiled = pricing_engine.compile_tiers(tiers)
+            for target in [rng.uniform(0, 5000), rng.randint(0, 500) * 50, 0]:
+                for strict, solve in ((False, pricing_engine.units_for_cost), (True, pricing_engine.break_even_usage)):
+                    got = solve(compiled, target)
+                    expected = reference_inverse(compiled, target, strict) if target > 0 or not strict else 0
+                    msg = f"{tiers} {'break-even' if strict else 'budget'} {target}"
+                    if expected is None or math.isinf(expected):
+                        self.assertEqual(got, expected, msg)
+                    else:
+                        self.assertAlmostEqual(got, expected, delta=1e-6 * max(1, expected), msg=msg)
+
+    def test_13_cost_integral_matches_dense_sum(self):
+        """The closed-form cost integral agrees with a fine midpoint sum."""
+        rng = random.Random(13)
+        for _ in range(60):
+            tiers = [
+                {
+                    "sequence": i,
+                    "units": rng.choice([0, 1, rng.randint(1, 80)]),
+                    "price": rng.choice([0, rng.randint(0, 50)]),
+                    "unitPrice": rng.choice([0, rng.randint(0, 20) / 2]),
+                    "freeUnits": rng.choice([0, rng.randint(0, 100)]),
+                    "multiplier": rng.choice([1, 2, 3, "infinity"]),
+                }
+                for i in range(rng.randint(1, 5))
+            ]
+            compiled = pricing_engine.compile_tiers(tiers)
+            x = rng.uniform(0, 1.5 * max(compiled.capacity, 1) if math.isfinite(compiled.capacity) else 600)
+            step = x / 200_000
+            midpoints = np.arange(200_000) * step + step / 2
+            expected = pricing_engine.usage_cost(compiled, midpoints)[0].sum() * step
+            got = pricing_engine.cost_integral(compiled, [x])[0]
+            self.assertAlmostEqual(got, expected, delta=1e-3 * max(1, expected), msg=f"{tiers} {x}")
+
+    def test_14_histogram_projection(self):
+        """Buckets are priced with the MRR floor, discount and break-even split."""
+        plan = pricing_engine.PricingPlan(dict(DEFAULT_CONFIG, mrr=500, discount=10))
+        p = plan.project([0, 10, 100], [10, 90])
+        # [0, 10] sits on the floor; [10, 100] is 10 * (x - 10), floored below 60.
+        np.testing.assert_allclose(p.revenue, [4500, 47700])
+        np.testing.assert_allclose(p.on_floor, [10, 50])
+        self.assertEqual(p.customers, 100)
+        self.assertAlmostEqual(p.total, 52200)
+        self.assertAlmostEqual(p.floor_share, 0.6)
+        self.assertAlmostEqual(p.average_price, 52200 / 5000)
+
+        point = pricing_engine.project_revenue(DEFAULT_CONFIG, [300, 300], [4])
+        self.assertEqual(point.total, 4 * 2350)
+        self.assertEqual(point.floor_share, 0)
+        with self.assertRaises(ValueError):
+            pricing_engine.project_revenue(DEFAULT_CONFIG, [0, 10, 5], [1, 1])
+        with self.assertRaises(ValueError):
+            pricing_engine.project_revenue(DEFAULT_CONFIG, [0, 10], [1, 1])
+
+    def test_15_sample_projection_matches_exact_quotes(self):
+        """Bucketed raw samples land within a fraction of a percent of pricing each one."""
+        config = dict(DEFAULT_CONFIG, mrr=500, discount=10)
+        rng = np.random.default_rng(15)
+        usage = np.concatenate([np.zeros(5_000), np.round(rng.lognormal(5, 1.5, 45_000))])
+        p = pricing_engine.project_usage(config, usage, bins=50)
+        exact = pricing_engine.quote(config, usage).cumulative
+        raw = pricing_engine.usage_cost(pricing_engine.compile_tiers(config["tiers"]), usage)[0]
+
+        self.assertEqual(p.customers, len(usage))
+        self.assertAlmostEqual(p.total / exact.sum(), 1, delta=1e-3)
+        self.assertAlmostEqual(p.floor_share, (raw < 500).mean(), delta=0.01)
+        self.assertAlmostEqual(p.average_price, exact.sum() / usage.sum(), delta=1e-3 * p.average_price)
+
+    def test_16_fixed_point_matches_decimal(self):
+        """Integer minor-unit totals equal a Decimal walk, with JPY/KRW in whole units."""
+        rng = random.Random(16)
+        for case in range(150):
+            tiers = [
+                {
+                    "sequence": rng.randint(1, 6),
+                    "units": rng.choice([0, 1, 3, 10, 100, 250]),
+                    "price": round(rng.uniform(0, 50), rng.choice([0, 2, 3])),
+                    "unitPrice": rng.choice([0, 0.0015, 0.1, 0.07, 1.25, 3]),
+                    "freeUnits": rng.choice([0, 2, 5, 300]),
+                    "multiplier": rng.choice([1, 2, 3.5, "infinity"]),
+                }
+                for _ in range(rng.randint(1, 5))
+            ]
+            config = {
+                "currency": rng.choice(["USD", "JPY", "KRW", "EUR"]),
+                "mrr": rng.choice([0, 10, 99.99]),
+                "discount": rng.choice([0, 10, 12.5, 33.3333]),
+                "tiers": tiers,
+            }
+            usage = [rng.randint(0, 3000) for _ in range(20)]
+            with self.subTest(case=case):
+                totals = pricing_engine.quote_minor(config, usage)
+                self.assertEqual(totals.dtype, np.int64)
+                self.assertEqual(totals.tolist(), [reference_minor(config, n) for n in usage])
+
+        config = dict(DEFAULT_CONFIG, currency="JPY", mrr=500, discount=12.5)
+        self.assertEqual(pricing_engine.quote_minor(config, [0, 250]).tolist(), [438, 1750])
+        self.assertEqual(pricing_engine.format_minor([438, 1750], 0), ["438", "1750"])
+        self.assertEqual(pricing_engine.format_minor([5, 123456], 2), ["0.05", "1234.56"])
+
+    def test_17_fixed_point_rejects_inexact_inputs(self):
+        """Fractional usage or tier sizes and int64 overflow are errors, not silent rounding."""
+        with self.assertRaisesRegex(ValueError, "whole, finite units"):
+            pricing_engine.quote_minor(DEFAULT_CONFIG, [10.5])
+        fractional = dict(DEFAULT_CONFIG, tiers=[dict(DEFAULT_CONFIG["tiers"][0], units=2.5)])
+        self.assertEqual(len(pricing_engine.quote(fractional, [1]).cumulative), 1)
+        with self.assertRaisesRegex(ValueError, "whole tier units"):
+            pricing_engine.quote_minor(fractional, [1])
+        huge = dict(DEFAULT_CONFIG, tiers=[dict(DEFAULT_CONFIG["tiers"][2], unitPrice=1e6)])
+        self.assertGreater(pricing_engine.quote_minor(huge, [10**6])[0], 0)
+        with self.assertRaises(OverflowError):
+            pricing_engine.quote_minor(huge, [10**8])
+
+    def test_18_plan_pickles_without_recompiling(self):
+        """pickle and copy keep a plan equal, read-only and compiled."""
+        plan = pricing_engine.PricingPlan(dict(DEFAULT_CONFIG, mrr=300, discount=5))
+        plan.quote_minor([100])
+        with mock.patch.object(pricing_engine, "compile_tiers") as compile_tiers, \
+                mock.patch.object(pricing_engine, "compile_fixed") as compile_fixed:
+            copies = [pickle.loads(pickle.dumps(plan)), copy.copy(plan), copy.deepcopy(plan)]
+            for other in copies:
+                other.quote_minor([300])
+        compile_tiers.assert_not_called()
+        compile_fixed.assert_not_called()
+        for other in copies:
+            self.assertEqual(other, plan)
+            self.assertEqual(hash(other), hash(plan))
+            self.assertEqual((other.key, other.currency, other.mrr, other.discount), (plan.key, plan.currency, plan.mrr, plan.discount))
+            self.assertFalse(other.compiled.starts.flags.writeable)
+            with self.assertRaises(AttributeError):
+                other.mrr = 10
+            np.testing.assert_array_equal(other.quote([0, 100, 300]).cumulative, plan.quote([0, 100, 300]).cumulative)
+            np.testing.assert_array_equal(other.quote_minor([0, 100, 300]), plan.quote_minor([0, 100, 300]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,143 @@
+import json
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+
+import pricing_engine
+import pricing_metering
+from test_pricing_engine import DEFAULT_CONFIG
+
+CONFIG = dict(DEFAULT_CONFIG, mrr=500, discount=10)
+
+
+class PricingMeteringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tmp.name, name)
+
+    def assertMatchesQuote(self, reading, config, usage):
+        expected = pricing_engine.quote(config, usage)
+        np.testing.assert_allclose(reading.usage, usage, rtol=1e-12)
+        np.testing.assert_allclose(reading.total, expected.cumulative, rtol=1e-9)
+        np.testing.assert_array_equal(reading.marginal, expected.marginal)
+
+    def test_01_increments_match_quote(self):
+        """Random batches of small and large increments agree with pricing the totals."""
+        rng = np.random.default_rng(24)
+        meter = pricing_metering.Meter(CONFIG)
+        ids = [f"cust-{i}" for i in range(300)]
+        totals = dict.fromkeys(ids, 0.0)
+        for _ in range(50):
+            batch = rng.choice(ids, 400).tolist()
+            units = np.where(rng.random(400) < 0.9, rng.integers(0, 5, 400), rng.integers(0, 400, 400)).astype(float)
+            reading = meter.record(batch, units)
+            for c, u in zip(batch, units):
+                totals[c] += u
+            self.assertEqual(sorted(reading.customer_ids), sorted(set(batch)))
+            self.assertMatchesQuote(reading, CONFIG, [totals[c] for c in reading.customer_ids])
+        self.assertEqual(len(meter), len(ids))
+        everyone = meter.reading()
+        self.assertMatchesQuote(everyone, CONFIG, [totals[c] for c in everyone.customer_ids])
+
+    def test_02_boundaries_and_limited_plans(self):
+        """Exact repetition/tier boundaries, free units and usage past a capped plan."""
+        capped = {"tiers": [
+            {"sequence": 1, "units": 10, "price": 5, "unitPrice": 1, "freeUnits": 4, "multiplier": 3},
+            {"sequence": 2, "units": 0, "price": 99, "unitPrice": 9, "freeUnits": 0, "multiplier": 1},
+            {"sequence": 3, "units": 20, "price": 0, "unitPrice": 2, "freeUnits": 0, "multiplier": 1},
+        ]}
+        meter = pricing_metering.Meter(capped)
+        usage = 0.0
+        for step in [2, 2, 6, 10, 0, 1, 9, 20, 5, 100]:
+            usage += step
+            reading = meter.record(["a"], [step])
+            self.assertMatchesQuote(reading, capped, [usage])
+        self.assertEqual(reading.total[0], pricing_engine.compile_tiers(capped["tiers"]).total_cost)
+
+        # Exactly at the end of the first tier, the last unit was still priced at its rate.
+        boundary = pricing_metering.Meter(CONFIG).record(["a"], [100])
+        self.assertAlmostEqual(boundary.marginal[0], 10 * 0.9)
+
+        empty = pricing_metering.Meter({"mrr": 20, "tiers": []})
+        self.assertEqual(empty.record(["a"], [5]).total.tolist(), [20.0])
+
+    def test_03_validation(self):
+        """Bad increments are rejected before any cursor moves."""
+        meter = pricing_metering.Meter(CONFIG)
+        meter.record(["a"], [150])
+        for units in ([-1], [np.nan], [np.inf]):
+            with self.assertRaisesRegex(ValueError, "finite and non-negative"):
+                meter.record(["a"], units)
+        with self.assertRaisesRegex(ValueError, "one units value"):
+            meter.record(["a", "b"], [1])
+        self.assertEqual(meter.reading(["a"]).usage.tolist(), [150.0])
+        with self.assertRaises(KeyError):
+            meter.reading(["nobody"])
+
+    def test_04_snapshot_restore(self):
+        """A restored meter carries on exactly like the original; other plans are refused."""
+        rng = np.random.default_rng(4)
+        ids = [f"customer-{i}" for i in range(3000)] + ["über-kunde"]
+        meter = pricing_metering.Meter(CONFIG)
+        meter.record(ids, rng.integers(1, 900, len(ids)))
+        meter.snapshot(self.path("meter.bin"))
+        header = pricing_metering.HEADER.size
+        width = max(len(c.encode()) for c in ids)
+        self.assertEqual(
+            os.path.getsize(self.path("meter.bin")),
+            header + len(ids) * (width + pricing_metering.CURSOR.itemsize),
+        )
+
+        restored = pricing_metering.Meter.restore(self.path("meter.bin"), CONFIG)
+        self.assertEqual(restored.reading().customer_ids, ids)
+        more = rng.integers(0, 300, len(ids))
+        a, b = meter.record(ids, more), restored.record(ids, more)
+        np.testing.assert_array_equal(a.total, b.total)
+        np.testing.assert_array_equal(a.marginal, b.marginal)
+        restored.record(["new"], [1])
+        self.assertEqual(len(restored), len(ids) + 1)
+
+        with self.assertRaisesRegex(ValueError, "snapshot was taken for plan"):
+            pricing_metering.Meter.restore(self.path("meter.bin"), dict(CONFIG, mrr=0))
+        with open(self.path("junk.bin"), "wb") as f:
+            f.write(b"x" * 100)
+        with self.assertRaisesRegex(ValueError, "bad magic"):
+            pricing_metering.Meter.restore(self.path("junk.bin"), CONFIG)
+
+        pricing_metering.Meter(CONFIG).snapshot(self.path("empty.bin"))
+        self.assertEqual(len(pricing_metering.Meter.restore(self.path("empty.bin"), CONFIG)), 0)
+
+    def test_05_command_line(self):
+        """Replaying an event log in two runs through a snapshot gives the full totals."""
+        config_path = self.path("config.json")
+        with open(config_path, "w") as f:
+            json.dump(CONFIG, f)
+        for name, rows in (("first.csv", "a,120\nb,3\na,5\n"), ("second.csv", "b,400\nc,1\n")):
+            with open(self.path(name), "w") as f:
+                f.write("customer_id,units\n" + rows)
+        snapshot = self.path("meter.bin")
+        with mock.patch("sys.stderr"):
+            for name in ("first.csv", "second.csv"):
+                code = pricing_metering.main([
+                    config_path, self.path(name), "--restore", snapshot, "--snapshot", snapshot,
+                    "-o", self.path("readings.csv"),
+                ])
+                self.assertEqual(code, 0)
+        with open(self.path("readings.csv")) as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines[0], "customer_id,usage,total,marginal")
+        totals = np.round(pricing_engine.quote(CONFIG, [125, 403, 1]).cumulative, 2)
+        self.assertEqual([line.split(",")[:3] for line in lines[1:]], [
+            ["a", "125", f"{totals[0]:.2f}"], ["b", "403", f"{totals[1]:.2f}"], ["c", "1", f"{totals[2]:.2f}"],
+        ])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,179 @@
+import http.client
+import json
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+import pricing_server
+from test_pricing_engine import DEFAULT_CONFIG
+
+
+class PricingServerTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = pricing_server.QuoteServer(("localhost", 0))
+        cls.port = cls.server.server_port
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.conn = http.client.HTTPConnection("localhost", self.port, timeout=10)
+
+    def tearDown(self):
+        self.conn.close()
+
+    def request(self, method, path, body=None, conn=None):
+        conn = conn or self.conn
+        data = None if body is None else json.dumps(body)
+        conn.request(method, path, body=data, headers={"Content-Type": "application/json"})
+        resp = conn.getresponse()
+        return resp.status, resp.read()
+
+    def post(self, path, body, conn=None):
+        status, data = self.request("POST", path, body, conn)
+        return status, json.loads(data)
+
+    def test_01_static_page(self):
+        """The demo page and component are served like http.server does."""
+        status, data = self.request("GET", "/index.html")
+        self.assertEqual(status, 200)
+        self.assertIn(b"pricing-component.js", data)
+
+    def test_02_single_quote(self):
+        """/quote returns cent-rounded values and null average under the floor."""
+        status, body = self.post("/quote", {"config": DEFAULT_CONFIG, "units": 300})
+        self.assertEqual(status, 200)
+        self.assertEqual((body["cumulative"], body["average"], body["marginal"]), (2350, 7.83, 7))
+
+        config = dict(DEFAULT_CONFIG, mrr=1000)
+        status, body = self.post("/quote", {"config": config, "units": 50})
+        self.assertEqual((body["cumulative"], body["average"], body["marginal"]), (1000, None, 0))
+
+    def test_03_batch_quote(self):
+        """/quote/batch prices an array against one config."""
+        status, body = self.post("/quote/batch", {"config": DEFAULT_CONFIG, "units": [0, 10, 100, 101, 300, 3000]})
+        self.assertEqual(status, 200)
+        self.assertEqual(body["cumulative"], [0, 0, 900, 957, 2350, 11300])
+        self.assertEqual(body["marginal"], [0, 0, 10, 7, 7, 3])
+        self.assertIsNone(body["average"][0])
+        _, single = self.post("/quote", {"config": DEFAULT_CONFIG, "units": 1})
+        self.assertEqual(body["plan"], single["plan"])
+
+    def test_04_errors(self):
+        """Malformed requests get a JSON 400 and the connection stays usable."""
+        status, body = self.post("/quote", {"config": DEFAULT_CONFIG})
+        self.assertEqual(status, 400)
+        self.assertIn("units", body["error"])
+        status, body = self.post("/quote/batch", {"config": DEFAULT_CONFIG, "units": ["x"]})
+        self.assertEqual(status, 400)
+        status, body = self.post("/quote", {"config": {"mrr": 1}, "units": 1})
+        self.assertEqual(status, 400)
+        status, _ = self.post("/quote", {"config": DEFAULT_CONFIG, "units": 100})
+        self.assertEqual(status, 200)
+
+    def test_05_keep_alive(self):
+        """Many requests reuse one connection."""
+        for units in range(20):
+            status, _ = self.post("/quote", {"config": DEFAULT_CONFIG, "units": units})
+            self.assertEqual(status, 200)
+        self.assertEqual(self.conn.sock.getpeername()[1], self.port)
+
+    def test_06_concurrent_clients_and_status(self):
+        """Parallel clients are all answered and show up in /status."""
+        def client(i):
+            conn = http.client.HTTPConnection("localhost", self.port, timeout=10)
+            try:
+                return [self.post("/quote", {"config": DEFAULT_CONFIG, "units": i * 10 + j}, conn)[1]["cumulative"]
+                        for j in range(10)]
+            finally:
+                conn.close()
+
+        with ThreadPoolExecutor(8) as pool:
+            results = list(pool.map(client, range(16)))
+        self.assertEqual(results[10][0], 900)
+
+        status, data = self.request("GET", "/status")
+        stats = json.loads(data)
+        self.assertEqual(status, 200)
+        self.assertGreaterEqual(stats["requests"], 160)
+        self.assertGreater(stats["throughput"], 0)
+        self.assertLessEqual(stats["latency_ms"]["p50"], stats["latency_ms"]["p99"])
+
+    def test_07_engine_failures(self):
+        """Out-of-range input is a 400; an unexpected engine error is a counted JSON 500."""
+        _, data = self.request("GET", "/status")
+        errors = json.loads(data)["errors"]
+        status, body = self.post("/quote", {"config": DEFAULT_CONFIG, "units": 10 ** 400})
+        self.assertEqual(status, 400)
+        self.assertIn("too large", body["error"])
+
+        with mock.patch.object(pricing_server, "quote_one", side_effect=RuntimeError("boom")):
+            status, body = self.post("/quote", {"config": DEFAULT_CONFIG, "units": 1})
+        self.assertEqual(status, 500)
+        self.assertEqual(body["error"], "internal error: RuntimeError")
+
+        conn = http.client.HTTPConnection("localhost", self.port, timeout=10)
+        try:
+            _, data = self.request("GET", "/status", conn=conn)
+        finally:
+            conn.close()
+        self.assertEqual(json.loads(data)["errors"], errors + 2)
+
+    def test_08_rejects_bad_lengths_and_units(self):
+        """Bad Content-Length, boolean and non-finite units get a JSON 400 instead of hanging or bad JSON."""
+        for length in ("-1", "lots"):
+            with self.subTest(length=length):
+                conn = http.client.HTTPConnection("localhost", self.port, timeout=10)
+                try:
+                    conn.putrequest("POST", "/quote")
+                    conn.putheader("Content-Length", length)
+                    conn.endheaders()
+                    resp = conn.getresponse()
+                    self.assertEqual(resp.status, 400)
+                    self.assertEqual(json.loads(resp.read()), {"error": "invalid Content-Length"})
+                finally:
+                    conn.close()
+
+        bodies = [
+            ("/quote", '{"config": %s, "units": true}'),
+            ("/quote", '{"config": %s, "units": 1e999}'),
+            ("/quote/batch", '{"config": %s, "units": [1, false]}'),
+            ("/quote/batch", '{"config": %s, "units": [1, -1e999]}'),
+        ]
+        for path, body in bodies:
+            with self.subTest(body=body):
+                self.conn.request("POST", path, body=body % json.dumps(DEFAULT_CONFIG))
+                resp = self.conn.getresponse()
+                self.assertEqual(resp.status, 400)
+                self.assertIn("units must be", json.loads(resp.read())["error"])
+
+        # Python's json accepts Infinity, so the price itself comes out infinite.
+        status, body = self.post("/quote", {"config": dict(DEFAULT_CONFIG, mrr=float("inf")), "units": 1})
+        self.assertEqual(status, 400)
+        self.assertIn("JSON", body["error"])
+
+    def test_09_serves_only_page_assets(self):
+        """The page and its scripts are served; the rest of the directory is not."""
+        for path in ("/", "/index.html", "/pricing-component.js", "/pricing-engine.js", "/pricing-worker.js"):
+            with self.subTest(path=path):
+                status, _ = self.request("GET", path)
+                self.assertEqual(status, 200)
+        for path in ("/pricing_server.py", "/README.md", "/.git/HEAD", "/../README.md", "/requests.jsonl"):
+            with self.subTest(path=path):
+                status, _ = self.request("GET", path)
+                self.assertEqual(status, 404)
+
+    def test_10_binds_loopback_by_default(self):
+        """The command line serves on 127.0.0.1 unless told otherwise."""
+        with mock.patch.object(pricing_server, "QuoteServer") as server, mock.patch("sys.stdout"):
+            pricing_server.main([])
+        self.assertEqual(server.call_args.args[0], ("127.0.0.1", 8000))
+
+if __name__ == "__main__":
+    unittest.main()
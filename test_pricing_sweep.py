@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import pricing_engine
+import pricing_sweep
+from test_pricing_engine import DEFAULT_CONFIG
+
+
+class PricingSweepTest(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(19)
+        self.usage = np.round(rng.lognormal(5, 1.5, 5_000))
+
+    def test_01_parse_axis(self):
+        """Ranges include both ends; lists keep their order; bad specs are rejected."""
+        axis = pricing_sweep.parse_axis("tier[2].unitPrice=5:9:5")
+        self.assertEqual(axis.name, "tier[2].unitPrice")
+        np.testing.assert_array_equal(axis.values, [5, 6, 7, 8, 9])
+        np.testing.assert_array_equal(pricing_sweep.parse_axis("mrr=500,0").values, [500, 0])
+        self.assertTrue(np.isinf(pricing_sweep.parse_axis("tier[1].multiplier=1,inf").values[1]))
+        for spec in ("price=1,2", "tier[x].units=1", "mrr", "mrr=1:2", "discount=-5", "mrr=inf"):
+            with self.assertRaises(ValueError, msg=spec):
+                pricing_sweep.parse_axis(spec)
+
+    def test_02_grid_matches_quoting_each_variant(self):
+        """Every cell equals pricing the variant config customer by customer."""
+        axes = [
+            pricing_sweep.parse_axis("discount=0,25"),
+            pricing_sweep.parse_axis("tier[2].unitPrice=5:9:3"),
+            pricing_sweep.parse_axis("mrr=0,500,5000"),
+            pricing_sweep.parse_axis("tier[3].multiplier=1,inf"),
+        ]
+        result = pricing_sweep.sweep(DEFAULT_CONFIG, self.usage, axes, workers=2)
+        self.assertEqual(result.revenue.shape, (2, 3, 3, 2))
+        for index in np.ndindex(result.revenue.shape):
+            assignments = {axis.name: axis.values[i] for axis, i in zip(axes, index)}
+            config = pricing_sweep.variant_config(DEFAULT_CONFIG, assignments)
+            plan = pricing_engine.PricingPlan(config)
+            expected = plan.quote(self.usage).cumulative.sum()
+            self.assertAlmostEqual(result.revenue[index], expected, delta=1e-9 * expected, msg=assignments)
+            raw = pricing_engine.usage_cost(plan.compiled, self.usage)[0]
+            self.assertAlmostEqual(result.floor_share[index], (raw < config["mrr"]).mean(), msg=assignments)
+        np.testing.assert_allclose(result.average_price, result.revenue / self.usage.sum())
+
+    def test_03_unswept_globals_come_from_the_config(self):
+        """Without an MRR or discount axis the config's own values apply."""
+        config = dict(DEFAULT_CONFIG, mrr=500, discount=10)
+        axis = pricing_sweep.parse_axis("tier[1].freeUnits=0,10")
+        result = pricing_sweep.sweep(config, self.usage, [axis], workers=1)
+        self.assertEqual(result.revenue.shape, (2,))
+        expected = pricing_engine.quote(config, self.usage).cumulative.sum()
+        self.assertAlmostEqual(result.revenue[1], expected, delta=1e-9 * expected)
+        with self.assertRaises(ValueError):
+            pricing_sweep.sweep(config, self.usage, [pricing_sweep.parse_axis("tier[7].price=1")])
+
+    def test_04_command_line_csv(self):
+        """The CLI writes one heatmap-ready CSV row per grid cell."""
+        with tempfile.TemporaryDirectory() as tmp:
+            config_path = os.path.join(tmp, "pricing-config.json")
+            usage_path = os.path.join(tmp, "usage.csv")
+            out_path = os.path.join(tmp, "sweep.csv")
+            with open(config_path, "w") as f:
+                json.dump({"tiers": DEFAULT_CONFIG["tiers"]}, f)
+            with open(usage_path, "w") as f:
+                f.write("customer_id,units\na,100\nb,300\n")
+
+            code = pricing_sweep.main([
+                config_path, usage_path, "--axis", "mrr=0,1000", "--axis", "tier[2].price=50,0",
+                "-o", out_path, "-j", "1",
+            ])
+
+            self.assertEqual(code, 0)
+            with open(out_path) as f:
+                lines = f.read().splitlines()
+        self.assertEqual(lines[0], "mrr,tier[2].price,revenue,floor_share,average_price")
+        self.assertEqual(len(lines), 5)
+        # 900 + 2350, then 1000 + 2350 with one customer on the floor.
+        self.assertEqual(lines[1].split(",")[:4], ["0", "50", "3250.00", "0.000000"])
+        self.assertEqual(lines[3].split(",")[:4], ["1000", "50", "3350.00", "0.500000"])
+
+    def test_05_npz_output(self):
+        """Grid arrays round-trip through .npz with their axes."""
+        axes = [pricing_sweep.parse_axis("mrr=0:1000:4")]
+        result = pricing_sweep.sweep(DEFAULT_CONFIG, self.usage, axes, workers=1)
+        buffer = io.BytesIO()
+        pricing_sweep.write_npz(result, buffer)
+        buffer.seek(0)
+        data = np.load(buffer)
+        np.testing.assert_array_equal(data["revenue"], result.revenue)
+        np.testing.assert_array_equal(data["axis_0"], axes[0].values)
+        self.assertEqual(list(data["axes"]), ["mrr"])
+
+
+if __name__ == "__main__":
+    unittest.main()